@@ -1,5 +1,4 @@
-from flask import Flask, jsonify, request, make_response, render_template
-from flask_mysqldb import MySQL
+from flask import Flask, g, has_request_context, jsonify, request, make_response, render_template, stream_with_context
 from flask_jwt_extended import (
     JWTManager,
     create_access_token,
@@ -7,10 +6,50 @@ from flask_jwt_extended import (
     get_jwt_identity,
 )
 from functools import wraps
+import click
+from collections import defaultdict
 import datetime
+import io
+import json
+import os
+import re
+import threading
+import time
+import uuid
 import MySQLdb.cursors
+from pool import MySQLPool, PoolTimeout, GONE_AWAY_ERRORS
+from lookups import LookupCache
+from importer import import_csv, MAX_REPORTED_ERRORS
+from index_loader import IndexLoader
+from lineage import LineageGraph
+from donation_stats import DonationStats, AGGREGATE_COLUMNS
+from search_index import NameIndex
+from migrate import apply_migrations, sql_strings, check_query_plans
+from compress import compress_response
+from json_provider import FastJSONProvider
+from metrics import Registry, CONTENT_TYPE, statement_label
+from slow_queries import SlowQueryLog
+from group_commit import GroupCommitWriter
+from change_feed import ChangeFeed
+from resources import (
+    InvalidParameter,
+    PRIMARY_KEYS,
+    TABLE_COLUMNS,
+    DONATION_SORTS,
+    date_cursor,
+    donation_cursor,
+    donation_filters,
+    donation_query,
+    ids_query,
+    make_etag,
+    next_page_headers,
+    page_query,
+    parse_fields,
+    parse_page_args,
+)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 
 
@@ -20,13 +59,84 @@ app.config["MYSQL_HOST"] = "localhost"
 app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = ""
 app.config["MYSQL_DB"] = "spermbank"
+app.config["MYSQL_POOL_MIN_SIZE"] = 2
+app.config["MYSQL_POOL_MAX_SIZE"] = 10
+app.config["MYSQL_POOL_TIMEOUT"] = 5.0
+app.config["MYSQL_POOL_MAX_LIFETIME"] = 1800.0
+# asgi.py: connections are not tied to threads there, so one process can use more
+app.config["MYSQL_ASYNC_POOL_MAX_SIZE"] = 50
 app.config["JWT_SECRET_KEY"] = "your_origin@69"
 app.config["JWT_ALGORITHM"] = "HS256"
-
-
-mysql = MySQL(app)
+app.config["PAGE_SIZE_DEFAULT"] = 100
+app.config["PAGE_SIZE_MAX"] = 1000
+app.config["BATCH_IDS_MAX"] = 1000
+app.config["BATCH_OPERATIONS_MAX"] = 100
+# Writes made during a request are committed once when it ends (rolled back on
+# a 4xx/5xx response) instead of after every statement
+app.config["UNIT_OF_WORK"] = True
+# POST /api/donations through a background writer that commits concurrent
+# inserts together: waits up to MAX_DELAY_MS after the first row, or MAX_ROWS rows
+app.config["DONATION_GROUP_COMMIT"] = False
+app.config["DONATION_GROUP_COMMIT_MAX_DELAY_MS"] = 5
+app.config["DONATION_GROUP_COMMIT_MAX_ROWS"] = 100
+# Change events kept for Last-Event-ID resume on /api/changes/stream
+app.config["CHANGE_FEED_SIZE"] = 1000
+app.config["CHANGE_STREAM_HEARTBEAT"] = 15.0
+app.config["STREAM_CHUNK_SIZE"] = 1000
+app.config["LOOKUP_CACHE_TTL"] = 300
+app.config["ETAG_MAX_STALENESS"] = 60
+app.config["BULK_BATCH_SIZE"] = 1000
+app.config["IMPORT_BATCH_SIZE"] = 1000
+# relationship_types whose relationships link a donor/parent (individual_1) to offspring (individual_2)
+app.config["LINEAGE_RELATIONSHIP_TYPES"] = ["Donor", "Parent", "Biological parent"]
+app.config["SEARCH_MIN_SCORE"] = 0.3
+# Load the lookup tables, lineage graph, donation stats and name index in one
+# background thread when the first request arrives
+app.config["WARM_UP_INDEXES"] = True
+app.config["SEARCH_LIMIT_DEFAULT"] = 10
+app.config["SEARCH_LIMIT_MAX"] = 100
+# Bodies smaller than this are sent as is; streamed bodies are always compressed
+app.config["COMPRESS_MIN_SIZE"] = 500
+# br and zstd are only offered when the brotli / zstandard packages are installed
+app.config["COMPRESS_LEVELS"] = {"gzip": 6, "br": 4, "zstd": 3}
+# Distinct SQL statements tracked on /metrics before the rest are counted as "other"
+app.config["METRICS_MAX_STATEMENTS"] = 500
+# fetch_data/execute_query calls slower than this (seconds; 0 disables) are
+# logged with their EXPLAIN plan, at most SLOW_QUERY_LOG_RATE per SLOW_QUERY_LOG_PERIOD seconds
+app.config["SLOW_QUERY_THRESHOLD"] = 0.5
+app.config["SLOW_QUERY_LOG_RATE"] = 10
+app.config["SLOW_QUERY_LOG_PERIOD"] = 60.0
+
+
+mysql = MySQLPool(app)
 jwt = JWTManager(app)
 
+metrics = Registry()
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "Time to build a response, by route.", ["method", "route"]
+)
+request_errors = metrics.counter(
+    "http_request_errors_total", "Responses with a 4xx or 5xx status, by route.", ["method", "route", "status"]
+)
+query_latency = metrics.histogram(
+    "db_query_duration_seconds",
+    "SQL execution time including fetching the rows, by statement.",
+    ["statement"],
+    max_series=app.config["METRICS_MAX_STATEMENTS"],
+)
+query_rows = metrics.counter(
+    "db_query_rows_total",
+    "Rows returned or affected, by statement.",
+    ["statement"],
+    max_series=app.config["METRICS_MAX_STATEMENTS"],
+)
+slow_queries = SlowQueryLog(
+    lambda: mysql.pool,
+    threshold=app.config["SLOW_QUERY_THRESHOLD"],
+    rate=app.config["SLOW_QUERY_LOG_RATE"],
+    per=app.config["SLOW_QUERY_LOG_PERIOD"],
+)
+
 
 
 @app.route("/")
@@ -40,19 +150,434 @@ def show_individuals():
 
 
 # Helper function
+def observe_query(query, started, rows, args=None):
+    # Streams leave args out: their time includes the client reading the
+    # export, so it says nothing about the query plan
+    duration = time.perf_counter() - started
+    statement = statement_label(query)
+    query_latency.observe(duration, statement)
+    query_rows.inc(statement, amount=max(rows, 0))
+    if args is not None and slow_queries.threshold and duration >= slow_queries.threshold:
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+        slow_queries.report(query, args, duration, rows, route)
+
+
 def fetch_data(query, args=()):
-    cur = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cur.execute(query, args)
+    started = time.perf_counter()
+    try:
+        cur = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+        cur.execute(query, args)
+    except MySQLdb.OperationalError as e:
+        if e.args[0] not in GONE_AWAY_ERRORS or pending_writes():
+            raise
+        # Reads are safe to retry once on a fresh connection, unless this
+        # request's uncommitted writes died with the old one
+        cur = mysql.reconnect().cursor(MySQLdb.cursors.DictCursor)
+        cur.execute(query, args)
     data = cur.fetchall()
     cur.close()
+    observe_query(query, started, len(data), args)
     return data
 
 
 def execute_query(query, args=()):
+    # Returns the number of rows affected. Inside a request the commit is left
+    # to finish_unit_of_work(); elsewhere (CLI commands) it happens right away.
+    started = time.perf_counter()
     cur = mysql.connection.cursor()
     cur.execute(query, args)
+    rows_affected = cur.rowcount
+    observe_query(query, started, rows_affected, args)
+    cur.close()
+    table = written_table(query)
+    work = unit_of_work()
+    if work is not None:
+        work["dirty"] = True
+        if table:
+            work["tables"].add(table)
+        return rows_affected
     mysql.connection.commit()
+    if table:
+        bump_version(table)
+    return rows_affected
+
+
+def unit_of_work():
+    # Writes and change notifications waiting for the current request's commit,
+    # or None outside a request or with UNIT_OF_WORK off
+    if not app.config["UNIT_OF_WORK"] or not has_request_context():
+        return None
+    if "unit_of_work" not in g:
+        g.unit_of_work = {"dirty": False, "tables": set(), "changes": []}
+    return g.unit_of_work
+
+
+def pending_writes():
+    return has_request_context() and g.get("unit_of_work", {}).get("dirty", False)
+
+
+def execute_many(query, rows):
+    # No commit: callers batch several calls into one transaction
+    started = time.perf_counter()
+    cur = mysql.connection.cursor()
+    cur.executemany(query, rows)
+    count = cur.rowcount
     cur.close()
+    observe_query(query, started, count)
+    return count
+
+
+# Per-table version counters, bumped after every committed write and used to
+# build ETags. Counters live in this process, so BOOT_ID keeps tags from
+# different processes apart and ETAG_MAX_STALENESS rotates them periodically
+# in case another worker process wrote to the table.
+BOOT_ID = uuid.uuid4().hex[:8]
+WRITE_PATTERN = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|REPLACE\s+INTO)\s+`?(\w+)", re.IGNORECASE)
+table_versions = defaultdict(int)
+versions_lock = threading.Lock()
+
+
+def written_table(query):
+    match = WRITE_PATTERN.match(query)
+    return match.group(1).lower() if match else None
+
+
+def bump_version(table):
+    with versions_lock:
+        table_versions[table] += 1
+
+
+def current_etag(tables):
+    with versions_lock:
+        versions = [table_versions[table] for table in tables]
+    return make_etag(BOOT_ID, versions, request.full_path, wants_stream(), app.config["ETAG_MAX_STALENESS"])
+
+
+def conditional(*tables, extra=None):
+    # extra() names further tables the response depends on for this request
+    # (e.g. the ones pulled in by ?expand=)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if "since" in request.args:
+                # Delta sync answers also change as log entries settle, which
+                # the table versions don't track
+                return func(*args, **kwargs)
+            etag = current_etag(tables + tuple(extra() if extra else ()))
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.vary.add("Accept")
+            # Let browsers keep the body but revalidate it on every use
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def stream_data(query, args=()):
+    # Unbuffered server-side cursor: rows are pulled from MySQL chunk by chunk
+    # and written out as NDJSON, so memory stays flat for any table size.
+    def generate():
+        started = time.perf_counter()
+        count = 0
+        cur = mysql.connection.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cur.execute(query, args)
+            while True:
+                rows = cur.fetchmany(app.config["STREAM_CHUNK_SIZE"])
+                if not rows:
+                    break
+                count += len(rows)
+                yield "".join(app.json.dumps(row) + "\n" for row in rows)
+        finally:
+            cur.close()
+            # Includes the time the client took to read the export
+            observe_query(query, started, count)
+
+    return app.response_class(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def iter_rows(query, args=()):
+    # Tuples off an unbuffered cursor, for loading in-memory indexes without
+    # holding the whole result set as dicts
+    started = time.perf_counter()
+    count = 0
+    cur = mysql.connection.cursor(MySQLdb.cursors.SSCursor)
+    try:
+        cur.execute(query, args)
+        while True:
+            rows = cur.fetchmany(app.config["STREAM_CHUNK_SIZE"])
+            if not rows:
+                break
+            count += len(rows)
+            yield from rows
+    finally:
+        cur.close()
+        observe_query(query, started, count)
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Registered before compress(), so it runs after it and the time includes
+    # compressing the body (for streams: up to the first byte)
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    started = g.get("request_started")
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, request.method, route)
+    if response.status_code >= 400:
+        request_errors.inc(request.method, route, str(response.status_code))
+    return response
+
+
+@app.after_request
+def compress(response):
+    if request.method == "HEAD":
+        return response
+    return compress_response(
+        response, request.accept_encodings, app.config["COMPRESS_LEVELS"], app.config["COMPRESS_MIN_SIZE"]
+    )
+
+
+def wants_stream():
+    if request.args.get("stream") == "1":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+# Builders of runtime SQL register representative queries here, so that
+# explain-queries can EXPLAIN what sql_strings() only reports as dynamic
+explain_case_builders = []
+
+
+def explain_cases(builder):
+    explain_case_builders.append(builder)
+    return builder
+
+
+def fields_arg(table, required=()):
+    return parse_fields(table, request.args.get("fields"), required)
+
+
+def project(rows, columns):
+    # Apply a SELECT list to rows that did not come from SQL (cached lookups)
+    if columns == "*":
+        return rows
+    names = columns.split(", ")
+    return [{name: row[name] for name in names} for row in rows]
+
+
+def page_args(parse_cursor=int):
+    return parse_page_args(request.args, app.config["PAGE_SIZE_DEFAULT"], app.config["PAGE_SIZE_MAX"], parse_cursor)
+
+
+def checked_ids(ids):
+    if len(ids) > app.config["BATCH_IDS_MAX"]:
+        raise InvalidParameter(f"At most {app.config['BATCH_IDS_MAX']} ids per request.")
+    return list(dict.fromkeys(ids))
+
+
+def ids_arg(value):
+    try:
+        ids = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise InvalidParameter("ids must be a comma-separated list of integers.")
+    return checked_ids(ids)
+
+
+def page_response(rows, limit, id_column, cursor=None):
+    response = make_response(jsonify(rows[:limit]), 200)
+    response.headers.update(next_page_headers(rows, limit, id_column, request.path, request.args.to_dict(), cursor))
+    return response
+
+
+@explain_cases
+def page_query_cases():
+    for table in ("individuals", "donations", "relationships"):
+        yield page_query(table, "*") + " LIMIT %s"
+        yield page_query(table, "*", after=True) + " LIMIT %s"
+
+
+@explain_cases
+def ids_query_cases():
+    for table in ("individuals", "donations", "relationships"):
+        yield ids_query(table, "*", 3)
+
+
+def fetch_page(table, required=(), transform=None):
+    # Keyset pagination: ?limit=&after=<last id of the previous page>.
+    # ?stream=1 or Accept: application/x-ndjson exports every row after the cursor.
+    # transform(rows) post-processes a page (e.g. embeds related rows) and
+    # required lists the columns it needs whatever ?fields= says.
+    if "ids" in request.args:
+        return fetch_by_ids(table, ids_arg(request.args["ids"]), required, transform)
+    if "since" in request.args:
+        return fetch_changes(table, since_arg(request.args["since"]), required, transform)
+    id_column = PRIMARY_KEYS[table]
+    limit, after = page_args()
+
+    query = page_query(table, fields_arg(table, required), after is not None)
+    args = () if after is None else (after,)
+    if wants_stream():
+        return stream_data(query, args)
+
+    query += " LIMIT %s"
+    rows = fetch_data(query, args + (limit + 1,))
+    if transform:
+        rows[:limit] = transform(rows[:limit])
+    return page_response(rows, limit, id_column)
+
+
+# Lookup tables are tiny and rarely written: serve them from memory
+lookup_cache = LookupCache(
+    {"role_types": "idrole_types", "relationship_types": "idrelationship_types"},
+    lambda table, id_column: fetch_data(f"SELECT * FROM {table} /* full scan */ ORDER BY {id_column}"),
+    ttl=app.config["LOOKUP_CACHE_TTL"],
+)
+
+
+def cached_page(table):
+    if "since" in request.args:
+        # The change log only covers individuals, donations and relationships
+        raise InvalidParameter(f"?since= is not supported for {table}.")
+    if wants_stream() or "ids" in request.args:
+        return fetch_page(table)
+    id_column = PRIMARY_KEYS[table]
+    limit, after = page_args()
+    columns = fields_arg(table)
+    rows = lookup_cache.rows(table)
+    if after is not None:
+        rows = [row for row in rows if row[id_column] > after]
+    return page_response(project(rows[: limit + 1], columns), limit, id_column)
+
+
+def fetch_by_ids(table, ids, required=(), transform=None):
+    # One IN query for the whole batch; ids that do not exist map to null
+    id_column = PRIMARY_KEYS[table]
+    columns = fields_arg(table, required)
+    if not ids:
+        rows = []
+    elif table in lookup_cache.tables:
+        rows = project([row for row in (lookup_cache.get(table, row_id) for row_id in ids) if row], columns)
+    else:
+        rows = fetch_data(ids_query(table, columns, len(ids)), tuple(ids))
+    if transform:
+        rows = transform(rows)
+    found = {row[id_column]: row for row in rows}
+    return jsonify({str(row_id): found.get(row_id) for row_id in ids}), 200
+
+
+def since_arg(value):
+    if not value.isdigit():
+        raise InvalidParameter("since must be a token from a previous sync, or 0.")
+    return int(value)
+
+
+def fetch_changes(table, since, required=(), transform=None):
+    # Delta sync from change_log (migration 003): rows inserted or updated after
+    # the token, ids deleted after it, and the token to send next time. Costs
+    # one range scan over the new log entries plus one IN query, whatever the
+    # table size. ?limit= caps the log entries read; "more" says to call again.
+    id_column = PRIMARY_KEYS[table]
+    limit, _ = page_args()
+    # Ids are handed out before commit, so an open transaction can still make
+    # a lower id visible later. Entries written after the oldest open write
+    # transaction started may have overtaken one of its entries: the token
+    # stops short of them. trx_started has whole seconds, hence the margin.
+    horizon = fetch_data(
+        "SELECT COALESCE(MIN(trx_started), NOW(6)) - INTERVAL 1 SECOND AS horizon"
+        " FROM information_schema.innodb_trx /* full scan */"
+        " WHERE trx_mysql_thread_id <> CONNECTION_ID() AND (trx_rows_modified > 0 OR trx_query IS NOT NULL)"
+    )[0]["horizon"]
+    entries = fetch_data(
+        "SELECT idchange_log, row_id, op, changed_at < %s AS settled"
+        " FROM change_log WHERE table_name = %s AND idchange_log > %s ORDER BY idchange_log LIMIT %s",
+        (horizon, table, since, limit + 1),
+    )
+    token = since
+    latest = {}
+    more = len(entries) > limit
+    for entry in entries[:limit]:
+        if not entry["settled"]:
+            more = False
+            break
+        latest[entry["row_id"]] = entry["op"]
+        token = entry["idchange_log"]
+    changed = [row_id for row_id, op in latest.items() if op != "delete"]
+    rows = []
+    if changed:
+        rows = fetch_data(ids_query(table, fields_arg(table, required), len(changed)), tuple(changed))
+    # A row that is gone was deleted after the window; its own entry follows
+    found = {row[id_column] for row in rows}
+    deleted = [row_id for row_id, op in latest.items() if op == "delete" or row_id not in found]
+    if transform:
+        rows = transform(rows)
+    return jsonify({"upserts": rows, "deleted": deleted, "token": str(token), "more": more}), 200
+
+
+# Change notifications: write handlers report what they changed and derived
+# in-process state (caches, indexes) keeps itself up to date.
+change_listeners = []
+
+
+def on_change(func):
+    change_listeners.append(func)
+    return func
+
+
+def record_change(table, op, row_id=None, row=None):
+    # row_id is None when many rows changed at once (bulk loads); row holds the written values.
+    # While the request has uncommitted writes, listeners are only told after the commit.
+    if pending_writes():
+        g.unit_of_work["changes"].append((table, op, row_id, row))
+        return
+    for listener in change_listeners:
+        listener(table, op, row_id, row)
+
+
+@app.after_request
+def finish_unit_of_work(response):
+    # Registered last, so it runs before the metrics and compression hooks and
+    # they see the final status
+    work = g.pop("unit_of_work", None)
+    if not work or not work["dirty"]:
+        return response
+    if response.status_code >= 400:
+        mysql.connection.rollback()
+        return response
+    try:
+        mysql.connection.commit()
+    except MySQLdb.Error as e:
+        mysql.connection.rollback()
+        return make_response(jsonify({"message": str(e)}), 500)
+    for table in work["tables"]:
+        bump_version(table)
+    for change in work["changes"]:
+        record_change(*change)
+    return response
+
+
+@on_change
+def refresh_lookup_cache(table, op, row_id, row):
+    if table in lookup_cache.tables:
+        lookup_cache.invalidate(table)
+
+
+@app.errorhandler(InvalidParameter)
+def handle_invalid_parameter(e):
+    return jsonify({"message": str(e)}), 400
 
 
 # Authentication
@@ -112,25 +637,61 @@ def role_required(required_role):
 
 
 
+# Connection pool
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"message": str(e)}), 503
+
+
+@app.route("/api/pool/stats", methods=["GET"])
+@role_required("admin")
+def pool_stats():
+    return jsonify(mysql.pool.stats()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def show_metrics():
+    return app.response_class(metrics.render(), content_type=CONTENT_TYPE)
+
+
+
+
 ############################
 ##   E N D   P O I N T S  ##
 ############################
 
 
 
+# BATCH GET
+@app.route("/api/<any(role_types, relationship_types, donations, individuals, relationships):table>/by_ids", methods=["POST"])
+@jwt_required()
+def get_by_ids(table):
+    # Same as GET ?ids=, for lists too long for a URL: {"ids": [1, 2, 3]}
+    data = request.get_json(silent=True)
+    ids = data.get("ids") if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(row_id, int) and not isinstance(row_id, bool) for row_id in ids):
+        raise InvalidParameter('Expected {"ids": [<integer>, ...]}.')
+    if table == "individuals":
+        return fetch_by_ids(table, checked_ids(ids), individual_columns(), expand_individuals)
+    return fetch_by_ids(table, checked_ids(ids))
+
+
+
 # ROLE_TYPES
 @app.route("/api/role_types", methods=["GET"])
 @jwt_required()
+@conditional("role_types")
 def get_role_types():
-    role_types = fetch_data("SELECT * FROM role_types")
-    return jsonify(role_types), 200
+    return cached_page("role_types")
 
 
 @app.route("/api/role_types/<int:role_type_id>", methods=["GET"])
 @jwt_required()
+@conditional("role_types")
 def search_role_types(role_type_id):
-    role_types = fetch_data("SELECT * FROM role_types WHERE idrole_types= %s", (role_type_id,))
-    return jsonify(role_types), 200
+    columns = fields_arg("role_types")
+    role_type = lookup_cache.get("role_types", role_type_id)
+    return jsonify(project([role_type] if role_type else [], columns)), 200
 
 
 @app.route("/api/role_types", methods=["POST"])
@@ -150,6 +711,7 @@ def add_role_type():
         """,
         (data["description"],),
     )
+    record_change("role_types", "insert")
     return jsonify({"message": "Role_type added successfully."}), 201
 
 
@@ -170,6 +732,7 @@ def update_role_type(role_type_id):
         """,
         (data["description"], role_type_id),
     )
+    record_change("role_types", "update", role_type_id)
     return jsonify({"message": "Role_type updated successfully."}), 200
 
 
@@ -182,6 +745,7 @@ def delete_role_type(role_type_id):
         )
         if rows_affected == 0:
             return jsonify({"message": "Role_type not found."}), 404
+        record_change("role_types", "delete", role_type_id)
         return jsonify({"message": "Role_type deleted successfully."}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
@@ -190,16 +754,18 @@ def delete_role_type(role_type_id):
 # RELATIONSHIP_TYPES
 @app.route("/api/relationship_types", methods=["GET"])
 @jwt_required()
+@conditional("relationship_types")
 def get_relationship_types():
-    relationship_types = fetch_data("SELECT * FROM relationship_types")
-    return jsonify(relationship_types), 200
+    return cached_page("relationship_types")
 
 
 @app.route("/api/relationship_types/<int:relationship_id>", methods=["GET"])
 @jwt_required()
+@conditional("relationship_types")
 def search_relationship_types(relationship_id):
-    relationship_types = fetch_data("SELECT * FROM relationship_types WHERE idrelationship_types= %s", (relationship_id,))
-    return jsonify(relationship_types), 200
+    columns = fields_arg("relationship_types")
+    relationship_type = lookup_cache.get("relationship_types", relationship_id)
+    return jsonify(project([relationship_type] if relationship_type else [], columns)), 200
 
 
 @app.route("/api/relationship_types", methods=["POST"])
@@ -219,6 +785,7 @@ def add_relationship_type():
         """,
         (data["description"],),
     )
+    record_change("relationship_types", "insert")
     return jsonify({"message": "Relationship_type added successfully."}), 201
 
 
@@ -239,6 +806,7 @@ def update_relationship_type(relationship_type_id):
         """,
         (data["description"], relationship_type_id),
     )
+    record_change("relationship_types", "update", relationship_type_id)
     return jsonify({"message": "Relationship_type updated successfully."}), 200
 
 
@@ -251,6 +819,7 @@ def delete_relationship_type(relationship_type_id):
         )
         if rows_affected == 0:
             return jsonify({"message": "Relationship_type not found."}), 404
+        record_change("relationship_types", "delete", relationship_type_id)
         return jsonify({"message": "Relationship_type deleted successfully."}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
@@ -258,17 +827,48 @@ def delete_relationship_type(relationship_type_id):
 
 
 # DONATIONS
+@explain_cases
+def donation_query_cases():
+    # Placeholders are EXPLAINed as '1', which is no date: date ranges and date
+    # cursors are checked with real values by test_donation_indexes.py
+    for sort in DONATION_SORTS:
+        for conditions in ([], ["individual_id = %s"]):
+            yield donation_query("*", conditions, sort) + " LIMIT %s"
+            if sort.endswith("id"):
+                yield donation_query("*", conditions, sort, after=True) + " LIMIT %s"
+
+
 @app.route("/api/donations", methods=["GET"])
 @jwt_required()
+@conditional("donations")
 def get_donations():
-    donations = fetch_data("SELECT * FROM donations")
-    return jsonify(donations), 200
+    if "ids" in request.args:
+        return fetch_by_ids("donations", ids_arg(request.args["ids"]))
+    if "since" in request.args:
+        return fetch_changes("donations", since_arg(request.args["since"]))
+    sort = request.args.get("sort", "id")
+    if sort not in DONATION_SORTS:
+        raise InvalidParameter(f"sort must be one of: {', '.join(DONATION_SORTS)}.")
+    columns = DONATION_SORTS[sort][0]
+    limit, after = page_args(date_cursor if len(columns) > 1 else int)
+    conditions, args = donation_filters(request.args)
+    if after is not None:
+        args.extend(after if isinstance(after, tuple) else (after,))
+
+    query = donation_query(fields_arg("donations", columns), conditions, sort, after is not None)
+    if wants_stream():
+        return stream_data(query, tuple(args))
+
+    query += " LIMIT %s"
+    rows = fetch_data(query, tuple(args) + (limit + 1,))
+    return page_response(rows, limit, "iddonations", donation_cursor(sort))
 
 
 @app.route("/api/donations/<int:donation_id>", methods=["GET"])
 @jwt_required()
+@conditional("donations")
 def search_donations(donation_id):
-    donations = fetch_data("SELECT * FROM donations WHERE iddonations= %s", (donation_id,))
+    donations = fetch_data(f"SELECT {fields_arg('donations')} FROM donations WHERE iddonations = %s", (donation_id,))
     return jsonify(donations), 200
 
 
@@ -284,13 +884,104 @@ def add_donation():
         return jsonify({"message": f"Missing fields: {', '.join(missing_fields)}"}), 400
     
     
-    execute_query(
-        """
-        INSERT INTO donations (individual_id, date, ampoule_count, motilitiy_rating) VALUES (%s, %s, %s, %s)
-        """,
-        (data["individual_id"], data["date"], data["ampoule_count"], data["motilitiy_rating"]),
-    )
-    return jsonify({"message": "Donation added successfully."}), 201
+    values = (data["individual_id"], data["date"], data["ampoule_count"], data["motilitiy_rating"])
+    if app.config["DONATION_GROUP_COMMIT"]:
+        # Already committed when submit() returns
+        donation_id = donation_writer.submit(values)
+        bump_version("donations")
+    else:
+        execute_query(
+            """
+            INSERT INTO donations (individual_id, date, ampoule_count, motilitiy_rating) VALUES (%s, %s, %s, %s)
+            """,
+            values,
+        )
+        donation_id = mysql.connection.insert_id()
+    record_change("donations", "insert", donation_id, data)
+    return jsonify({"message": "Donation added successfully.", "id": donation_id}), 201
+
+
+donation_writer = GroupCommitWriter(
+    lambda: mysql.pool,
+    "INSERT INTO donations (individual_id, date, ampoule_count, motilitiy_rating)",
+    max_delay=app.config["DONATION_GROUP_COMMIT_MAX_DELAY_MS"] / 1000,
+    max_rows=app.config["DONATION_GROUP_COMMIT_MAX_ROWS"],
+    observe=observe_query,
+)
+
+
+def coerce_donation(record):
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object.")
+    required_fields = ["individual_id", "date", "ampoule_count", "motilitiy_rating"]
+    missing_fields = [field for field in required_fields if field not in record]
+    if missing_fields:
+        raise ValueError(f"Missing fields: {', '.join(missing_fields)}")
+    try:
+        return (
+            int(record["individual_id"]),
+            datetime.date.fromisoformat(str(record["date"])),
+            int(record["ampoule_count"]),
+            float(record["motilitiy_rating"]),
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value: {e}")
+
+
+def bulk_records():
+    # A JSON array, or one JSON object per line when sent as NDJSON so the
+    # upload is never held in memory as a whole
+    if request.mimetype == "application/x-ndjson":
+        for line in request.stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            raise InvalidParameter("Expected a JSON array of donations.")
+        yield from records
+
+
+@app.route("/api/donations/bulk", methods=["POST"])
+@role_required("admin")
+def add_donations_bulk():
+    batch_size = app.config["BULK_BATCH_SIZE"]
+    query = "INSERT INTO donations (individual_id, date, ampoule_count, motilitiy_rating) VALUES (%s, %s, %s, %s)"
+    inserted = 0
+    error_count = 0
+    errors = []
+    batch = []
+    donors = set()
+    try:
+        for index, record in enumerate(bulk_records()):
+            try:
+                values = coerce_donation(record)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"index": index, "message": str(e)})
+                continue
+            batch.append(values)
+            donors.add(values[0])
+            if len(batch) >= batch_size:
+                inserted += execute_many(query, batch)
+                batch = []
+        if batch:
+            inserted += execute_many(query, batch)
+        mysql.connection.commit()
+    except MySQLdb.Error as e:
+        mysql.connection.rollback()
+        return jsonify({"message": str(e), "inserted": 0, "error_count": error_count, "errors": errors}), 500
+
+    if inserted:
+        bump_version("donations")
+        for individual_id in donors:
+            record_change("donations", "insert", None, {"individual_id": individual_id})
+    status = 201 if inserted or not error_count else 400
+    return jsonify({"inserted": inserted, "error_count": error_count, "errors": errors}), status
 
 
 @app.route("/api/donations/<int:donation_id>", methods=["PUT"])
@@ -304,12 +995,16 @@ def update_donation(donation_id):
     if missing_fields:
         return jsonify({"message": f"Missing fields: {', '.join(missing_fields)}"}), 400
     
+    previous = fetch_data("SELECT individual_id FROM donations WHERE iddonations = %s", (donation_id,))
+    if not previous:
+        return jsonify({"message": "Donation not found."}), 404
     execute_query(
         """
         UPDATE donations SET individual_id = %s, date = %s, ampoule_count = %s, motilitiy_rating = %s WHERE iddonations = %s
         """,
         (data["individual_id"], data["date"], data["ampoule_count"], data["motilitiy_rating"], donation_id),
     )
+    record_change("donations", "update", donation_id, {**data, "previous_individual_id": previous[0]["individual_id"]})
     return jsonify({"message": "Donation updated successfully."}), 200
 
 
@@ -317,11 +1012,14 @@ def update_donation(donation_id):
 @role_required("admin")
 def delete_donation(donation_id):
     try:
+        previous = fetch_data("SELECT individual_id FROM donations WHERE iddonations = %s", (donation_id,))
         rows_affected = execute_query(
             "DELETE FROM donations WHERE iddonations = %s", (donation_id,)
         )
         if rows_affected == 0:
             return jsonify({"message": "Donation not found."}), 404
+        if previous:
+            record_change("donations", "delete", donation_id, {"individual_id": previous[0]["individual_id"]})
         return jsonify({"message": "Donation deleted successfully."}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
@@ -330,18 +1028,91 @@ def delete_donation(donation_id):
 
 
 # INDIVIDUALS
+# ?expand= names -> the table each one embeds
+INDIVIDUAL_EXPANSIONS = {"donations": "donations", "relationships": "relationships", "type": "role_types"}
+
+
+def expand_arg():
+    names = [name.strip() for name in request.args.get("expand", "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in INDIVIDUAL_EXPANSIONS]
+    if unknown:
+        raise InvalidParameter(f"Unknown expansions: {', '.join(unknown)}. Use: {', '.join(INDIVIDUAL_EXPANSIONS)}.")
+    if names and wants_stream():
+        raise InvalidParameter("expand cannot be combined with streaming.")
+    return list(dict.fromkeys(names))
+
+
+def expanded_tables():
+    return [INDIVIDUAL_EXPANSIONS[name] for name in expand_arg()]
+
+
+def individual_columns():
+    return ("type_id",) if "type" in expand_arg() else ()
+
+
+def expand_donations_query(count):
+    placeholders = ", ".join(["%s"] * count)
+    return f"SELECT * FROM donations WHERE individual_id IN ({placeholders}) ORDER BY individual_id, date, iddonations"
+
+
+def expand_relationships_query(count):
+    # UNION rather than OR so each side is served by its own foreign key index
+    placeholders = ", ".join(["%s"] * count)
+    return f"""
+        SELECT * FROM relationships WHERE individual_1_id IN ({placeholders})
+        UNION
+        SELECT * FROM relationships WHERE individual_2_id IN ({placeholders})
+        ORDER BY idrelationships
+    """
+
+
+@explain_cases
+def expand_query_cases():
+    yield expand_donations_query(3)
+    yield expand_relationships_query(3)
+
+
+def expand_individuals(rows):
+    # One query per relation for the whole batch of individuals, never one per row
+    expand = expand_arg()
+    ids = [row["idindividuals"] for row in rows]
+    if not expand or not ids:
+        return rows
+    if "donations" in expand:
+        donations = defaultdict(list)
+        for donation in fetch_data(expand_donations_query(len(ids)), tuple(ids)):
+            donations[donation["individual_id"]].append(donation)
+        for row in rows:
+            row["donations"] = donations.get(row["idindividuals"], [])
+    if "relationships" in expand:
+        relationships = defaultdict(list)
+        for relationship in fetch_data(expand_relationships_query(len(ids)), tuple(ids) * 2):
+            for individual_id in {relationship["individual_1_id"], relationship["individual_2_id"]}:
+                relationships[individual_id].append(relationship)
+        for row in rows:
+            row["relationships"] = relationships.get(row["idindividuals"], [])
+    if "type" in expand:
+        for row in rows:
+            row["type"] = lookup_cache.get("role_types", row["type_id"])
+    return rows
+
+
 @app.route("/api/individuals", methods=["GET"])
 @jwt_required()
+@conditional("individuals", extra=expanded_tables)
 def get_individuals():
-    individuals = fetch_data("SELECT * FROM individuals")
-    return jsonify(individuals), 200
+    return fetch_page("individuals", individual_columns(), expand_individuals)
 
 
 @app.route("/api/individuals/<int:individual_id>", methods=["GET"])
 @jwt_required()
+@conditional("individuals", extra=expanded_tables)
 def search_individuals(individual_id):
-    individuals = fetch_data("SELECT * FROM individuals WHERE idindividuals= %s", (individual_id,))
-    return jsonify(individuals), 200
+    individuals = fetch_data(
+        f"SELECT {fields_arg('individuals', individual_columns())} FROM individuals WHERE idindividuals = %s",
+        (individual_id,),
+    )
+    return jsonify(expand_individuals(individuals)), 200
 
 
 @app.route("/api/individuals", methods=["POST"])
@@ -363,7 +1134,9 @@ def add_individual():
         (data["type_id"], data["birthdate"], data["is_male"], data["fname"], 
          data["mname"], data["lname"], data["address"], data["contact"]),
     )
-    return jsonify({"message": "Individual added successfully."}), 201
+    individual_id = mysql.connection.insert_id()
+    record_change("individuals", "insert", individual_id, data)
+    return jsonify({"message": "Individual added successfully.", "id": individual_id}), 201
 
 
 @app.route("/api/individuals/<int:individual_id>", methods=["PUT"])
@@ -377,6 +1150,9 @@ def update_individual(individual_id):
     if missing_fields:
         return jsonify({"message": f"Missing fields: {', '.join(missing_fields)}"}), 400
     
+    # rowcount can't tell a missing row from an unchanged one
+    if not fetch_data("SELECT idindividuals FROM individuals WHERE idindividuals = %s", (individual_id,)):
+        return jsonify({"message": "Individual not found."}), 404
     execute_query(
         """
         UPDATE individuals SET 
@@ -386,6 +1162,7 @@ def update_individual(individual_id):
         (data["type_id"], data["birthdate"], data["is_male"], data["fname"], 
         data["mname"], data["lname"], data["address"], data["contact"], individual_id),
     )
+    record_change("individuals", "update", individual_id, data)
     return jsonify({"message": "Individual updated successfully."}), 200
 
 
@@ -398,23 +1175,103 @@ def delete_individual(individual_id):
         )
         if rows_affected == 0:
             return jsonify({"message": "Individual not found."}), 404
+        record_change("individuals", "delete", individual_id)
         return jsonify({"message": "Individual deleted successfully."}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
 
 
+def import_individuals(lines, resume_from=0, batch_size=None, on_checkpoint=None):
+    def insert_batch(rows):
+        return execute_many(
+            """
+            INSERT INTO individuals (type_id, birthdate, is_male, fname, mname, lname, address, contact)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            rows,
+        )
+
+    def commit():
+        mysql.connection.commit()
+        bump_version("individuals")
+
+    def validate(values):
+        if lookup_cache.get("role_types", values[0]) is None:
+            raise ValueError(f"Unknown type_id: {values[0]}")
+
+    result = import_csv(
+        lines,
+        insert_batch,
+        commit,
+        mysql.connection.rollback,
+        batch_size=batch_size or app.config["IMPORT_BATCH_SIZE"],
+        resume_from=resume_from,
+        validate=validate,
+        on_checkpoint=on_checkpoint,
+    )
+    if result["inserted"]:
+        record_change("individuals", "insert")
+    return result
+
+
+@app.route("/api/individuals/import", methods=["POST"])
+@role_required("admin")
+def import_individuals_csv():
+    try:
+        resume_from = int(request.args.get("resume_from", 0))
+    except ValueError:
+        raise InvalidParameter("resume_from must be an integer.")
+    # Multipart uploads are spooled to disk by Werkzeug; raw text/csv bodies are read straight off the socket
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    lines = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8-sig", newline="")
+    try:
+        result = import_individuals(lines, resume_from)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if "invalid_encoding" in result:
+        return jsonify(result), 400
+    return jsonify(result), 500 if "failed" in result else 200
+
+
+@app.cli.command("import-individuals")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", type=int, default=None, help="Rows per INSERT/commit.")
+@click.option("--checkpoint-file", default=None, help="Where progress is kept (default: PATH.checkpoint).")
+def import_individuals_command(path, batch_size, checkpoint_file):
+    """Import individuals from a CSV file, resuming from the last checkpoint."""
+    checkpoint_file = checkpoint_file or path + ".checkpoint"
+    resume_from = 0
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            resume_from = int(f.read().strip() or 0)
+
+    def save_checkpoint(row_number):
+        with open(checkpoint_file + ".tmp", "w") as f:
+            f.write(str(row_number))
+        os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+    with open(path, newline="", encoding="utf-8-sig") as lines:
+        result = import_individuals(lines, resume_from, batch_size, save_checkpoint)
+    click.echo(json.dumps(result))
+    if "failed" in result:
+        raise click.ClickException(f"Import stopped at row {result['checkpoint']}; rerun to resume.")
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
 # RELATIONSHIPS
 @app.route("/api/relationships", methods=["GET"])
 @jwt_required()
+@conditional("relationships")
 def get_relationships():
-    relationships = fetch_data("SELECT * FROM relationships")
-    return jsonify(relationships), 200
+    return fetch_page("relationships")
 
 @app.route("/api/relationships/<int:relationship_id>", methods=["GET"])
 @jwt_required()
+@conditional("relationships")
 def search_relationships(relationship_id):
-    relationships = fetch_data("SELECT * FROM relationships WHERE idrelationships= %s", (relationship_id,))
+    relationships = fetch_data(f"SELECT {fields_arg('relationships')} FROM relationships WHERE idrelationships = %s", (relationship_id,))
     return jsonify(relationships), 200
 
 @app.route("/api/relationships", methods=["POST"])
@@ -434,6 +1291,7 @@ def add_relationship():
         """,
         (data["type_id"], data["individual_1_id"], data["individual_2_id"], data["date_start"], data["date_end"]),
     )
+    record_change("relationships", "insert", mysql.connection.insert_id(), data)
     return jsonify({"message": "Relationship added successfully."}), 201
 
 
@@ -448,6 +1306,9 @@ def update_relationship(relationship_id):
     if missing_fields:
         return jsonify({"message": f"Missing fields: {', '.join(missing_fields)}"}), 400
     
+    # rowcount can't tell a missing row from an unchanged one
+    if not fetch_data("SELECT idrelationships FROM relationships WHERE idrelationships = %s", (relationship_id,)):
+        return jsonify({"message": "Relationship not found."}), 404
     execute_query(
         """
         UPDATE relationships SET 
@@ -455,6 +1316,7 @@ def update_relationship(relationship_id):
         """,
         (data["type_id"], data["individual_1_id"], data["individual_2_id"], data["date_start"], data["date_end"], relationship_id),
     )
+    record_change("relationships", "update", relationship_id, data)
     return jsonify({"message": "Relationship updated successfully."}), 200
 
 
@@ -467,11 +1329,505 @@ def delete_relationship(relationship_id):
         )
         if rows_affected == 0:
             return jsonify({"message": "Relationship not found."}), 404
+        record_change("relationships", "delete", relationship_id)
         return jsonify({"message": "Relationship deleted successfully."}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
 
 
+# BATCH
+BATCH_OPS = ("create", "update", "delete")
+
+
+def is_ref(value):
+    return isinstance(value, dict) and list(value) == ["$ref"]
+
+
+def batch_operations():
+    # Validates the whole batch before anything is written. {"$ref": name} may
+    # stand for an id or column value and must name the "ref" of an earlier create.
+    body = request.get_json(silent=True)
+    operations = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise InvalidParameter('Expected {"operations": [...]} with at least one operation.')
+    if len(operations) > app.config["BATCH_OPERATIONS_MAX"]:
+        raise InvalidParameter(f"At most {app.config['BATCH_OPERATIONS_MAX']} operations per batch.")
+    declared = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise InvalidParameter(f"Operation {index}: must be an object.")
+        op, table, data = operation.get("op"), operation.get("resource"), operation.get("data", {})
+        if op not in BATCH_OPS:
+            raise InvalidParameter(f"Operation {index}: op must be one of {', '.join(BATCH_OPS)}.")
+        if table not in PRIMARY_KEYS:
+            raise InvalidParameter(f"Operation {index}: resource must be one of {', '.join(PRIMARY_KEYS)}.")
+        if not isinstance(data, dict):
+            raise InvalidParameter(f"Operation {index}: data must be an object.")
+        columns = TABLE_COLUMNS[table][1:]
+        unknown = [field for field in data if field not in columns]
+        if unknown:
+            raise InvalidParameter(f"Operation {index}: unknown fields for {table}: {', '.join(unknown)}.")
+        if op == "create":
+            missing_fields = [field for field in columns if field not in data]
+            if missing_fields:
+                raise InvalidParameter(f"Operation {index}: missing fields: {', '.join(missing_fields)}.")
+        elif "id" not in operation:
+            raise InvalidParameter(f"Operation {index}: {op} needs an id.")
+        elif op == "update" and not data:
+            raise InvalidParameter(f"Operation {index}: update needs data.")
+        for value in [operation.get("id"), *data.values()]:
+            if is_ref(value) and value["$ref"] not in declared:
+                raise InvalidParameter(f"Operation {index}: ref {value['$ref']!r} is not created by an earlier operation.")
+        if "ref" in operation:
+            if op != "create" or not isinstance(operation["ref"], str) or operation["ref"] in declared:
+                raise InvalidParameter(f"Operation {index}: ref must be a unique name on a create.")
+            declared.add(operation["ref"])
+    return operations
+
+
+def lock_query(table):
+    return f"SELECT * FROM {table} WHERE {PRIMARY_KEYS[table]} = %s FOR UPDATE"
+
+
+def update_query(table, columns):
+    return f"UPDATE {table} SET {', '.join(f'{column} = %s' for column in columns)} WHERE {PRIMARY_KEYS[table]} = %s"
+
+
+def delete_query(table):
+    return f"DELETE FROM {table} WHERE {PRIMARY_KEYS[table]} = %s"
+
+
+@explain_cases
+def batch_query_cases():
+    for table in ("individuals", "donations", "relationships"):
+        yield lock_query(table)
+        yield update_query(table, TABLE_COLUMNS[table][1:])
+        yield delete_query(table)
+
+
+@app.route("/api/batch", methods=["POST"])
+@role_required("admin")
+def run_batch():
+    # All operations share one cursor and one transaction: either every write
+    # commits or none does. Versions and derived state (caches, indexes) are
+    # only updated once the commit has succeeded.
+    operations = batch_operations()
+    conn = mysql.connection
+    cur = conn.cursor(MySQLdb.cursors.DictCursor)
+    refs = {}
+    results = []
+    changes = []
+    index = None
+
+    def execute(query, args):
+        started = time.perf_counter()
+        cur.execute(query, args)
+        observe_query(query, started, cur.rowcount, args)
+
+    def resolve(value):
+        return refs[value["$ref"]] if is_ref(value) else value
+
+    try:
+        for index, operation in enumerate(operations):
+            op, table = operation["op"], operation["resource"]
+            values = {column: resolve(value) for column, value in operation.get("data", {}).items()}
+            if op == "create":
+                placeholders = ", ".join(["%s"] * len(values))
+                execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({placeholders})", tuple(values.values()))
+                row_id = cur.lastrowid
+                if "ref" in operation:
+                    refs[operation["ref"]] = row_id
+                changes.append((table, "insert", row_id, values))
+            else:
+                row_id = resolve(operation["id"])
+                execute(lock_query(table), (row_id,))
+                previous = cur.fetchone()
+                if previous is None:
+                    conn.rollback()
+                    return jsonify({"message": f"Operation {index}: {table} {row_id} not found.", "index": index}), 404
+                if op == "update":
+                    execute(update_query(table, values), (*values.values(), row_id))
+                    row = {**previous, **values}
+                    if table == "donations":
+                        row["previous_individual_id"] = previous["individual_id"]
+                    changes.append((table, "update", row_id, row))
+                else:
+                    execute(delete_query(table), (row_id,))
+                    row = {"individual_id": previous["individual_id"]} if table == "donations" else None
+                    changes.append((table, "delete", row_id, row))
+            results.append({"index": index, "op": op, "resource": table, "id": row_id})
+        conn.commit()
+    except MySQLdb.IntegrityError as e:
+        conn.rollback()
+        return jsonify({"message": f"Operation {index}: {e}", "index": index}), 409
+    except MySQLdb.Error as e:
+        conn.rollback()
+        return jsonify({"message": f"Operation {index}: {e}", "index": index}), 500
+    finally:
+        cur.close()
+
+    for table in dict.fromkeys(change[0] for change in changes):
+        bump_version(table)
+    for change in changes:
+        record_change(*change)
+    return jsonify({"results": results}), 200
+
+
+
+
+# CHANGE FEED
+change_feed = ChangeFeed(size=app.config["CHANGE_FEED_SIZE"])
+
+
+@on_change
+def publish_change(table, op, row_id, row):
+    # Only committed writes get here. Bulk changes have no id and tell
+    # clients to reload the table.
+    fields = None
+    if row_id is not None and row is not None and table in TABLE_COLUMNS:
+        fields = {column: row[column] for column in TABLE_COLUMNS[table][1:] if column in row}
+    change_feed.publish({"table": table, "op": op, "id": row_id, "fields": fields})
+
+
+def change_event(event_id, event):
+    return f"id: {event_id}\nevent: change\ndata: {app.json.dumps(event)}\n\n"
+
+
+@app.route("/api/changes/stream", methods=["GET"])
+@jwt_required()
+def stream_changes():
+    # Server-Sent Events. Resumes after Last-Event-ID (header, or ?last_event_id=
+    # for clients that can't set it); a "reset" event means events were missed
+    # and the client should reload what it shows.
+    tables = {table.strip() for table in request.args.get("tables", "").split(",") if table.strip()}
+    unknown = tables - set(PRIMARY_KEYS)
+    if unknown:
+        raise InvalidParameter(f"Unknown tables: {', '.join(sorted(unknown))}.")
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or change_feed.last_id
+    heartbeat = app.config["CHANGE_STREAM_HEARTBEAT"]
+
+    def generate(last_id):
+        yield "retry: 3000\n\n"
+        events = change_feed.since(last_id)
+        while True:
+            if events is None:
+                last_id = change_feed.last_id
+                yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+                events = []
+            for event_id, event in events:
+                last_id = event_id
+                if not tables or event["table"] in tables:
+                    yield change_event(event_id, event)
+            events = change_feed.wait(last_id, heartbeat)
+            if events == []:
+                yield ": keep-alive\n\n"
+
+    response = app.response_class(generate(last_id), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# LINEAGE
+lineage = LineageGraph()
+
+
+def load_lineage():
+    wanted = {description.lower() for description in app.config["LINEAGE_RELATIONSHIP_TYPES"]}
+    type_ids = [
+        row["idrelationship_types"]
+        for row in lookup_cache.rows("relationship_types")
+        if row["description"].lower() in wanted
+    ]
+    rows = fetch_data("SELECT idrelationships, type_id, individual_1_id, individual_2_id FROM relationships /* full scan */")
+    lineage.load(rows, type_ids)
+
+
+def apply_lineage_change(table, op, row_id, row):
+    if table == "relationship_types" or row_id is None:
+        return False
+    if op == "delete":
+        lineage.remove(row_id)
+    else:
+        lineage.upsert(row_id, int(row["type_id"]), int(row["individual_1_id"]), int(row["individual_2_id"]))
+    return True
+
+
+lineage_loader = IndexLoader(load_lineage, apply_lineage_change)
+
+
+def lineage_graph():
+    lineage_loader.ensure_loaded()
+    return lineage
+
+
+@on_change
+def update_lineage(table, op, row_id, row):
+    if table in ("relationships", "relationship_types"):
+        lineage_loader.notify(table, op, row_id, row)
+
+
+def max_depth_arg():
+    max_depth = request.args.get("max_depth")
+    if max_depth is None:
+        return None
+    try:
+        return int(max_depth)
+    except ValueError:
+        raise InvalidParameter("max_depth must be an integer.")
+
+
+def by_generation(depths):
+    return [{"id": individual, "generation": depth} for individual, depth in sorted(depths.items(), key=lambda item: (item[1], item[0]))]
+
+
+@app.route("/api/individuals/<int:individual_id>/ancestors", methods=["GET"])
+@jwt_required()
+@conditional("relationships", "relationship_types")
+def get_ancestors(individual_id):
+    max_depth = max_depth_arg()
+    ancestors = lineage_graph().ancestors(individual_id, max_depth)
+    return jsonify({"individual_id": individual_id, "count": len(ancestors), "ancestors": by_generation(ancestors)}), 200
+
+
+@app.route("/api/individuals/<int:individual_id>/descendants", methods=["GET"])
+@jwt_required()
+@conditional("relationships", "relationship_types")
+def get_descendants(individual_id):
+    max_depth = max_depth_arg()
+    descendants = lineage_graph().descendants(individual_id, max_depth)
+    return jsonify({"individual_id": individual_id, "count": len(descendants), "descendants": by_generation(descendants)}), 200
+
+
+@app.route("/api/individuals/<int:individual_id>/siblings", methods=["GET"])
+@jwt_required()
+@conditional("relationships", "relationship_types")
+def get_siblings(individual_id):
+    siblings = lineage_graph().siblings(individual_id)
+    return jsonify({"individual_id": individual_id, **siblings}), 200
+
+
+@app.route("/api/individuals/<int:individual_id>/kinship/<int:other_id>", methods=["GET"])
+@jwt_required()
+@conditional("relationships", "relationship_types")
+def get_kinship(individual_id, other_id):
+    kinship = lineage_graph().kinship(individual_id, other_id) or {"degree": None, "common_ancestors": []}
+    return jsonify({"individual_1_id": individual_id, "individual_2_id": other_id, **kinship}), 200
+
+
+
+# DONATION STATS
+donation_stats = DonationStats()
+
+
+def load_donation_stats():
+    rows = fetch_data(f"SELECT {AGGREGATE_COLUMNS} FROM donations /* full scan */ GROUP BY individual_id")
+    donation_stats.load(rows)
+
+
+def refresh_donor_stats(individual_id):
+    # Served by the index on donations.individual_id: only this donor's rows are read
+    rows = fetch_data(
+        f"SELECT {AGGREGATE_COLUMNS} FROM donations WHERE individual_id = %s GROUP BY individual_id",
+        (individual_id,),
+    )
+    donation_stats.replace(individual_id, rows[0] if rows else None)
+
+
+def apply_donation_stats_change(table, op, row_id, row):
+    if table == "donations" and op == "insert" and row and "ampoule_count" in row:
+        try:
+            donation_stats.add(
+                int(row["individual_id"]),
+                datetime.date.fromisoformat(str(row["date"])[:10]),
+                int(row["ampoule_count"]),
+                float(row["motilitiy_rating"]),
+            )
+            return True
+        except (TypeError, ValueError):
+            pass
+    return replay_donation_stats_change(table, op, row_id, row)
+
+
+def replay_donation_stats_change(table, op, row_id, row):
+    # The load may already have counted a queued insert, so reread the donor
+    # rather than adding it again
+    if table == "individuals":
+        donation_stats.replace(row_id, None)
+        return True
+    if row is None:
+        return False
+    for individual_id in {row.get("individual_id"), row.get("previous_individual_id")} - {None}:
+        refresh_donor_stats(int(individual_id))
+    return True
+
+
+donation_stats_loader = IndexLoader(load_donation_stats, apply_donation_stats_change, replay_donation_stats_change)
+
+
+def donation_stats_index():
+    donation_stats_loader.ensure_loaded()
+    return donation_stats
+
+
+@on_change
+def update_donation_stats(table, op, row_id, row):
+    if table == "individuals" and op == "delete" and row_id is not None:
+        donation_stats_loader.notify(table, op, row_id, row)
+        # The stats endpoints are tagged with the donations version
+        bump_version("donations")
+    elif table == "donations":
+        donation_stats_loader.notify(table, op, row_id, row)
+
+
+@app.route("/api/individuals/<int:individual_id>/donation_stats", methods=["GET"])
+@jwt_required()
+@conditional("donations")
+def get_donation_stats(individual_id):
+    return jsonify(donation_stats_index().get(individual_id)), 200
+
+
+@app.route("/api/donation_stats", methods=["GET"])
+@jwt_required()
+@conditional("donations")
+def get_all_donation_stats():
+    if "ids" in request.args:
+        stats = donation_stats_index().get_many(ids_arg(request.args["ids"]))
+        return jsonify({str(individual_id): row for individual_id, row in stats.items()}), 200
+
+    limit, after = page_args()
+    donors = donation_stats_index().donors(after, limit + 1)
+    stats = donation_stats.get_many(donors)
+    return page_response(list(stats.values()), limit, "individual_id")
+
+
+# NAME SEARCH
+name_index = NameIndex(min_score=app.config["SEARCH_MIN_SCORE"])
+NAME_COLUMNS = "SELECT idindividuals, fname, mname, lname FROM individuals /* full scan */"
+
+
+def apply_name_change(table, op, row_id, row):
+    if op == "delete" and row_id is not None:
+        name_index.remove(row_id)
+    elif row_id is not None and row is not None:
+        name_index.add(row_id, row.get("fname"), row.get("mname"), row.get("lname"))
+    elif op == "insert":
+        # Bulk import: ids are auto-increment, so pick up everything past the newest indexed one
+        for new_id, *parts in iter_rows(NAME_COLUMNS + " WHERE idindividuals > %s", (name_index.max_id,)):
+            name_index.add(new_id, *parts)
+    else:
+        return False
+    return True
+
+
+name_index_loader = IndexLoader(lambda: name_index.load(iter_rows(NAME_COLUMNS)), apply_name_change)
+
+
+def name_search_index():
+    name_index_loader.ensure_loaded()
+    return name_index
+
+
+@on_change
+def update_name_index(table, op, row_id, row):
+    if table == "individuals":
+        name_index_loader.notify(table, op, row_id, row)
+
+
+@app.route("/api/individuals/search", methods=["GET"])
+@jwt_required()
+@conditional("individuals")
+def search_individual_names():
+    query = request.args.get("q", "").strip()
+    if not query:
+        raise InvalidParameter("q is required.")
+    try:
+        limit = int(request.args.get("limit", app.config["SEARCH_LIMIT_DEFAULT"]))
+    except ValueError:
+        raise InvalidParameter("limit must be an integer.")
+    if limit < 1:
+        raise InvalidParameter("limit must be positive.")
+    matches = name_search_index().search(query, min(limit, app.config["SEARCH_LIMIT_MAX"]))
+    return jsonify(matches), 200
+
+
+# WARM-UP
+warm_up_started = threading.Event()
+warm_up_lock = threading.Lock()
+
+
+def load_indexes():
+    lookup_cache.load()
+    for loader in (lineage_loader, donation_stats_loader, name_index_loader):
+        loader.ensure_loaded()
+
+
+def warm_up():
+    # A request that needs an index before this thread gets to it loads it
+    # itself; the thread then finds it loaded, so nothing is read twice
+    with app.app_context():
+        try:
+            load_indexes()
+        except (MySQLdb.Error, PoolTimeout):
+            app.logger.exception("Warm-up failed; the indexes will load on first use.")
+
+
+@app.before_request
+def start_warm_up():
+    if warm_up_started.is_set() or not app.config["WARM_UP_INDEXES"]:
+        return
+    with warm_up_lock:
+        if not warm_up_started.is_set():
+            threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+            warm_up_started.set()
+
+
+# SCHEMA
+@app.cli.command("migrate")
+@click.option("--target", type=int, default=None, help="Stop after this migration version.")
+def migrate_command(target):
+    """Apply pending schema migrations from public/migrations."""
+    ran = apply_migrations(mysql.connection, target=target)
+    for version, name in ran:
+        click.echo(f"Applied {version:03d}_{name}")
+    if not ran:
+        click.echo("Schema is up to date.")
+
+
+@app.cli.command("compact-change-log")
+@click.option("--batch-size", type=int, default=10000, help="Log entries examined per DELETE/commit.")
+def compact_change_log_command(batch_size):
+    """Drop change log entries superseded by a later entry for the same row."""
+    # Every sync token still works afterwards: a client that had not seen the
+    # dropped entry has not seen the later one either, and still gets it.
+    last = fetch_data("SELECT MAX(idchange_log) AS last FROM change_log")[0]["last"] or 0
+    removed = 0
+    for start in range(0, last, batch_size):
+        removed += execute_query(
+            "DELETE old FROM change_log old JOIN change_log newer"
+            " ON newer.table_name = old.table_name AND newer.row_id = old.row_id AND newer.idchange_log > old.idchange_log"
+            " WHERE old.idchange_log > %s AND old.idchange_log <= %s",
+            (start, start + batch_size),
+        )
+    click.echo(f"Removed {removed} superseded change log entries.")
+
+
+@app.cli.command("explain-queries")
+def explain_queries_command():
+    """EXPLAIN every SQL string in app.py and fail on full table or index scans."""
+    with open(__file__) as f:
+        queries = sql_strings(f.read(), globals())
+    queries += [(builder.__name__, sql) for builder in explain_case_builders for sql in builder()]
+    results = check_query_plans(mysql.connection, queries)
+    for line, sql, status, detail in results:
+        click.echo(f"{line:>5}  {status:<9}  {detail}  {(sql or '')[:80]}")
+    failures = [result for result in results if result[2] == "full scan"]
+    if failures:
+        raise click.ClickException(f"{len(failures)} queries scan a whole table or index.")
+
+
 if __name__ == "__main__":
+    with app.app_context():
+        load_indexes()
     app.run(debug=True)
@@ -0,0 +1,501 @@
+# Async serving mode: the REST API of app.py on Starlette, with an aiomysql
+# connection pool, so a request waiting on MySQL holds a coroutine rather than
+# a worker thread. Configuration and JSON encoding come from app.py, and the
+# query builders and parameter parsing from resources.py, which app.py uses
+# too. Run with:
+#
+#   pip install starlette aiomysql uvicorn
+#   uvicorn asgi:app --app-dir public
+#
+# Served here: auth, CRUD and keyset pagination for every resource (with the
+# donation filters), NDJSON streaming, ETags and pool stats. The endpoints
+# backed by in-process indexes (lineage, donation stats, name search), the
+# bulk/CSV loaders, ?expand= and ?since= stay on the WSGI app.
+import asyncio
+import contextlib
+import datetime
+import re
+import uuid
+from collections import defaultdict
+from functools import wraps
+
+import aiomysql
+import jwt
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app import app as flask_app, BOOT_ID, checked_ids, ids_arg, written_table
+from pool import PoolTimeout
+from resources import (
+    InvalidParameter,
+    PRIMARY_KEYS,
+    DONATION_SORTS,
+    date_cursor,
+    donation_cursor,
+    donation_filters,
+    donation_query,
+    ids_query,
+    make_etag,
+    next_page_headers,
+    page_query,
+    parse_fields,
+    parse_page_args,
+)
+
+config = flask_app.config
+
+
+# Same fields, in the same order, as the required_fields checks in app.py
+RESOURCES = {
+    "role_types": ("Role_type", ["description"]),
+    "relationship_types": ("Relationship_type", ["description"]),
+    "donations": ("Donation", ["individual_id", "date", "ampoule_count", "motilitiy_rating"]),
+    "individuals": ("Individual", ["type_id", "birthdate", "is_male", "fname", "mname", "lname", "address", "contact"]),
+    "relationships": ("Relationship", ["type_id", "individual_1_id", "individual_2_id", "date_start", "date_end"]),
+}
+# Tables whose POST handler in app.py returns the new row's id, and whose PUT
+# handler answers 404 for a missing row
+RETURNS_ID = {"donations", "individuals"}
+CHECKS_EXISTS = {"donations", "individuals", "relationships"}
+
+
+def json_response(data, status=200, headers=None):
+    return Response(flask_app.json.dumps(data) + "\n", status, headers, media_type="application/json")
+
+
+def message(text, status):
+    return json_response({"message": text}, status)
+
+
+# Database
+pool = None
+pool_lock = asyncio.Lock()
+
+
+async def open_pool():
+    # Opened on first use, like the sync pool, so the server starts even while
+    # MySQL is down
+    global pool
+    async with pool_lock:
+        if pool is not None:
+            return
+        pool = await aiomysql.create_pool(
+            host=config["MYSQL_HOST"],
+            user=config["MYSQL_USER"],
+            password=config["MYSQL_PASSWORD"],
+            db=config["MYSQL_DB"],
+            minsize=config["MYSQL_POOL_MIN_SIZE"],
+            maxsize=config["MYSQL_ASYNC_POOL_MAX_SIZE"],
+            pool_recycle=config["MYSQL_POOL_MAX_LIFETIME"],
+            # Every query here is a single statement: autocommit ends its
+            # transaction, with no extra COMMIT/ROLLBACK round trip
+            autocommit=True,
+        )
+
+
+async def close_pool():
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+
+
+@contextlib.asynccontextmanager
+async def connection():
+    if pool is None:
+        await open_pool()
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), config["MYSQL_POOL_TIMEOUT"])
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f"No database connection available within {config['MYSQL_POOL_TIMEOUT']}s.")
+    try:
+        yield conn
+    except Exception:
+        try:
+            await conn.rollback()
+        except Exception:
+            # Broken connection: closing it makes the pool drop it on release
+            conn.close()
+        raise
+    finally:
+        pool.release(conn)
+
+
+async def fetch_data(query, args=()):
+    async with connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(query, args)
+            return await cur.fetchall()
+
+
+async def execute(query, args=()):
+    # Returns the closed cursor, which still holds rowcount and lastrowid
+    async with connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, args)
+    table = written_table(query)
+    if table:
+        bump_version(table)
+    return cur
+
+
+async def execute_query(query, args=()):
+    return (await execute(query, args)).rowcount
+
+
+def stream_data(query, args=()):
+    async def generate():
+        async with connection() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cur:
+                await cur.execute(query, args)
+                while True:
+                    rows = await cur.fetchmany(config["STREAM_CHUNK_SIZE"])
+                    if not rows:
+                        break
+                    yield "".join(flask_app.json.dumps(row) + "\n" for row in rows)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+# ETags, built like app.current_etag from this process's own version counters
+table_versions = defaultdict(int)
+
+
+def bump_version(table):
+    table_versions[table] += 1
+
+
+def current_etag(request, tables):
+    versions = [table_versions[table] for table in tables]
+    full_path = f"{request.url.path}?{request.url.query}"
+    return make_etag(BOOT_ID, versions, full_path, wants_stream(request), config["ETAG_MAX_STALENESS"])
+
+
+def conditional(*tables):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request):
+            etag = current_etag(request, tables)
+            # Weak comparison: W/"x" and "x" both match
+            wanted = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+            if f'"{etag}"' in wanted or "*" in wanted:
+                response = Response(status_code=304)
+            else:
+                response = await func(request)
+                if response.status_code != 200:
+                    return response
+            response.headers["ETag"] = f'W/"{etag}"'
+            response.headers["Vary"] = "Accept"
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Authentication: tokens are interchangeable with the ones flask_jwt_extended
+# issues from app.py (same claims, secret and algorithm), and failures get the
+# same status codes and {"msg": ...} bodies.
+def create_access_token(identity, expires_delta):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claims = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        "sub": identity,
+        "nbf": now,
+        "exp": now + expires_delta,
+    }
+    return jwt.encode(claims, config["JWT_SECRET_KEY"], config["JWT_ALGORITHM"])
+
+
+def authenticate(request):
+    header = request.headers.get("authorization", "").strip().strip(",")
+    if not header:
+        return None, json_response({"msg": "Missing Authorization Header"}, 401)
+    bearer = [value for value in re.split(r",\s*", header) if value.split()[:1] == ["Bearer"]]
+    if len(bearer) != 1:
+        return None, json_response(
+            {"msg": "Missing 'Bearer' type in 'Authorization' header. Expected 'Authorization: Bearer <JWT>'"}, 401
+        )
+    parts = bearer[0].split()
+    if len(parts) != 2:
+        return None, json_response({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+    try:
+        claims = jwt.decode(parts[1], config["JWT_SECRET_KEY"], algorithms=[config["JWT_ALGORITHM"]])
+    except jwt.ExpiredSignatureError:
+        return None, json_response({"msg": "Token has expired"}, 401)
+    except jwt.InvalidTokenError as e:
+        return None, json_response({"msg": str(e)}, 422)
+    if claims.get("type") != "access":
+        return None, json_response({"msg": "Only non-refresh tokens are allowed"}, 422)
+    return claims["sub"], None
+
+
+def jwt_required(func):
+    @wraps(func)
+    async def wrapper(request):
+        identity, error = authenticate(request)
+        if error:
+            return error
+        request.state.identity = identity
+        return await func(request)
+
+    return wrapper
+
+
+def role_required(required_role):
+    def decorator(func):
+        @wraps(func)
+        @jwt_required
+        async def wrapper(request):
+            if request.state.identity["role"] != required_role:
+                return message("Access forbidden.", 403)
+            return await func(request)
+
+        return wrapper
+
+    return decorator
+
+
+async def json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise InvalidParameter("Request body must be JSON.")
+
+
+async def test_jwt(request):
+    return json_response({"message": "Token is valid!", "user": request.state.identity})
+
+
+async def register(request):
+    data = await json_body(request)
+    await execute_query(
+        "INSERT INTO users (username, password, role) VALUES (%s, SHA2(%s, 256), %s)",
+        (data["username"], data["password"], data["role"]),
+    )
+    return message("User registered successfully.", 201)
+
+
+async def login(request):
+    data = await json_body(request)
+    user = await fetch_data(
+        "SELECT * FROM users WHERE username = %s AND password = SHA2(%s, 256)",
+        (data["username"], data["password"]),
+    )
+    if user:
+        access_token = create_access_token(
+            {"username": user[0]["username"], "role": user[0]["role"]},
+            datetime.timedelta(hours=5),
+        )
+        return json_response({"token": access_token})
+    return message("Invalid credentials.", 401)
+
+
+async def pool_stats(request):
+    if pool is None:
+        await open_pool()
+    return json_response({
+        "size": pool.size,
+        "idle": pool.freesize,
+        "in_use": pool.size - pool.freesize,
+        "min_size": pool.minsize,
+        "max_size": pool.maxsize,
+    })
+
+
+# Collections
+def page_args(request, parse_cursor=int):
+    return parse_page_args(request.query_params, config["PAGE_SIZE_DEFAULT"], config["PAGE_SIZE_MAX"], parse_cursor)
+
+
+def page_response(request, rows, limit, id_column, cursor=None):
+    headers = next_page_headers(rows, limit, id_column, request.url.path, dict(request.query_params), cursor)
+    return json_response(rows[:limit], 200, headers)
+
+
+# Served only by app.py. Rejected rather than ignored, so a URL never means
+# a delta or an expanded page on one server and a plain page on the other.
+UNSUPPORTED_PARAMS = ("since", "expand")
+
+
+def reject_unsupported(request):
+    unsupported = [name for name in UNSUPPORTED_PARAMS if name in request.query_params]
+    if unsupported:
+        raise InvalidParameter(f"Not supported by the async server: {', '.join(f'?{name}=' for name in unsupported)}.")
+
+
+def wants_stream(request):
+    return request.query_params.get("stream") == "1" or "application/x-ndjson" in request.headers.get("accept", "")
+
+
+async def fetch_by_ids(request, table, ids):
+    id_column = PRIMARY_KEYS[table]
+    rows = []
+    if ids:
+        columns = parse_fields(table, request.query_params.get("fields"))
+        rows = await fetch_data(ids_query(table, columns, len(ids)), tuple(ids))
+    found = {row[id_column]: row for row in rows}
+    return json_response({str(row_id): found.get(row_id) for row_id in ids})
+
+
+async def fetch_page(request, table):
+    if "ids" in request.query_params:
+        return await fetch_by_ids(request, table, ids_arg(request.query_params["ids"]))
+    id_column = PRIMARY_KEYS[table]
+    limit, after = page_args(request)
+    query = page_query(table, parse_fields(table, request.query_params.get("fields")), after is not None)
+    args = () if after is None else (after,)
+    if wants_stream(request):
+        return stream_data(query, args)
+    rows = await fetch_data(query + " LIMIT %s", args + (limit + 1,))
+    return page_response(request, rows, limit, id_column)
+
+
+async def get_donations(request):
+    if "ids" in request.query_params:
+        return await fetch_by_ids(request, "donations", ids_arg(request.query_params["ids"]))
+    sort = request.query_params.get("sort", "id")
+    if sort not in DONATION_SORTS:
+        raise InvalidParameter(f"sort must be one of: {', '.join(DONATION_SORTS)}.")
+    columns = DONATION_SORTS[sort][0]
+    limit, after = page_args(request, date_cursor if len(columns) > 1 else int)
+    conditions, args = donation_filters(request.query_params)
+    if after is not None:
+        args.extend(after if isinstance(after, tuple) else (after,))
+
+    select = parse_fields("donations", request.query_params.get("fields"), columns)
+    query = donation_query(select, conditions, sort, after is not None)
+    if wants_stream(request):
+        return stream_data(query, tuple(args))
+    rows = await fetch_data(query + " LIMIT %s", tuple(args) + (limit + 1,))
+    return page_response(request, rows, limit, "iddonations", donation_cursor(sort))
+
+
+def resource_routes(table):
+    # GET (collection and by id), POST, PUT and DELETE for one table, with the
+    # messages and status codes of the matching handlers in app.py
+    name, fields = RESOURCES[table]
+    id_column = PRIMARY_KEYS[table]
+
+    async def get_all(request):
+        reject_unsupported(request)
+        if table == "donations":
+            return await get_donations(request)
+        return await fetch_page(request, table)
+
+    async def get_by_ids(request):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        ids = data.get("ids") if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(row_id, int) and not isinstance(row_id, bool) for row_id in ids):
+            raise InvalidParameter('Expected {"ids": [<integer>, ...]}.')
+        return await fetch_by_ids(request, table, checked_ids(ids))
+
+    async def get_one(request):
+        reject_unsupported(request)
+        columns = parse_fields(table, request.query_params.get("fields"))
+        rows = await fetch_data(f"SELECT {columns} FROM {table} WHERE {id_column} = %s", (request.path_params["id"],))
+        return json_response(rows)
+
+    async def validated(request):
+        data = await json_body(request)
+        if not isinstance(data, dict):
+            raise InvalidParameter("Request body must be a JSON object.")
+        missing_fields = [field for field in fields if field not in data]
+        if missing_fields:
+            raise InvalidParameter(f"Missing fields: {', '.join(missing_fields)}")
+        return [data[field] for field in fields]
+
+    async def add(request):
+        values = await validated(request)
+        cur = await execute(
+            f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join(['%s'] * len(fields))})", values
+        )
+        if table in RETURNS_ID:
+            return json_response({"message": f"{name} added successfully.", "id": cur.lastrowid}, 201)
+        return message(f"{name} added successfully.", 201)
+
+    async def update(request):
+        values = await validated(request)
+        # rowcount can't tell a missing row from an unchanged one
+        if table in CHECKS_EXISTS and not await fetch_data(
+            f"SELECT {id_column} FROM {table} WHERE {id_column} = %s", (request.path_params["id"],)
+        ):
+            return message(f"{name} not found.", 404)
+        await execute_query(
+            f"UPDATE {table} SET {', '.join(f'{field} = %s' for field in fields)} WHERE {id_column} = %s",
+            values + [request.path_params["id"]],
+        )
+        return message(f"{name} updated successfully.", 200)
+
+    async def delete(request):
+        try:
+            rows_affected = await execute_query(f"DELETE FROM {table} WHERE {id_column} = %s", (request.path_params["id"],))
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            return message(str(e), 500)
+        if rows_affected == 0:
+            return message(f"{name} not found.", 404)
+        return message(f"{name} deleted successfully.", 200)
+
+    return [
+        Route(f"/api/{table}", jwt_required(conditional(table)(get_all)), methods=["GET"]),
+        Route(f"/api/{table}/{{id:int}}", jwt_required(conditional(table)(get_one)), methods=["GET"]),
+        Route(f"/api/{table}/by_ids", jwt_required(get_by_ids), methods=["POST"]),
+        Route(f"/api/{table}", role_required("admin")(add), methods=["POST"]),
+        Route(f"/api/{table}/{{id:int}}", role_required("admin")(update), methods=["PUT"]),
+        Route(f"/api/{table}/{{id:int}}", role_required("admin")(delete), methods=["DELETE"]),
+    ]
+
+
+async def handle_invalid_parameter(request, e):
+    return message(str(e), 400)
+
+
+async def handle_pool_timeout(request, e):
+    return message(str(e), 503)
+
+
+async def handle_http_exception(request, e):
+    return message(e.detail, e.status_code)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_pool()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/test", jwt_required(test_jwt), methods=["GET"]),
+        Route("/api/auth/register", register, methods=["POST"]),
+        Route("/api/auth/login", login, methods=["POST"]),
+        Route("/api/pool/stats", role_required("admin")(pool_stats), methods=["GET"]),
+        *[route for table in RESOURCES for route in resource_routes(table)],
+    ],
+    exception_handlers={
+        InvalidParameter: handle_invalid_parameter,
+        PoolTimeout: handle_pool_timeout,
+        HTTPException: handle_http_exception,
+    },
+    middleware=[
+        # Same thresholds as app.py; streamed responses are compressed as they go
+        Middleware(
+            GZipMiddleware,
+            minimum_size=config["COMPRESS_MIN_SIZE"],
+            compresslevel=config["COMPRESS_LEVELS"]["gzip"],
+        ),
+    ],
+    lifespan=lifespan,
+)
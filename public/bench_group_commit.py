@@ -0,0 +1,114 @@
+# Donation insert benchmark: one INSERT + commit per request (the default
+# add_donation path) against the group-commit writer. N threads insert back to
+# back for --duration seconds in each mode; throughput and latency per insert
+# are printed as one JSON line per mode.
+#
+#   python public/bench_group_commit.py --individual-id 1 --threads 50 --duration 10
+#
+# Uses the MYSQL_* settings from app.py and writes real rows, so point it at a
+# scratch database. The rows it inserted are deleted afterwards unless --keep.
+import argparse
+import json
+import threading
+import time
+
+from app import app, mysql
+from group_commit import GroupCommitWriter
+from loadtest import percentile
+
+
+INSERT = "INSERT INTO donations (individual_id, date, ampoule_count, motilitiy_rating)"
+
+
+def direct_insert(values):
+    # What add_donation does with DONATION_GROUP_COMMIT off
+    conn = mysql.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute(INSERT + " VALUES (%s, %s, %s, %s)", values)
+        conn.commit()
+        row_id = cur.lastrowid
+        cur.close()
+        return row_id
+    finally:
+        mysql.pool.release(conn)
+
+
+def run_mode(insert, values, threads, duration):
+    latencies = []
+    ids = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        mine, my_ids = [], []
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                my_ids.append(insert(values))
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            mine.append(time.monotonic() - started)
+        with lock:
+            latencies.extend(mine)
+            ids.extend(my_ids)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {
+        "inserts": len(ids),
+        "rps": round(len(ids) / duration, 1),
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "errors": len(errors),
+    }, ids
+
+
+def delete_rows(ids):
+    conn = mysql.pool.acquire()
+    try:
+        cur = conn.cursor()
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start : start + 1000]
+            cur.execute(f"DELETE FROM donations WHERE iddonations IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        conn.commit()
+        cur.close()
+    finally:
+        mysql.pool.release(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request commits with group commit for donation inserts.")
+    parser.add_argument("--individual-id", type=int, required=True, help="An existing individual to log donations for.")
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per mode.")
+    parser.add_argument("--max-delay-ms", type=float, default=app.config["DONATION_GROUP_COMMIT_MAX_DELAY_MS"])
+    parser.add_argument("--max-rows", type=int, default=app.config["DONATION_GROUP_COMMIT_MAX_ROWS"])
+    parser.add_argument("--keep", action="store_true", help="Keep the inserted rows.")
+    args = parser.parse_args()
+
+    # One connection per thread for the direct path, plus one for the writer
+    app.config["MYSQL_POOL_MAX_SIZE"] = max(app.config["MYSQL_POOL_MAX_SIZE"], args.threads + 1)
+    writer = GroupCommitWriter(lambda: mysql.pool, INSERT, max_delay=args.max_delay_ms / 1000, max_rows=args.max_rows)
+    values = (args.individual_id, "2024-01-01", 1, 3.5)
+    inserted = []
+    try:
+        for mode, insert in (("direct", direct_insert), ("group", writer.submit)):
+            result, ids = run_mode(insert, values, args.threads, args.duration)
+            inserted.extend(ids)
+            if mode == "group":
+                result["rows_per_commit"] = writer.stats()["rows_per_group"]
+            print(json.dumps({"mode": mode, "threads": args.threads, **result}), flush=True)
+    finally:
+        if inserted and not args.keep:
+            delete_rows(inserted)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Serialisation benchmark for JSON row payloads. Builds N rows shaped like the
+# individuals, donations and relationships DictCursor rows (dates, Decimal,
+# strings) and times each encoder over them, best of --repeat runs:
+#
+#   python public/bench_json.py --rows 100000 --repeat 5
+#
+# "flask-default" is Flask's stock provider (sorted keys, RFC 1123 dates),
+# "stdlib" and "orjson" are FastJSONProvider with each backend. orjson is
+# skipped when it is not installed.
+import argparse
+import datetime
+import decimal
+import json
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from json_provider import FastJSONProvider
+
+
+def individual(i):
+    return {
+        "idindividuals": i,
+        "type_id": i % 3 + 1,
+        "birthdate": datetime.date(1970, 1, 1) + datetime.timedelta(days=i % 15000),
+        "sex": i % 2,
+        "fname": f"Name{i % 5000}",
+        "mname": "",
+        "lname": f"Surname{i % 9000}",
+        "address": f"{i % 999} Rizal Street, Cebu City",
+        "contact_info": f"0917{i:07d}",
+    }
+
+
+def donation(i):
+    return {
+        "iddonations": i,
+        "individual_id": i % 20000 + 1,
+        "date": datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 1500),
+        "ampoule_count": i % 10 + 1,
+        "motilitiy_rating": decimal.Decimal(i % 50) / 10,
+    }
+
+
+def relationship(i):
+    start = datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 8000)
+    return {
+        "idrelationships": i,
+        "type_id": i % 4 + 1,
+        "individual_1_id": i % 20000 + 1,
+        "individual_2_id": (i * 7) % 20000 + 1,
+        "date_start": start,
+        "date_end": start + datetime.timedelta(days=365) if i % 3 == 0 else None,
+    }
+
+
+def best_of(repeat, func, rows):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(func(rows))
+        timings.append(time.perf_counter() - started)
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON encoders on row payloads.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per encoder; the fastest is reported.")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    encoders = {
+        "flask-default": DefaultJSONProvider(app).dumps,
+        "stdlib": FastJSONProvider(app, use_orjson=False).dumps,
+    }
+    if json_provider.orjson is not None:
+        encoders["orjson"] = FastJSONProvider(app, use_orjson=True).dumps_bytes
+
+    for name, make_row in (("individuals", individual), ("donations", donation), ("relationships", relationship)):
+        rows = [make_row(i) for i in range(1, args.rows + 1)]
+        baseline = None
+        for encoder, dumps in encoders.items():
+            seconds, size = best_of(args.repeat, dumps, rows)
+            baseline = baseline or seconds
+            print(
+                json.dumps(
+                    {
+                        "payload": name,
+                        "rows": args.rows,
+                        "encoder": encoder,
+                        "ms": round(seconds * 1000, 1),
+                        "bytes": size,
+                        "speedup": round(baseline / seconds, 2),
+                    }
+                ),
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
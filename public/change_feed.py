@@ -0,0 +1,56 @@
+import itertools
+import threading
+import uuid
+from collections import deque
+
+
+class ChangeFeed:
+    # Bounded, in-process buffer of change events for the SSE stream. Event ids
+    # are "<epoch>-<seq>": the epoch is new for every process, so a client
+    # resuming with an id from another process (or one that has fallen out of
+    # the buffer) is told to reload instead of silently missing changes.
+    def __init__(self, size=1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)  # (seq, event)
+        self._next_seq = 1
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return f"{self.epoch}-{self._next_seq - 1}"
+
+    def publish(self, event):
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._events.append((seq, event))
+            self._cond.notify_all()
+        return f"{self.epoch}-{seq}"
+
+    def since(self, last_id):
+        # [(id, event)] after last_id, or None when last_id can't be resumed from
+        with self._cond:
+            return self._since(last_id)
+
+    def wait(self, last_id, timeout):
+        # Like since(), but blocks up to timeout seconds for something new
+        with self._cond:
+            events = self._since(last_id)
+            if events == []:
+                self._cond.wait(timeout)
+                events = self._since(last_id)
+            return events
+
+    def _since(self, last_id):
+        if last_id is None:
+            return []
+        epoch, _, seq = str(last_id).rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._events[0][0] if self._events else self._next_seq
+        if seq < oldest - 1 or seq >= self._next_seq:
+            return None
+        start = seq - oldest + 1
+        return [(f"{self.epoch}-{s}", event) for s, event in itertools.islice(self._events, start, None)]
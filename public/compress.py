@@ -0,0 +1,116 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Content types worth compressing; images, archives etc. already are
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "application/javascript", "image/svg+xml"}
+
+
+class GzipStream:
+    def __init__(self, level):
+        # wbits 31: gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def available_encodings():
+    # Server preference when the client rates several encodings equally
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = ZstdStream
+    if brotli is not None:
+        encodings["br"] = BrotliStream
+    encodings["gzip"] = GzipStream
+    return encodings
+
+
+def is_compressible(mimetype):
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+
+def compress_chunks(chunks, stream):
+    # Flush after every chunk so each one reaches the client as soon as it is
+    # produced, instead of sitting in the compressor's window
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = stream.compress(chunk) + stream.flush()
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response, accept_encodings, levels, min_size):
+    # Compresses a Flask/Werkzeug response in place when the client accepts one
+    # of the available encodings. Buffered bodies under min_size are left
+    # alone; streamed bodies are compressed chunk by chunk, never buffered.
+    if not is_compressible(response.mimetype) or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if not response.is_streamed and response.content_length is not None and response.content_length < min_size:
+        return response
+
+    encodings = available_encodings()
+    encoding = accept_encodings.best_match(list(encodings))
+    if encoding is None:
+        return response
+    stream = encodings[encoding](levels[encoding])
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, stream)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(stream.compress(response.get_data()) + stream.finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
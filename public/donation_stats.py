@@ -0,0 +1,113 @@
+import bisect
+import datetime
+import threading
+
+
+AGGREGATE_COLUMNS = """
+    individual_id,
+    COUNT(*) AS donation_count,
+    SUM(ampoule_count) AS total_ampoules,
+    SUM(motilitiy_rating) AS rating_sum,
+    MIN(motilitiy_rating) AS motility_min,
+    MAX(motilitiy_rating) AS motility_max,
+    MAX(date) AS last_donation_date
+"""
+
+
+class DonationStats:
+    # Per-donor donation aggregates. load() takes the GROUP BY over the whole
+    # table once; afterwards inserts are folded in arithmetically and anything
+    # that can lower a min/max or a last date (updates, deletes) is handled by
+    # replacing the donor's entry with a fresh aggregate of just their rows.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._donors = []  # sorted ids of _stats, for paging
+
+    def load(self, rows):
+        stats = {row["individual_id"]: self._normalise(row) for row in rows}
+        donors = sorted(stats)
+        with self._lock:
+            self._stats = stats
+            self._donors = donors
+
+    def add(self, individual_id, date, ampoule_count, motility_rating):
+        with self._lock:
+            current = self._stats.get(individual_id)
+            if current is None:
+                bisect.insort(self._donors, individual_id)
+                self._stats[individual_id] = {
+                    "donation_count": 1,
+                    "total_ampoules": ampoule_count,
+                    "rating_sum": motility_rating,
+                    "motility_min": motility_rating,
+                    "motility_max": motility_rating,
+                    "last_donation_date": date,
+                }
+                return
+            current["donation_count"] += 1
+            current["total_ampoules"] += ampoule_count
+            current["rating_sum"] += motility_rating
+            current["motility_min"] = min(current["motility_min"], motility_rating)
+            current["motility_max"] = max(current["motility_max"], motility_rating)
+            if current["last_donation_date"] is None or date > current["last_donation_date"]:
+                current["last_donation_date"] = date
+
+    def replace(self, individual_id, row):
+        with self._lock:
+            if row:
+                if individual_id not in self._stats:
+                    bisect.insort(self._donors, individual_id)
+                self._stats[individual_id] = self._normalise(row)
+            elif self._stats.pop(individual_id, None) is not None:
+                del self._donors[bisect.bisect_left(self._donors, individual_id)]
+
+    def get(self, individual_id):
+        with self._lock:
+            return self._public(individual_id, self._stats.get(individual_id))
+
+    def get_many(self, individual_ids):
+        with self._lock:
+            return {individual_id: self._public(individual_id, self._stats.get(individual_id)) for individual_id in individual_ids}
+
+    def donors(self, after=None, limit=None):
+        # Ids of donors with stats, ascending, starting after `after`
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._donors, after)
+            return self._donors[start : None if limit is None else start + limit]
+
+    @staticmethod
+    def _normalise(row):
+        last_date = row["last_donation_date"]
+        if isinstance(last_date, datetime.datetime):
+            last_date = last_date.date()
+        return {
+            "donation_count": int(row["donation_count"]),
+            "total_ampoules": int(row["total_ampoules"] or 0),
+            "rating_sum": float(row["rating_sum"] or 0),
+            "motility_min": float(row["motility_min"]) if row["motility_min"] is not None else None,
+            "motility_max": float(row["motility_max"]) if row["motility_max"] is not None else None,
+            "last_donation_date": last_date,
+        }
+
+    @staticmethod
+    def _public(individual_id, stats):
+        if stats is None:
+            return {
+                "individual_id": individual_id,
+                "donation_count": 0,
+                "total_ampoules": 0,
+                "last_donation_date": None,
+                "motility_mean": None,
+                "motility_min": None,
+                "motility_max": None,
+            }
+        return {
+            "individual_id": individual_id,
+            "donation_count": stats["donation_count"],
+            "total_ampoules": stats["total_ampoules"],
+            "last_donation_date": stats["last_donation_date"].isoformat() if stats["last_donation_date"] else None,
+            "motility_mean": round(stats["rating_sum"] / stats["donation_count"], 4),
+            "motility_min": stats["motility_min"],
+            "motility_max": stats["motility_max"],
+        }
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+
+import MySQLdb
+
+
+class PendingRow:
+    def __init__(self, values):
+        self.values = values
+        self.row_id = None
+        self.error = None
+        self.done = threading.Event()
+
+    def resolve(self, row_id=None, error=None):
+        self.row_id = row_id
+        self.error = error
+        self.done.set()
+
+
+class GroupCommitWriter:
+    # Funnels single-row INSERTs from many request threads into one background
+    # writer. It waits up to max_delay seconds (or until max_rows are queued)
+    # after the first row arrives, then writes the group as one multi-row
+    # INSERT and one commit, so concurrent requests share a single fsync.
+    # submit() returns only after that commit, with the row's own id.
+    #
+    # Ids come from lastrowid (the first id of the statement) stepped by
+    # @@auto_increment_increment: InnoDB hands out consecutive values to a
+    # multi-row INSERT whose row count is known up front, in every
+    # innodb_autoinc_lock_mode.
+    def __init__(self, pool, insert, max_delay=0.005, max_rows=100, observe=None):
+        self.pool = pool  # pool() -> ConnectionPool, resolved lazily
+        self.insert = insert  # "INSERT INTO table (a, b, ...)"
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+        self.observe = observe  # observe(query, started, rows) after each statement
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._increment = None
+        self._stats = {"rows": 0, "groups": 0, "fallbacks": 0}
+
+    def submit(self, values):
+        pending = PendingRow(tuple(values))
+        self._start()
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.row_id
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["rows_per_group"] = round(stats["rows"] / stats["groups"], 1) if stats["groups"] else 0
+        return stats
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(group) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(group)
+            except Exception as e:
+                for pending in group:
+                    if not pending.done.is_set():
+                        pending.resolve(error=e)
+
+    def _write(self, group):
+        pool = self.pool()
+        conn = pool.acquire()
+        broken = False
+        try:
+            try:
+                ids = self._insert(conn, [pending.values for pending in group])
+            except (MySQLdb.IntegrityError, MySQLdb.DataError):
+                conn.rollback()
+                if len(group) == 1:
+                    raise
+                # One bad row must not fail the others: retry them one by one
+                with self._lock:
+                    self._stats["fallbacks"] += 1
+                for pending in group:
+                    try:
+                        pending.resolve(self._insert(conn, [pending.values])[0])
+                    except (MySQLdb.IntegrityError, MySQLdb.DataError) as e:
+                        conn.rollback()
+                        pending.resolve(error=e)
+                return
+            for pending, row_id in zip(group, ids):
+                pending.resolve(row_id)
+        except MySQLdb.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(conn, broken=broken)
+
+    def _insert(self, conn, rows):
+        cur = conn.cursor()
+        try:
+            if self._increment is None:
+                cur.execute("SELECT @@auto_increment_increment")
+                self._increment = int(cur.fetchone()[0])
+            row_placeholders = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+            query = f"{self.insert} VALUES {', '.join([row_placeholders] * len(rows))}"
+            started = time.perf_counter()
+            cur.execute(query, [value for row in rows for value in row])
+            conn.commit()
+            if self.observe:
+                self.observe(query, started, len(rows))
+            first_id = cur.lastrowid
+        finally:
+            cur.close()
+        with self._lock:
+            self._stats["rows"] += len(rows)
+            self._stats["groups"] += 1
+        return [first_id + index * self._increment for index in range(len(rows))]
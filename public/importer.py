@@ -0,0 +1,102 @@
+import csv
+import datetime
+
+
+INDIVIDUAL_COLUMNS = ["type_id", "birthdate", "is_male", "fname", "mname", "lname", "address", "contact"]
+MAX_REPORTED_ERRORS = 100
+
+TRUE_VALUES = {"1", "true", "yes", "m", "male"}
+FALSE_VALUES = {"0", "false", "no", "f", "female"}
+
+
+def coerce_individual(record):
+    missing_fields = [field for field in INDIVIDUAL_COLUMNS if record.get(field) is None]
+    if missing_fields:
+        raise ValueError(f"Missing fields: {', '.join(missing_fields)}")
+    try:
+        type_id = int(record["type_id"])
+        birthdate = datetime.date.fromisoformat(record["birthdate"].strip())
+    except ValueError as e:
+        raise ValueError(f"Invalid value: {e}")
+    is_male = record["is_male"].strip().lower()
+    if is_male not in TRUE_VALUES | FALSE_VALUES:
+        raise ValueError(f"Invalid value for is_male: {record['is_male']!r}")
+    fname, lname = record["fname"].strip(), record["lname"].strip()
+    if not fname or not lname:
+        raise ValueError("fname and lname must not be empty.")
+    return (
+        type_id,
+        birthdate,
+        1 if is_male in TRUE_VALUES else 0,
+        fname,
+        record["mname"].strip(),
+        lname,
+        record["address"].strip(),
+        record["contact"].strip(),
+    )
+
+
+def import_csv(lines, insert_batch, commit, rollback, batch_size=1000, resume_from=0, validate=None, on_checkpoint=None):
+    # Streams `lines` (any iterable of CSV text lines with a header row) and
+    # inserts valid rows in batches, committing each one. The checkpoint is the
+    # number of the last data row whose batch committed; pass it back as
+    # resume_from to continue after a failure ("failed" is set in the result).
+    # Only one batch is held in memory.
+    reader = csv.DictReader(lines)
+    missing_columns = [column for column in INDIVIDUAL_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+
+    result = {"inserted": 0, "skipped": 0, "error_count": 0, "errors": [], "checkpoint": resume_from}
+    batch = []
+    row_number = 0
+
+    def flush():
+        if batch:
+            try:
+                inserted = insert_batch(batch)
+                commit()
+            except Exception as e:
+                # Stop at the failing batch; everything before the checkpoint is committed
+                rollback()
+                result["failed"] = str(e)
+                return False
+            result["inserted"] += inserted
+        result["checkpoint"] = row_number
+        if on_checkpoint:
+            on_checkpoint(row_number)
+        batch.clear()
+        return True
+
+    rows = enumerate(reader, start=1)
+    while True:
+        try:
+            row_number, record = next(rows)
+        except StopIteration:
+            break
+        except UnicodeDecodeError as e:
+            # The text can't be read past this point: keep what came before
+            # and stop at its checkpoint, as for a failed batch
+            if row_number > result["checkpoint"] and not flush():
+                return result
+            result["failed"] = f"Invalid {e.encoding} after row {row_number}: {e.reason}"
+            result["invalid_encoding"] = True
+            return result
+        if row_number <= resume_from:
+            result["skipped"] += 1
+            continue
+        try:
+            values = coerce_individual(record)
+            if validate:
+                validate(values)
+        except ValueError as e:
+            result["error_count"] += 1
+            if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                result["errors"].append({"row": row_number, "message": str(e)})
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size and not flush():
+            return result
+    if row_number > result["checkpoint"]:
+        flush()
+    return result
@@ -0,0 +1,51 @@
+import threading
+
+
+class IndexLoader:
+    # Keeps an in-memory index loaded without ever reading its table twice at
+    # once. Concurrent callers of ensure_loaded() wait for the one running load.
+    # Changes reported while it reads the table are queued and replayed once it
+    # is in place instead of invalidating it, so a table that is being written
+    # to still finishes loading. The load may already include a queued change,
+    # so replay(change) must be safe to apply twice; it defaults to apply.
+    # apply()/replay() return False when a change can't be applied
+    # incrementally and the index has to be read again.
+    def __init__(self, load, apply, replay=None):
+        self._load = load
+        self._apply = apply
+        self._replay = replay or apply
+        self._load_lock = threading.Lock()  # held for the whole load
+        self._lock = threading.Lock()  # guards loaded and _pending
+        self._pending = None  # changes reported during a load; None when idle
+        self.loaded = False
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self._load_lock:
+            while not self.loaded:
+                with self._lock:
+                    self._pending = []
+                try:
+                    self._load()
+                except BaseException:
+                    with self._lock:
+                        self._pending = None
+                    raise
+                with self._lock:
+                    pending, self._pending = self._pending, None
+                    self.loaded = all(change is not None and self._replay(*change) for change in pending)
+
+    def notify(self, *change):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            elif self.loaded and not self._apply(*change):
+                self.loaded = False
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded = False
+            if self._pending is not None:
+                # The running load may predate whatever made this necessary
+                self._pending.append(None)
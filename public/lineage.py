@@ -0,0 +1,116 @@
+import threading
+from collections import defaultdict, deque
+
+
+class LineageGraph:
+    # Parent -> child adjacency built from the relationships whose type is one of
+    # the lineage types (individual_1 is the donor/parent, individual_2 the
+    # offspring). Every relationship is remembered by id so updates and deletes
+    # can move or drop its edge without rescanning the table.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._edges = {}  # relationship id -> (type_id, individual_1_id, individual_2_id)
+        self._lineage_types = set()
+        self._children = defaultdict(set)
+        self._parents = defaultdict(set)
+        self._pair_count = defaultdict(int)  # (parent, child) -> relationships describing it
+
+    def load(self, rows, lineage_types):
+        with self._lock:
+            self._clear()
+            self._lineage_types = set(lineage_types)
+            for row in rows:
+                self._add(row["idrelationships"], row["type_id"], row["individual_1_id"], row["individual_2_id"])
+
+    def upsert(self, relationship_id, type_id, individual_1_id, individual_2_id):
+        with self._lock:
+            self._remove(relationship_id)
+            self._add(relationship_id, type_id, individual_1_id, individual_2_id)
+
+    def remove(self, relationship_id):
+        with self._lock:
+            self._remove(relationship_id)
+
+    def parents(self, individual_id):
+        with self._lock:
+            return sorted(self._parents.get(individual_id, ()))
+
+    def children(self, individual_id):
+        with self._lock:
+            return sorted(self._children.get(individual_id, ()))
+
+    def ancestors(self, individual_id, max_depth=None):
+        return self._walk(individual_id, self._parents, max_depth)
+
+    def descendants(self, individual_id, max_depth=None):
+        return self._walk(individual_id, self._children, max_depth)
+
+    def siblings(self, individual_id):
+        with self._lock:
+            parents = self._parents.get(individual_id, set())
+            shared = defaultdict(int)
+            for parent in parents:
+                for child in self._children[parent]:
+                    if child != individual_id:
+                        shared[child] += 1
+            full, half = [], []
+            for sibling, count in shared.items():
+                # Full siblings share every known parent, and there are at least two
+                if count >= 2 and self._parents[sibling] == parents:
+                    full.append(sibling)
+                else:
+                    half.append(sibling)
+            return {"full": sorted(full), "half": sorted(half)}
+
+    def kinship(self, individual_1_id, individual_2_id):
+        # Degree of kinship in the civil-law sense: generations up from each
+        # individual to their closest common ancestor, added together.
+        up_1 = self.ancestors(individual_1_id)
+        up_2 = self.ancestors(individual_2_id)
+        up_1[individual_1_id] = 0
+        up_2[individual_2_id] = 0
+        common = {ancestor: up_1[ancestor] + up_2[ancestor] for ancestor in up_1.keys() & up_2.keys()}
+        if not common:
+            return None
+        degree = min(common.values())
+        return {
+            "degree": degree,
+            "common_ancestors": sorted(ancestor for ancestor, total in common.items() if total == degree),
+        }
+
+    def _walk(self, start, adjacency, max_depth):
+        with self._lock:
+            depths = {}
+            queue = deque([(start, 0)])
+            while queue:
+                node, depth = queue.popleft()
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for neighbour in adjacency.get(node, ()):
+                    if neighbour not in depths and neighbour != start:
+                        depths[neighbour] = depth + 1
+                        queue.append((neighbour, depth + 1))
+            return depths
+
+    def _add(self, relationship_id, type_id, individual_1_id, individual_2_id):
+        self._edges[relationship_id] = (type_id, individual_1_id, individual_2_id)
+        if type_id in self._lineage_types:
+            self._pair_count[individual_1_id, individual_2_id] += 1
+            self._children[individual_1_id].add(individual_2_id)
+            self._parents[individual_2_id].add(individual_1_id)
+
+    def _remove(self, relationship_id):
+        edge = self._edges.pop(relationship_id, None)
+        if edge is None or edge[0] not in self._lineage_types:
+            return
+        _, parent, child = edge
+        # Two relationships may describe the same parent/child pair
+        self._pair_count[parent, child] -= 1
+        if self._pair_count[parent, child] > 0:
+            return
+        del self._pair_count[parent, child]
+        self._children[parent].discard(child)
+        self._parents[child].discard(parent)
@@ -0,0 +1,140 @@
+# Concurrency load test for the sync (app.py) and async (asgi.py) servers.
+# Holds N connections open, each sending requests back to back, and reports
+# throughput, latency and errors for each concurrency level. A server
+# "sustains" a level when almost every request succeeds within --timeout.
+#
+#   gunicorn -w 1 --threads 10 --chdir public app:app -b :8000     (sync)
+#   uvicorn asgi:app --app-dir public --port 8001                 (async)
+#   python public/loadtest.py http://127.0.0.1:8000 --path "/api/individuals?limit=10" --concurrency 50,200,1000
+#   python public/loadtest.py http://127.0.0.1:8001 --path "/api/individuals?limit=10" --concurrency 50,200,1000
+#
+# Only the standard library is used for the client, so it adds no load of its own
+# beyond one event loop.
+import argparse
+import asyncio
+import datetime
+import json
+import time
+from urllib.parse import urlsplit
+
+
+async def request(reader, writer, host, path, token):
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\nConnection: keep-alive\r\n\r\n".encode()
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip() or b"0", 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def worker(url, token, deadline, timeout, stats):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    reader = writer = None
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            try:
+                status, keep_alive = await asyncio.wait_for(request(reader, writer, parts.netloc, path, token), timeout)
+            finally:
+                stats["in_flight"] -= 1
+            stats["latencies"].append(time.monotonic() - started)
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except asyncio.TimeoutError:
+            stats["errors"]["timeout"] = stats["errors"].get("timeout", 0) + 1
+            writer = close(writer)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            kind = type(e).__name__
+            stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+            writer = close(writer)
+            await asyncio.sleep(0.05)
+    close(writer)
+
+
+def close(writer):
+    if writer is not None:
+        writer.close()
+    return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 1)
+
+
+async def run_level(url, token, concurrency, duration, timeout):
+    stats = {"in_flight": 0, "peak_in_flight": 0, "latencies": [], "statuses": {}, "errors": {}}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(worker(url, token, deadline, timeout, stats) for _ in range(concurrency)))
+    ok = sum(count for status, count in stats["statuses"].items() if status < 400)
+    total = sum(stats["statuses"].values()) + sum(stats["errors"].values())
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "rps": round(ok / duration, 1),
+        "p50_ms": percentile(stats["latencies"], 0.50),
+        "p99_ms": percentile(stats["latencies"], 0.99),
+        "peak_in_flight": stats["peak_in_flight"],
+        "statuses": stats["statuses"],
+        "errors": stats["errors"],
+        "sustained": total > 0 and ok / total >= 0.99,
+    }
+
+
+def mint_token(role):
+    # Signed with app.py's configured secret, valid for both servers
+    from flask_jwt_extended import create_access_token
+    from app import app
+
+    with app.test_request_context():
+        return create_access_token(identity={"username": "loadtest", "role": role}, expires_delta=datetime.timedelta(hours=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency load test for app.py and asgi.py.")
+    parser.add_argument("base_url")
+    parser.add_argument("--path", default="/api/individuals?limit=10")
+    parser.add_argument("--concurrency", default="50,200,1000", help="Comma-separated levels to run in turn.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level.")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a request counts as failed.")
+    parser.add_argument("--token", help="JWT to send (default: mint one with the app's secret).")
+    parser.add_argument("--role", default="user")
+    args = parser.parse_args()
+
+    token = args.token or mint_token(args.role)
+    url = args.base_url.rstrip("/") + args.path
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        print(json.dumps(asyncio.run(run_level(url, token, concurrency, args.duration, args.timeout))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
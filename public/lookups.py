@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class LookupCache:
+    # Whole-table, in-process copy of small reference tables. Reads never touch
+    # MySQL once loaded; writes call invalidate() and the next read reloads. The
+    # optional ttl bounds how stale a process can get when another worker process
+    # did the write.
+    def __init__(self, tables, loader, ttl=None):
+        self.tables = dict(tables)  # table -> primary key column
+        self.loader = loader  # loader(table, id_column) -> list of row dicts
+        self.ttl = ttl
+        self._rows = {}  # table -> {id: row}, ordered by id
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def load(self, table=None):
+        for name in [table] if table else self.tables:
+            id_column = self.tables[name]
+            rows = self.loader(name, id_column)
+            by_id = {row[id_column]: row for row in sorted(rows, key=lambda row: row[id_column])}
+            with self._lock:
+                self._rows[name] = by_id
+                self._loaded_at[name] = time.monotonic()
+
+    def invalidate(self, table):
+        with self._lock:
+            self._loaded_at.pop(table, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._loaded_at.clear()
+
+    def rows(self, table):
+        return list(self._table(table).values())
+
+    def get(self, table, row_id):
+        return self._table(table).get(row_id)
+
+    def _table(self, table):
+        loaded_at = self._loaded_at.get(table)
+        if loaded_at is None or (self.ttl is not None and time.monotonic() - loaded_at > self.ttl):
+            self.load(table)
+        return self._rows[table]
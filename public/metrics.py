@@ -0,0 +1,128 @@
+import bisect
+import functools
+import re
+import threading
+
+
+# Seconds; covers a cached lookup (~1ms) up to a slow export
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+
+
+@functools.lru_cache(maxsize=4096)
+def statement_label(query):
+    # One label per statement shape: whitespace collapsed and "IN (%s, %s, ...)"
+    # or multi-row VALUES lists folded, so batch sizes don't create new series
+    query = " ".join(query.split())
+    query = PLACEHOLDER_LIST.sub("%s, ...", query)
+    return REPEATED_GROUP.sub(r"\1, ...", query)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    # Series are keyed by a tuple of label values. Once max_series is reached,
+    # new label combinations are folded into a single "other" series so a
+    # runaway label (e.g. ad hoc SQL) cannot grow memory without bound.
+    kind = None
+
+    def __init__(self, name, documentation, labels=(), max_series=1000):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, values):
+        if values in self._series or len(self._series) < self.max_series:
+            return values
+        return ("other",) * len(self.labels)
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(line for values, state in series for line in self._render_series(values, state))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            key = self._key(values)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, *values):
+        return self._series.get(values, 0)
+
+    def _render_series(self, values, total):
+        yield f"{self.name}{self._label_text(values)} {format_value(total)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS, max_series=1000):
+        super().__init__(name, documentation, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(values)
+            state = self._series.get(key)
+            if state is None:
+                # [per-bucket counts (last one is +Inf), sum]
+                state = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *values):
+        state = self._series.get(values)
+        return sum(state[0]) if state else 0
+
+    def _render_series(self, values, state):
+        counts, total = state
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield f"{self.name}_bucket{self._label_text(values, [('le', format_value(float(bound)))])} {cumulative}"
+        yield f"{self.name}_sum{self._label_text(values)} {format_value(total)}"
+        yield f"{self.name}_count{self._label_text(values)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
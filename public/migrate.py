@@ -0,0 +1,209 @@
+import ast
+import os
+import re
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+SQL_STATEMENT = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE)\s+\S", re.IGNORECASE)
+PROJECTION = re.compile(r"^\s*SELECT\s+\{\}\s+FROM\s", re.IGNORECASE)
+EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+LIMIT = re.compile(r"\bLIMIT\s+(\d+|%s)\s*$", re.IGNORECASE)
+# Queries that read a whole table on purpose (e.g. to build an in-memory index)
+# carry this comment; explain-queries reports them but does not fail.
+FULL_SCAN_MARKER = "/* full scan */"
+
+
+def discover(directory=MIGRATIONS_DIR):
+    # [(version, name, path)] for every NNN_name.sql file, in version order
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def statements(sql):
+    # Split a migration on semicolons after dropping "--" comment lines.
+    # Migrations must not put ";" inside string literals.
+    sql = "\n".join(line for line in sql.splitlines() if not line.strip().startswith("--"))
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return versions
+
+
+def apply_migrations(conn, directory=MIGRATIONS_DIR, target=None):
+    # Runs pending migrations in order and records each one in
+    # schema_migrations. MySQL commits DDL implicitly, so a migration that
+    # fails halfway is not rolled back: fix the database by hand, then rerun.
+    applied = applied_versions(conn)
+    ran = []
+    for version, name, path in discover(directory):
+        if version in applied or (target is not None and version > target):
+            continue
+        with open(path) as f:
+            sql = f.read()
+        cur = conn.cursor()
+        for statement in statements(sql):
+            cur.execute(statement)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+        cur.close()
+        ran.append((version, name))
+    return ran
+
+
+def sql_strings(source, namespace=None):
+    # [(line, sql)] for every SQL string in a Python source file. f-strings and
+    # "+" concatenations are resolved against namespace (the module globals);
+    # queries that depend on local variables, or that are built up with "+=",
+    # come back with sql=None.
+    namespace = namespace or {}
+    tree = ast.parse(source)
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    extended = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            function = enclosing_function(node, parents)
+            extended.add((function, node.target.id))
+
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Constant, ast.JoinedStr, ast.BinOp)):
+            continue
+        if isinstance(parents.get(node), (ast.JoinedStr, ast.BinOp, ast.FormattedValue)):
+            continue
+        shape = outline(node, namespace)
+        if not SQL_STATEMENT.match(shape):
+            continue
+        sql = evaluate(node, namespace)
+        if sql is None and PROJECTION.match(shape) and shape.count("{}") == 1:
+            # Only the SELECT list is dynamic (?fields=), which does not change the plan
+            sql = shape.replace("{}", "*", 1)
+        parent = parents.get(node)
+        if isinstance(parent, ast.Assign) and any(
+            isinstance(target, ast.Name) and (enclosing_function(node, parents), target.id) in extended
+            for target in parent.targets
+        ):
+            sql = None
+        found.append((node.lineno, " ".join(sql.split()) if sql else None))
+    return sorted(found, key=lambda item: item[0])
+
+
+def enclosing_function(node, parents):
+    while node is not None and not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        node = parents.get(node)
+    return node
+
+
+def evaluate(node, namespace):
+    # The string value of node, or None if it depends on anything but constants
+    # and string globals
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if isinstance(node, ast.Name):
+        value = namespace.get(node.id)
+        return value if isinstance(value, str) else None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = evaluate(node.left, namespace), evaluate(node.right, namespace)
+        return left + right if left is not None and right is not None else None
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                if value.format_spec is not None or value.conversion != -1:
+                    return None
+                value = value.value
+            part = evaluate(value, namespace)
+            if part is None:
+                return None
+            parts.append(part)
+        return "".join(parts)
+    return None
+
+
+def outline(node, namespace):
+    # Like evaluate(), but anything unresolved becomes "{}" so the shape of a
+    # dynamic query is still recognisable as SQL
+    value = evaluate(node, namespace)
+    if value is not None:
+        return value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return outline(node.left, namespace) + outline(node.right, namespace)
+    if isinstance(node, ast.JoinedStr):
+        return "".join(outline(value, namespace) for value in node.values)
+    if isinstance(node, ast.FormattedValue):
+        return outline(node.value, namespace)
+    return "{}"
+
+
+def explain(conn, sql):
+    # Placeholders get a string literal: MySQL converts it for numeric columns,
+    # whereas a number compared with a VARCHAR column would disable its index.
+    cur = conn.cursor()
+    cur.execute("EXPLAIN " + sql, ("1",) * sql.count("%s"))
+    columns = [column[0] for column in cur.description]
+    plan = [dict(zip(columns, row)) for row in cur.fetchall()]
+    cur.close()
+    return plan
+
+
+def full_scans(sql, plan):
+    # Tables read from end to end: type ALL, or type index (every entry of an
+    # index) unless it is an ordered walk that LIMIT stops early. Rows for
+    # derived and UNION results ("<union1,2>") only read the parts listed above.
+    limited = LIMIT.search(sql) is not None
+    scans = []
+    for row in plan:
+        table = row.get("table") or ""
+        extra = row.get("Extra") or ""
+        if table.startswith("<"):
+            continue
+        if row.get("type") == "ALL":
+            scans.append(table)
+        elif row.get("type") == "index" and not (limited and "filesort" not in extra and "temporary" not in extra):
+            scans.append(table)
+    return scans
+
+
+def check_query_plans(conn, queries):
+    # [(line, sql, status, detail)], status one of "ok", "full scan",
+    # "allowed" (marked full scan), "dynamic" or "write" (INSERT, nothing read)
+    results = []
+    for line, sql in queries:
+        if sql is None:
+            results.append((line, sql, "dynamic", "built at runtime"))
+            continue
+        if not EXPLAINABLE.match(sql):
+            results.append((line, sql, "write", ""))
+            continue
+        plan = explain(conn, sql)
+        scans = full_scans(sql, plan)
+        if not scans:
+            detail = ", ".join(f"{row['table']}:{row.get('key') or row.get('Extra') or row.get('type')}" for row in plan)
+            results.append((line, sql, "ok", detail))
+        elif FULL_SCAN_MARKER in sql:
+            results.append((line, sql, "allowed", ", ".join(scans)))
+        else:
+            results.append((line, sql, "full scan", ", ".join(scans)))
+    return results
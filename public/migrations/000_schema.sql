@@ -0,0 +1,60 @@
+-- Tables from docs/erd.pdf (minimized scope). IF NOT EXISTS lets databases
+-- that were created by hand adopt the migration history without changes.
+-- InnoDB indexes every foreign key column, so lookups from a parent row to its
+-- children never scan the child table.
+CREATE TABLE IF NOT EXISTS role_types (
+    idrole_types INT NOT NULL AUTO_INCREMENT,
+    description VARCHAR(45) NOT NULL,
+    PRIMARY KEY (idrole_types)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS relationship_types (
+    idrelationship_types INT NOT NULL AUTO_INCREMENT,
+    description VARCHAR(45) NOT NULL,
+    PRIMARY KEY (idrelationship_types)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS individuals (
+    idindividuals INT NOT NULL AUTO_INCREMENT,
+    type_id INT NOT NULL,
+    birthdate DATE NOT NULL,
+    is_male TINYINT(1) NOT NULL,
+    fname VARCHAR(45) NOT NULL,
+    mname VARCHAR(45) NOT NULL DEFAULT '',
+    lname VARCHAR(45) NOT NULL,
+    address VARCHAR(255) NOT NULL DEFAULT '',
+    contact VARCHAR(45) NOT NULL DEFAULT '',
+    PRIMARY KEY (idindividuals),
+    CONSTRAINT fk_individuals_type FOREIGN KEY (type_id) REFERENCES role_types (idrole_types)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS donations (
+    iddonations INT NOT NULL AUTO_INCREMENT,
+    individual_id INT NOT NULL,
+    date DATE NOT NULL,
+    ampoule_count INT NOT NULL,
+    motilitiy_rating FLOAT NOT NULL,
+    PRIMARY KEY (iddonations),
+    CONSTRAINT fk_donations_individual FOREIGN KEY (individual_id) REFERENCES individuals (idindividuals)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS relationships (
+    idrelationships INT NOT NULL AUTO_INCREMENT,
+    type_id INT NOT NULL,
+    individual_1_id INT NOT NULL,
+    individual_2_id INT NOT NULL,
+    date_start DATE NOT NULL,
+    date_end DATE NULL,
+    PRIMARY KEY (idrelationships),
+    CONSTRAINT fk_relationships_type FOREIGN KEY (type_id) REFERENCES relationship_types (idrelationship_types),
+    CONSTRAINT fk_relationships_individual_1 FOREIGN KEY (individual_1_id) REFERENCES individuals (idindividuals),
+    CONSTRAINT fk_relationships_individual_2 FOREIGN KEY (individual_2_id) REFERENCES individuals (idindividuals)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS users (
+    idusers INT NOT NULL AUTO_INCREMENT,
+    username VARCHAR(45) NOT NULL,
+    password CHAR(64) NOT NULL,
+    role VARCHAR(20) NOT NULL DEFAULT 'user',
+    PRIMARY KEY (idusers)
+) ENGINE=InnoDB;
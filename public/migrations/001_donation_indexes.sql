@@ -0,0 +1,6 @@
+-- Indexes behind the GET /api/donations filters and sorts.
+-- (individual_id, date): ?individual_id= with or without a date range or ?sort=date;
+-- it also serves the individual_id foreign key and the per-donor stats query.
+-- (date): ?date_from= / ?date_to= and ?sort=date across all donors.
+CREATE INDEX idx_donations_individual_date ON donations (individual_id, date);
+CREATE INDEX idx_donations_date ON donations (date);
@@ -0,0 +1,2 @@
+-- Login looks users up by username; unique also stops duplicate registrations.
+CREATE UNIQUE INDEX uq_users_username ON users (username);
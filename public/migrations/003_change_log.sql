@@ -0,0 +1,52 @@
+-- Change log behind GET /api/<resource>?since=<token> delta sync. Triggers
+-- write it in the same transaction as the change itself, so every write path
+-- (handlers, batch, bulk ingest, CSV import, group commit) is covered and a
+-- rolled-back write leaves no entry. The sync token is the last idchange_log
+-- a client has seen. Triggers stamp SYSDATE(6), the time the entry itself is
+-- written, not the statement start: a sync compares it with the start of the
+-- oldest open transaction to tell which entries may still be overtaken.
+-- (table_name, idchange_log): the per-resource range scan after a token.
+-- (table_name, row_id): compact-change-log finding superseded entries.
+CREATE TABLE IF NOT EXISTS change_log (
+    idchange_log BIGINT NOT NULL AUTO_INCREMENT,
+    table_name VARCHAR(45) NOT NULL,
+    row_id INT NOT NULL,
+    op ENUM('insert', 'update', 'delete') NOT NULL,
+    changed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (idchange_log),
+    KEY idx_change_log_table (table_name, idchange_log),
+    KEY idx_change_log_row (table_name, row_id)
+) ENGINE=InnoDB;
+
+CREATE TRIGGER individuals_insert_change_log AFTER INSERT ON individuals FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('individuals', NEW.idindividuals, 'insert', SYSDATE(6));
+
+CREATE TRIGGER individuals_update_change_log AFTER UPDATE ON individuals FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('individuals', NEW.idindividuals, 'update', SYSDATE(6));
+
+CREATE TRIGGER individuals_delete_change_log AFTER DELETE ON individuals FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('individuals', OLD.idindividuals, 'delete', SYSDATE(6));
+
+CREATE TRIGGER donations_insert_change_log AFTER INSERT ON donations FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('donations', NEW.iddonations, 'insert', SYSDATE(6));
+
+CREATE TRIGGER donations_update_change_log AFTER UPDATE ON donations FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('donations', NEW.iddonations, 'update', SYSDATE(6));
+
+CREATE TRIGGER donations_delete_change_log AFTER DELETE ON donations FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('donations', OLD.iddonations, 'delete', SYSDATE(6));
+
+CREATE TRIGGER relationships_insert_change_log AFTER INSERT ON relationships FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('relationships', NEW.idrelationships, 'insert', SYSDATE(6));
+
+CREATE TRIGGER relationships_update_change_log AFTER UPDATE ON relationships FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('relationships', NEW.idrelationships, 'update', SYSDATE(6));
+
+CREATE TRIGGER relationships_delete_change_log AFTER DELETE ON relationships FOR EACH ROW
+    INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES ('relationships', OLD.idrelationships, 'delete', SYSDATE(6));
+
+-- Existing rows, so a first sync with since=0 returns the whole table.
+-- After the triggers: a row written in between is logged twice, never missed.
+INSERT INTO change_log (table_name, row_id, op) SELECT 'individuals', idindividuals, 'insert' FROM individuals ORDER BY idindividuals;
+INSERT INTO change_log (table_name, row_id, op) SELECT 'donations', iddonations, 'insert' FROM donations ORDER BY iddonations;
+INSERT INTO change_log (table_name, row_id, op) SELECT 'relationships', idrelationships, 'insert' FROM relationships ORDER BY idrelationships;
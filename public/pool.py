@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import deque
+
+import MySQLdb
+from flask import g
+
+
+# MySQL client errors meaning the connection is dead:
+# 2006 "MySQL server has gone away", 2013 "Lost connection to MySQL server during query"
+GONE_AWAY_ERRORS = (2006, 2013)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, max_lifetime=1800.0, ping_after=1.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, created_at, last_used)
+        self._born = {}  # id(connection) -> created_at
+        self._size = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+        }
+
+    def fill(self):
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._create()
+            self._checkin(conn, self._born[id(conn)])
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._stats["checkouts"] += 1
+            waited = False
+            while True:
+                if self._idle:
+                    # LIFO keeps the hottest connections busy and lets the rest age out
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout}s.")
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+        if conn is None:
+            return self._create()
+        if time.monotonic() - created_at > self.max_lifetime:
+            self._close(conn)
+            with self._cond:
+                self._stats["recycled"] += 1
+            return self._create()
+        if time.monotonic() - last_used > self.ping_after and not self._ping(conn):
+            self._close(conn)
+            with self._cond:
+                self._stats["discarded"] += 1
+            return self._create()
+        return conn
+
+    def release(self, conn, broken=False):
+        created_at = self._born.get(id(conn))
+        if created_at is None:
+            return
+        if not broken:
+            try:
+                # Never hand out a connection with an open transaction or stale snapshot
+                conn.rollback()
+            except MySQLdb.Error:
+                broken = True
+        if broken:
+            self._discard(conn)
+        else:
+            self._checkin(conn, created_at)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        return stats
+
+    def _create(self):
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._stats["created"] += 1
+        return conn
+
+    def _checkin(self, conn, created_at):
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _close(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            conn.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+
+class MySQLPool:
+    # Drop-in replacement for flask_mysqldb.MySQL: `mysql.connection` checks a
+    # connection out of the pool once per app context and returns it on teardown.
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MYSQL_HOST", "localhost")
+        app.config.setdefault("MYSQL_PORT", 3306)
+        app.config.setdefault("MYSQL_USER", "root")
+        app.config.setdefault("MYSQL_PASSWORD", "")
+        app.config.setdefault("MYSQL_DB", None)
+        app.config.setdefault("MYSQL_CHARSET", "utf8mb4")
+        app.config.setdefault("MYSQL_CONNECT_TIMEOUT", 10)
+        app.config.setdefault("MYSQL_POOL_MIN_SIZE", 1)
+        app.config.setdefault("MYSQL_POOL_MAX_SIZE", 10)
+        app.config.setdefault("MYSQL_POOL_TIMEOUT", 5.0)
+        app.config.setdefault("MYSQL_POOL_MAX_LIFETIME", 1800.0)
+        app.config.setdefault("MYSQL_POOL_PING_AFTER", 1.0)
+        self.app = app
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    config = self.app.config
+                    self._pool = ConnectionPool(
+                        self._connect,
+                        min_size=config["MYSQL_POOL_MIN_SIZE"],
+                        max_size=config["MYSQL_POOL_MAX_SIZE"],
+                        timeout=config["MYSQL_POOL_TIMEOUT"],
+                        max_lifetime=config["MYSQL_POOL_MAX_LIFETIME"],
+                        ping_after=config["MYSQL_POOL_PING_AFTER"],
+                    )
+                    self._pool.fill()
+        return self._pool
+
+    @property
+    def connection(self):
+        if "_db_conn" not in g:
+            g._db_conn = self.pool.acquire()
+        return g._db_conn
+
+    def reconnect(self):
+        conn = g.pop("_db_conn", None)
+        if conn is not None:
+            self.pool.release(conn, broken=True)
+        return self.connection
+
+    def teardown(self, exception):
+        conn = g.pop("_db_conn", None)
+        if conn is not None:
+            self.pool.release(conn)
+
+    def _connect(self):
+        config = self.app.config
+        kwargs = {
+            "host": config["MYSQL_HOST"],
+            "port": config["MYSQL_PORT"],
+            "user": config["MYSQL_USER"],
+            "passwd": config["MYSQL_PASSWORD"],
+            "charset": config["MYSQL_CHARSET"],
+            "connect_timeout": config["MYSQL_CONNECT_TIMEOUT"],
+        }
+        if config["MYSQL_DB"]:
+            kwargs["db"] = config["MYSQL_DB"]
+        return MySQLdb.connect(**kwargs)
@@ -0,0 +1,152 @@
+# Request-independent parts of the REST API: table metadata, query builders,
+# parameter parsing and cursors. app.py (Flask) and asgi.py (Starlette) wrap
+# them for their own request objects, so both servers build the same SQL and
+# answer the same parameters the same way.
+import datetime
+import time
+import zlib
+from urllib.parse import urlencode
+
+
+class InvalidParameter(Exception):
+    pass
+
+
+# Primary key of every table served by the collection endpoints
+PRIMARY_KEYS = {
+    "role_types": "idrole_types",
+    "relationship_types": "idrelationship_types",
+    "donations": "iddonations",
+    "individuals": "idindividuals",
+    "relationships": "idrelationships",
+}
+
+
+# Columns each table can be narrowed to with ?fields=
+TABLE_COLUMNS = {
+    "role_types": ["idrole_types", "description"],
+    "relationship_types": ["idrelationship_types", "description"],
+    "donations": ["iddonations", "individual_id", "date", "ampoule_count", "motilitiy_rating"],
+    "individuals": ["idindividuals", "type_id", "birthdate", "is_male", "fname", "mname", "lname", "address", "contact"],
+    "relationships": ["idrelationships", "type_id", "individual_1_id", "individual_2_id", "date_start", "date_end"],
+}
+
+
+def parse_fields(table, value, required=()):
+    # "?fields=a,b" -> SELECT list. The primary key, plus any columns the
+    # handler needs itself (e.g. the sort key of a cursor), is always included.
+    if not value:
+        return "*"
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in TABLE_COLUMNS[table]]
+    if unknown:
+        raise InvalidParameter(f"Unknown fields for {table}: {', '.join(unknown)}.")
+    columns = dict.fromkeys([PRIMARY_KEYS[table], *required, *fields])
+    return ", ".join(columns)
+
+
+def parse_page_args(params, default, maximum, parse_cursor=int):
+    try:
+        limit = int(params.get("limit", default))
+        after = params.get("after")
+        after = parse_cursor(after) if after is not None else None
+    except ValueError:
+        raise InvalidParameter("limit and after must be integers." if parse_cursor is int else "Invalid limit or after.")
+    if limit < 1:
+        raise InvalidParameter("limit must be positive.")
+    return min(limit, maximum), after
+
+
+def next_page_headers(rows, limit, id_column, path, params, cursor=None):
+    # rows were fetched with LIMIT limit + 1: an extra row means there is a next
+    # page. cursor(row) builds the next cursor when the sort key is more than
+    # the id. params (a dict of the query string) keeps filters and sort in the link.
+    if len(rows) <= limit:
+        return {}
+    next_cursor = cursor(rows[limit - 1]) if cursor else rows[limit - 1][id_column]
+    link_args = {**params, "limit": limit, "after": next_cursor}
+    return {"X-Next-Cursor": str(next_cursor), "Link": f'<{path}?{urlencode(link_args)}>; rel="next"'}
+
+
+def page_query(table, columns, after=False):
+    id_column = PRIMARY_KEYS[table]
+    query = f"SELECT {columns} FROM {table}"
+    if after:
+        query += f" WHERE {id_column} > %s"
+    return query + f" ORDER BY {id_column}"
+
+
+def ids_query(table, columns, count):
+    return f"SELECT {columns} FROM {table} WHERE {PRIMARY_KEYS[table]} IN ({', '.join(['%s'] * count)})"
+
+
+# ?sort= values for donations -> (columns, descending). Every ordering ends in
+# the primary key so keyset cursors are unique.
+DONATION_SORTS = {
+    "id": (("iddonations",), False),
+    "-id": (("iddonations",), True),
+    "date": (("date", "iddonations"), False),
+    "-date": (("date", "iddonations"), True),
+}
+
+
+def date_cursor(value):
+    # "<date>,<id>" cursor for date-sorted pages
+    date, _, donation_id = value.partition(",")
+    return datetime.date.fromisoformat(date), int(donation_id)
+
+
+def donation_cursor(sort):
+    # Builds the next cursor from the last row of a page; None for id sorts
+    if len(DONATION_SORTS[sort][0]) > 1:
+        return lambda row: f"{row['date']},{row['iddonations']}"
+    return None
+
+
+def donation_filters(params):
+    # Each filter combination maps onto an index from
+    # migrations/001_donation_indexes.sql: individual_id (+ dates) uses
+    # (individual_id, date), a date range alone uses (date), and the rest walk
+    # the primary key. min_motility has no index and only narrows those rows.
+    conditions, args = [], []
+    try:
+        if "individual_id" in params:
+            conditions.append("individual_id = %s")
+            args.append(int(params["individual_id"]))
+        if "date_from" in params:
+            conditions.append("date >= %s")
+            args.append(datetime.date.fromisoformat(params["date_from"]))
+        if "date_to" in params:
+            conditions.append("date <= %s")
+            args.append(datetime.date.fromisoformat(params["date_to"]))
+        if "min_motility" in params:
+            conditions.append("motilitiy_rating >= %s")
+            args.append(float(params["min_motility"]))
+    except ValueError:
+        raise InvalidParameter(
+            "individual_id must be an integer, date_from and date_to dates (YYYY-MM-DD), and min_motility a number."
+        )
+    return conditions, args
+
+
+def donation_query(select, conditions, sort, after=False):
+    columns, descending = DONATION_SORTS[sort]
+    if after:
+        # Row-constructor comparison is a range scan on the same index
+        conditions = conditions + [f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join(['%s'] * len(columns))})"]
+    query = f"SELECT {select} FROM donations"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + " ORDER BY " + ", ".join(f"{column} DESC" if descending else column for column in columns)
+
+
+def make_etag(boot_id, versions, full_path, ndjson, staleness):
+    # versions are the table counters read before the SELECT runs: a concurrent
+    # write can then only make the tag older than the data, never newer.
+    tag = f"{boot_id}-{'-'.join(str(version) for version in versions)}-{zlib.crc32(full_path.encode()):x}"
+    # The same URL is JSON or NDJSON depending on Accept
+    if ndjson:
+        tag += "-ndjson"
+    if staleness:
+        tag += f"-{int(time.time() // staleness):x}"
+    return tag
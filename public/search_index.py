@@ -0,0 +1,200 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+
+def normalise(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def edits(word):
+    # Every string one deletion, transposition, substitution or insertion away
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    transposes = [left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1]
+    replaces = [left + char + right[1:] for left, right in splits if right for char in LETTERS]
+    inserts = [left + char + right for left, right in splits for char in LETTERS]
+    return set(deletes + transposes + replaces + inserts)
+
+
+def trigrams(word):
+    # pg_trgm-style padding: two spaces before the word, one after
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    # Two-level fuzzy name index. Names repeat a lot, so query words are first
+    # matched by trigram similarity against the (small) vocabulary of distinct
+    # name words; the best words are then resolved to rows through word -> id
+    # postings, intersecting postings in C (set operations) rather than scoring
+    # rows one by one in Python.
+    #
+    # Postings are append-only int arrays. Updates and deletes only change the
+    # id -> name map; stale postings are skipped when results are verified and
+    # dropped by a rebuild once they outnumber live entries.
+    def __init__(self, min_score=0.3, typo_score=0.7, words_per_term=5, max_combinations=50):
+        self.min_score = min_score
+        self.typo_score = typo_score
+        self.words_per_term = words_per_term
+        self.max_combinations = max_combinations
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._names = {}  # id -> display name
+        self._vocabulary = {}  # word -> number of trigrams
+        self._word_grams = {}  # trigram -> [words]
+        self._postings = {}  # word -> array of ids
+        self._posted = 0  # entries across all postings, stale ones included
+        self._live = 0  # entries that belong to a current name
+        self.max_id = 0
+
+    def load(self, rows):
+        with self._lock:
+            self._clear()
+            for row_id, *parts in rows:
+                self._add(row_id, parts)
+
+    def add(self, row_id, *parts):
+        with self._lock:
+            self._add(row_id, parts)
+            self._maybe_compact()
+
+    def remove(self, row_id):
+        with self._lock:
+            self._drop(row_id)
+            self._maybe_compact()
+
+    def __len__(self):
+        return len(self._names)
+
+    def search(self, query, limit=10):
+        terms = list(dict.fromkeys(normalise(query)))[:5]
+        with self._lock:
+            matches = [self._match_word(term) for term in terms]
+            matches = [match for match in matches if match]
+            if not matches:
+                return []
+            results = {}
+            self._collect_all_terms(matches, len(terms), limit, results)
+            if len(results) < limit:
+                self._collect_any_term(matches, len(terms), limit, results)
+            best = heapq.nsmallest(limit, results.items(), key=lambda item: (-item[1], item[0]))
+            return [{"id": row_id, "name": self._names[row_id], "score": round(score, 3)} for row_id, score in best]
+
+    def _match_word(self, term):
+        # Similarity is the mean of trigram containment (good for prefixes like
+        # "jo" -> "john") and Jaccard similarity (penalises much longer words).
+        # Trigrams miss short typos ("jhon"), so words one edit away also score
+        # at least typo_score.
+        grams = trigrams(term)
+        needed = max(1, math.ceil(self.min_score * len(grams)))
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._word_grams.get(gram, ()))
+        scored = {}
+        for word, shared in counts.items():
+            if shared < needed:
+                continue
+            similarity = (shared / len(grams) + shared / (len(grams) + self._vocabulary[word] - shared)) / 2
+            if similarity >= self.min_score and self._postings.get(word):
+                scored[word] = similarity
+        if len(term) >= 3:
+            for word in edits(term):
+                if self._postings.get(word):
+                    scored[word] = max(scored.get(word, 0), self.typo_score)
+        return heapq.nlargest(self.words_per_term, ((similarity, word) for word, similarity in scored.items()))
+
+    def _collect_all_terms(self, matches, term_count, limit, results):
+        # Best-first walk over one candidate word per term, highest combined
+        # similarity first; each combination is a postings intersection.
+        start = (0,) * len(matches)
+        heap = [(-sum(match[0][0] for match in matches), start)]
+        seen = {start}
+        tried = 0
+        while heap and len(results) < limit and tried < self.max_combinations:
+            negative_score, combination = heapq.heappop(heap)
+            tried += 1
+            words = [matches[term][index][1] for term, index in enumerate(combination)]
+            postings = sorted((self._postings[word] for word in words), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            score = -negative_score / term_count
+            for row_id in candidates:
+                if row_id not in results and self._has_words(row_id, words):
+                    results[row_id] = score
+                    if len(results) >= limit:
+                        break
+            for term in range(len(matches)):
+                following = list(combination)
+                following[term] += 1
+                following = tuple(following)
+                if following[term] < len(matches[term]) and following not in seen:
+                    seen.add(following)
+                    heapq.heappush(
+                        heap,
+                        (-sum(matches[t][i][0] for t, i in enumerate(following)), following),
+                    )
+
+    def _collect_any_term(self, matches, term_count, limit, results):
+        # Names that only match some of the query words, ranked below full matches
+        for similarity, word in sorted((entry for match in matches for entry in match), reverse=True):
+            for row_id in self._postings[word]:
+                if len(results) >= limit:
+                    return
+                if row_id not in results and self._has_words(row_id, [word]):
+                    results[row_id] = similarity / term_count
+
+    def _has_words(self, row_id, words):
+        name = self._names.get(row_id)
+        if name is None:
+            return False
+        current = normalise(name)
+        return all(word in current for word in words)
+
+    def _add(self, row_id, parts):
+        self._drop(row_id)
+        display = " ".join(str(part) for part in parts if part)
+        words = set(normalise(display))
+        self._names[row_id] = display
+        self._live += len(words)
+        for word in words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = array("q")
+                if word not in self._vocabulary:
+                    grams = trigrams(word)
+                    self._vocabulary[word] = len(grams)
+                    for gram in grams:
+                        self._word_grams.setdefault(gram, []).append(word)
+            posting.append(row_id)
+            self._posted += 1
+        self.max_id = max(self.max_id, row_id)
+
+    def _drop(self, row_id):
+        name = self._names.pop(row_id, None)
+        if name is not None:
+            self._live -= len(set(normalise(name)))
+
+    def _maybe_compact(self):
+        if self._posted <= 2 * self._live + 10000:
+            return
+        self._postings = {}
+        self._posted = 0
+        for row_id, name in self._names.items():
+            for word in set(normalise(name)):
+                self._postings.setdefault(word, array("q")).append(row_id)
+                self._posted += 1
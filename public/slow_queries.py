@@ -0,0 +1,120 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import MySQLdb
+
+from metrics import statement_label
+from migrate import EXPLAINABLE
+
+
+logger = logging.getLogger("spermbank.slow_queries")
+
+
+def params_shape(args):
+    # Parameter types, never values: they can be personal data. Runs of the
+    # same type are folded, so 500 ids in an IN list come out as "int*500".
+    if isinstance(args, dict):
+        return {name: type(value).__name__ for name, value in args.items()}
+    shape = []
+    for arg in args or ():
+        name = type(arg).__name__
+        if shape and shape[-1][0] == name:
+            shape[-1][1] += 1
+        else:
+            shape.append([name, 1])
+    return [name if count == 1 else f"{name}*{count}" for name, count in shape]
+
+
+class SlowQueryLog:
+    # Logs one JSON record per query slower than threshold (seconds; 0 turns
+    # the log off). The EXPLAIN runs on a background thread with a connection
+    # borrowed from the pool, so the request that ran the slow query does not
+    # wait for it. At most `rate` records are written per `per` seconds; the
+    # rest are dropped and counted in the "suppressed" field of the next record.
+    def __init__(self, pool, threshold=0.5, rate=10, per=60.0, queue_size=100, logger=logger):
+        self.pool = pool  # pool() -> ConnectionPool, resolved lazily
+        self.threshold = threshold
+        self.rate = rate
+        self.per = per
+        self.logger = logger
+        self.suppressed = 0
+        self._allowance = rate
+        self._checked = time.monotonic()
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def report(self, query, args, duration, rows, route=None):
+        if not self.threshold or duration < self.threshold:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._checked) * self.rate / self.per)
+            self._checked = now
+            if self._allowance < 1:
+                self.suppressed += 1
+                return False
+            self._allowance -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+        record = {
+            "event": "slow_query",
+            "sql": statement_label(query),
+            "params": params_shape(args),
+            "duration_ms": round(duration * 1000, 1),
+            "rows": rows,
+            "route": route,
+            "suppressed": suppressed,
+        }
+        try:
+            self._queue.put_nowait((record, query, args))
+        except queue.Full:
+            with self._lock:
+                self.suppressed += 1 + suppressed
+            return False
+        self._start()
+        return True
+
+    def flush(self):
+        # Waits until every queued record has been written
+        self._queue.join()
+
+    def explain(self, query, args):
+        if not EXPLAINABLE.match(query):
+            return None
+        pool = self.pool()
+        conn = pool.acquire()
+        broken = False
+        try:
+            cur = conn.cursor()
+            cur.execute("EXPLAIN " + query, args)
+            columns = [column[0] for column in cur.description]
+            plan = [dict(zip(columns, row)) for row in cur.fetchall()]
+            cur.close()
+            return plan
+        except MySQLdb.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(conn, broken=broken)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record, query, args = self._queue.get()
+            try:
+                record["explain"] = self.explain(query, args)
+            except Exception as e:
+                record["explain"] = None
+                record["explain_error"] = str(e)
+            try:
+                self.logger.warning(json.dumps(record, default=str))
+            finally:
+                self._queue.task_done()
@@ -1,8 +1,15 @@
+import datetime
+import gzip
+import io
+import json
 import pytest
 from flask import Flask
 from flask_jwt_extended import create_access_token
 from unittest.mock import patch, MagicMock
-from app import app, mysql
+import MySQLdb
+from app import app, mysql, fetch_data, execute_query, written_table, bump_version, lookup_cache, lineage, donation_stats, name_index, change_feed
+from app import lineage_loader, donation_stats_loader, name_index_loader, record_change, warm_up
+from pool import PoolTimeout
 
 
 @pytest.fixture
@@ -10,6 +17,7 @@ def client():
     app.config["TESTING"] = True
     app.config["JWT_SECRET_KEY"] = "test_secret_key"
     app.config["MYSQL_DB"] = "yolo"
+    app.config["WARM_UP_INDEXES"] = False
 
     with app.app_context():
         with patch("app.mysql") as mock_mysql:
@@ -22,7 +30,13 @@ def client():
 
             mock_connection.cursor.return_value = mock_cursor
             mock_mysql.connection.return_value = mock_connection
+            mock_mysql.connection.cursor.return_value.rowcount = 1
+            mock_mysql.connection.insert_id.return_value = 1
 
+            lookup_cache.clear()
+            lineage_loader.invalidate()
+            donation_stats_loader.invalidate()
+            name_index_loader.invalidate()
             yield app.test_client()
 
 
@@ -446,6 +460,23 @@ def test_update_donation(mock_execute_query, client):
     assert response.json["message"] == "Donation updated successfully."
 
 
+@patch("app.record_change")
+@patch("app.fetch_data")
+@patch("app.execute_query")
+def test_update_donation_not_found(mock_execute_query, mock_fetch_data, mock_record_change, client):
+    mock_fetch_data.return_value = []
+    token = get_token("admin_user", "admin")
+    response = client.put(
+        "/api/donations/99",
+        json={"individual_id": 3, "date": "2023-12-02", "ampoule_count": 6, "motilitiy_rating": 4.0},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json["message"] == "Donation not found."
+    assert not mock_execute_query.called
+    assert not mock_record_change.called
+
+
 @patch("app.execute_query")
 def test_update_donation_missing_fields(mock_execute_query, client):
     mock_execute_query.return_value = None
@@ -544,6 +575,7 @@ def test_add_individual(mock_execute_query, client):
     )
     assert response.status_code == 201
     assert response.json["message"] == "Individual added successfully."
+    assert response.json["id"] == 1
 
 
 @patch("app.execute_query")
@@ -581,6 +613,26 @@ def test_update_individual(mock_execute_query, client):
     assert response.json["message"] == "Individual updated successfully."
 
 
+@patch("app.record_change")
+@patch("app.fetch_data")
+@patch("app.execute_query")
+def test_update_individual_not_found(mock_execute_query, mock_fetch_data, mock_record_change, client):
+    mock_fetch_data.return_value = []
+    token = get_token("admin_user", "admin")
+    response = client.put(
+        "/api/individuals/99",
+        json={
+            "type_id": 1, "birthdate": "1990-01-01", "is_male": True, "fname": "John",
+            "mname": "", "lname": "Smith", "address": "", "contact": "",
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json["message"] == "Individual not found."
+    assert not mock_execute_query.called
+    assert not mock_record_change.called
+
+
 @patch("app.execute_query")
 def test_update_individual_forbidden(mock_execute_query, client):
     mock_execute_query.return_value = None
@@ -712,6 +764,23 @@ def test_update_relationship(mock_execute_query, client):
     assert response.json["message"] == "Relationship updated successfully."
 
 
+@patch("app.record_change")
+@patch("app.fetch_data")
+@patch("app.execute_query")
+def test_update_relationship_not_found(mock_execute_query, mock_fetch_data, mock_record_change, client):
+    mock_fetch_data.return_value = []
+    token = get_token("admin_user", "admin")
+    response = client.put(
+        "/api/relationships/99",
+        json={"type_id": 2, "individual_1_id": 1, "individual_2_id": 3, "date_start": "2023-01-01", "date_end": None},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json["message"] == "Relationship not found."
+    assert not mock_execute_query.called
+    assert not mock_record_change.called
+
+
 @patch("app.execute_query")
 def test_update_relationship_forbidden(mock_execute_query, client):
     mock_execute_query.return_value = None
@@ -755,4 +824,1241 @@ def test_delete_relationship_not_found(mock_execute_query, client):
         "/api/relationships/99", headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == 404
-    assert response.json["message"] == "Relationship not found."
\ No newline at end of file
+    assert response.json["message"] == "Relationship not found."
+
+#PAGINATION
+
+@patch("app.fetch_data")
+def test_get_individuals_next_cursor(mock_fetch_data, client):
+    mock_fetch_data.return_value = [
+        {"idindividuals": 4, "fname": "John"},
+        {"idindividuals": 7, "fname": "Jane"}
+    ]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?limit=1&after=3", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert len(response.json) == 1
+    assert response.headers["X-Next-Cursor"] == "4"
+    query, args = mock_fetch_data.call_args[0]
+    assert "WHERE idindividuals > %s ORDER BY idindividuals LIMIT %s" in query
+    assert args == (3, 2)
+
+
+@patch("app.fetch_data")
+def test_get_individuals_last_page(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 4, "fname": "John"}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?limit=5", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+
+
+@patch("app.fetch_data")
+def test_get_donations_limit_capped(mock_fetch_data, client):
+    mock_fetch_data.return_value = []
+    token = get_token("test_user", "user")
+    response = client.get("/api/donations?limit=999999", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert mock_fetch_data.call_args[0][1] == (app.config["PAGE_SIZE_MAX"] + 1,)
+
+
+def test_get_donations_invalid_limit(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/donations?limit=abc", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+    response = client.get("/api/donations?limit=0", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+@patch("app.fetch_data")
+def test_get_donations_filters(mock_fetch_data, client):
+    mock_fetch_data.return_value = []
+    token = get_token("test_user", "user")
+    response = client.get(
+        "/api/donations?individual_id=2&date_from=2024-01-01&date_to=2024-03-31&min_motility=3.5",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    query, args = mock_fetch_data.call_args[0]
+    assert "WHERE individual_id = %s AND date >= %s AND date <= %s AND motilitiy_rating >= %s ORDER BY iddonations LIMIT %s" in query
+    assert args == (2, datetime.date(2024, 1, 1), datetime.date(2024, 3, 31), 3.5, 101)
+
+
+@patch("app.fetch_data")
+def test_get_donations_sort_by_date(mock_fetch_data, client):
+    mock_fetch_data.return_value = [
+        {"iddonations": 9, "date": "2024-02-01"},
+        {"iddonations": 4, "date": "2024-01-15"},
+    ]
+    token = get_token("test_user", "user")
+    response = client.get(
+        "/api/donations?individual_id=2&sort=-date&limit=1&after=2024-03-01,12",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Next-Cursor"] == "2024-02-01,9"
+    assert "individual_id=2" in response.headers["Link"] and "sort=-date" in response.headers["Link"]
+    query, args = mock_fetch_data.call_args[0]
+    assert "WHERE individual_id = %s AND (date, iddonations) < (%s, %s) ORDER BY date DESC, iddonations DESC LIMIT %s" in query
+    assert args == (2, datetime.date(2024, 3, 1), 12, 2)
+
+
+def test_get_donations_invalid_filters(client):
+    token = get_token("test_user", "user")
+    for query_string in ["individual_id=x", "date_from=01/02/2024", "min_motility=high", "sort=ampoule_count", "sort=date&after=7"]:
+        response = client.get(f"/api/donations?{query_string}", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 400, query_string
+
+
+#SPARSE FIELDSETS
+
+@patch("app.fetch_data")
+def test_fields_projection(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 1, "fname": "John", "lname": "Doe"}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?fields=fname,lname", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert mock_fetch_data.call_args[0][0].startswith("SELECT idindividuals, fname, lname FROM individuals ORDER BY")
+
+    client.get("/api/individuals/1?fields=lname,idindividuals", headers={"Authorization": f"Bearer {token}"})
+    assert mock_fetch_data.call_args[0][0] == "SELECT idindividuals, lname FROM individuals WHERE idindividuals = %s"
+
+    client.get("/api/donations?fields=ampoule_count&sort=date", headers={"Authorization": f"Bearer {token}"})
+    assert mock_fetch_data.call_args[0][0].startswith("SELECT iddonations, date, ampoule_count FROM donations")
+
+
+@patch("app.fetch_data")
+def test_fields_on_cached_lookup(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/role_types?fields=idrole_types", headers={"Authorization": f"Bearer {token}"})
+    assert response.json == [{"idrole_types": 1}]
+
+
+def test_fields_unknown_column(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?fields=fname,password", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+    assert response.json["message"] == "Unknown fields for individuals: password."
+    response = client.get("/api/donations/1?fields=1;DROP TABLE donations", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+#BATCH GET
+
+@patch("app.fetch_data")
+def test_get_individuals_by_ids(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 3, "fname": "Ana"}, {"idindividuals": 1, "fname": "John"}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?ids=1,3,5,1&fields=fname", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json == {"1": {"idindividuals": 1, "fname": "John"}, "3": {"idindividuals": 3, "fname": "Ana"}, "5": None}
+    assert mock_fetch_data.call_count == 1
+    query, args = mock_fetch_data.call_args[0]
+    assert query == "SELECT idindividuals, fname FROM individuals WHERE idindividuals IN (%s, %s, %s)"
+    assert args == (1, 3, 5)
+
+
+@patch("app.fetch_data")
+def test_post_by_ids(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"iddonations": 7, "individual_id": 2}]
+    token = get_token("test_user", "user")
+    response = client.post("/api/donations/by_ids", json={"ids": [7, 8]}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json == {"7": {"iddonations": 7, "individual_id": 2}, "8": None}
+    assert "WHERE iddonations IN (%s, %s)" in mock_fetch_data.call_args[0][0]
+
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}]
+    response = client.post("/api/role_types/by_ids", json={"ids": [1, 2]}, headers={"Authorization": f"Bearer {token}"})
+    assert response.json == {"1": {"idrole_types": 1, "description": "Donor"}, "2": None}
+
+
+def test_by_ids_validation(client):
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/api/individuals/by_ids", json=[1, 2], headers=headers).status_code == 400
+    assert client.post("/api/individuals/by_ids", json={"ids": ["1"]}, headers=headers).status_code == 400
+    assert client.post("/api/users/by_ids", json={"ids": [1]}, headers=headers).status_code == 404
+    assert client.get("/api/relationships?ids=1,a", headers=headers).status_code == 400
+    too_many = ",".join(str(n) for n in range(app.config["BATCH_IDS_MAX"] + 1))
+    response = client.get(f"/api/relationships?ids={too_many}", headers=headers)
+    assert response.status_code == 400
+    assert client.post("/api/individuals/by_ids", json={"ids": [1]}).status_code == 401
+
+
+#BATCH OPERATIONS
+
+NEWBORN = {"type_id": 3, "birthdate": "2024-05-01", "is_male": 0, "fname": "Ana", "mname": "", "lname": "Cruz", "address": "Cebu", "contact": "0917"}
+
+
+@patch("app.record_change")
+@patch("app.mysql")
+def test_batch_resolves_refs_in_one_transaction(mock_mysql, mock_record_change, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.lastrowid = 41
+    cursor.rowcount = 1
+    mock_record_change.side_effect = lambda *args: mock_mysql.connection.commit.assert_called_once()
+    token = get_token("admin_user", "admin")
+    operations = [
+        {"op": "create", "resource": "individuals", "ref": "baby", "data": NEWBORN},
+        {
+            "op": "create",
+            "resource": "relationships",
+            "data": {"type_id": 1, "individual_1_id": 7, "individual_2_id": {"$ref": "baby"}, "date_start": "2024-05-01", "date_end": None},
+        },
+    ]
+    response = client.post("/api/batch", json={"operations": operations}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert [result["resource"] for result in response.get_json()["results"]] == ["individuals", "relationships"]
+    query, args = cursor.execute.call_args_list[1][0]
+    assert query.startswith("INSERT INTO relationships (type_id, individual_1_id, individual_2_id, date_start, date_end)")
+    assert args == (1, 7, 41, "2024-05-01", None)
+    mock_mysql.connection.commit.assert_called_once()
+    assert [call[0][:3] for call in mock_record_change.call_args_list] == [("individuals", "insert", 41), ("relationships", "insert", 41)]
+
+
+@patch("app.record_change")
+@patch("app.mysql")
+def test_batch_rolls_back_on_missing_row(mock_mysql, mock_record_change, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.lastrowid = 5
+    cursor.rowcount = 1
+    cursor.fetchone.return_value = None
+    token = get_token("admin_user", "admin")
+    operations = [
+        {"op": "create", "resource": "role_types", "data": {"description": "Recipient"}},
+        {"op": "delete", "resource": "individuals", "id": 999},
+    ]
+    response = client.post("/api/batch", json={"operations": operations}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+    assert response.get_json()["index"] == 1
+    mock_mysql.connection.rollback.assert_called_once()
+    mock_mysql.connection.commit.assert_not_called()
+    mock_record_change.assert_not_called()
+
+
+@patch("app.mysql")
+def test_batch_integrity_error_rolls_back(mock_mysql, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.execute.side_effect = MySQLdb.IntegrityError(1452, "Cannot add or update a child row")
+    token = get_token("admin_user", "admin")
+    operations = [{"op": "create", "resource": "individuals", "data": NEWBORN}]
+    response = client.post("/api/batch", json={"operations": operations}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 409
+    mock_mysql.connection.rollback.assert_called_once()
+
+
+@patch("app.mysql")
+def test_batch_validated_before_writing(mock_mysql, client):
+    token = get_token("admin_user", "admin")
+    headers = {"Authorization": f"Bearer {token}"}
+    bad_batches = [
+        [],
+        [{"op": "upsert", "resource": "individuals", "data": NEWBORN}],
+        [{"op": "create", "resource": "users", "data": {}}],
+        [{"op": "create", "resource": "individuals", "data": {**NEWBORN, "password": "x"}}],
+        [{"op": "create", "resource": "individuals", "data": {"fname": "Ana"}}],
+        [{"op": "delete", "resource": "individuals"}],
+        [{"op": "update", "resource": "individuals", "id": {"$ref": "later"}, "data": {"fname": "Ana"}}],
+        [{"op": "create", "resource": "individuals", "ref": "a", "data": NEWBORN}] * 2,
+    ]
+    for operations in bad_batches:
+        response = client.post("/api/batch", json={"operations": operations}, headers=headers)
+        assert response.status_code == 400, operations
+    mock_mysql.connection.cursor.return_value.execute.assert_not_called()
+
+    token = get_token("test_user", "user")
+    response = client.post("/api/batch", json={"operations": []}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+
+#UNIT OF WORK
+
+@patch("app.mysql")
+def test_writes_commit_once_per_request(mock_mysql, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.fetchall.return_value = [{"individual_id": 2}]
+    cursor.rowcount = 1
+    heard = []
+    listener = lambda *change: heard.append((change, mock_mysql.connection.commit.call_count))
+    token = get_token("admin_user", "admin")
+    with patch("app.change_listeners", [listener]):
+        response = client.put(
+            "/api/donations/5",
+            json={"individual_id": 3, "date": "2024-01-01", "ampoule_count": 2, "motilitiy_rating": 4.0},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert response.status_code == 200
+    mock_mysql.connection.commit.assert_called_once()
+    # Listeners only hear about the write once it is committed
+    assert heard == [(("donations", "update", 5, {"individual_id": 3, "date": "2024-01-01", "ampoule_count": 2, "motilitiy_rating": 4.0, "previous_individual_id": 2}), 1)]
+
+
+@patch("app.mysql")
+def test_delete_not_found_uses_rowcount_and_rolls_back(mock_mysql, client):
+    mock_mysql.connection.cursor.return_value.rowcount = 0
+    token = get_token("admin_user", "admin")
+    response = client.delete("/api/individuals/99", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+    mock_mysql.connection.commit.assert_not_called()
+    mock_mysql.connection.rollback.assert_called_once()
+
+    mock_mysql.connection.cursor.return_value.rowcount = 1
+    response = client.delete("/api/individuals/99", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    mock_mysql.connection.commit.assert_called_once()
+
+
+@patch("app.mysql")
+def test_failed_commit_returns_500(mock_mysql, client):
+    mock_mysql.connection.cursor.return_value.rowcount = 1
+    mock_mysql.connection.commit.side_effect = MySQLdb.OperationalError(1213, "Deadlock found")
+    heard = []
+    token = get_token("admin_user", "admin")
+    with patch("app.change_listeners", [lambda *change: heard.append(change)]):
+        response = client.delete("/api/relationships/4", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 500
+    assert "Deadlock" in response.get_json()["message"]
+    mock_mysql.connection.rollback.assert_called_once()
+    assert heard == []
+
+
+@patch("app.mysql")
+def test_execute_query_outside_request_commits_immediately(mock_mysql, client):
+    mock_mysql.connection.cursor.return_value.rowcount = 3
+    assert execute_query("UPDATE donations SET ampoule_count = 0 WHERE individual_id = %s", (1,)) == 3
+    mock_mysql.connection.commit.assert_called_once()
+
+
+#CHANGE STREAM
+
+@patch("app.execute_query")
+def test_change_stream_resumes_from_last_event_id(mock_execute_query, client):
+    mock_execute_query.return_value = 1
+    admin = {"Authorization": f"Bearer {get_token('admin_user', 'admin')}"}
+    start = change_feed.last_id
+    client.put("/api/individuals/4", json={**NEWBORN, "extra": "ignored"}, headers=admin)
+    client.delete("/api/donations/9", headers=admin)
+
+    token = get_token("test_user", "user")
+    app.config["CHANGE_STREAM_HEARTBEAT"] = 0.01
+    try:
+        response = client.get(
+            "/api/changes/stream?tables=individuals",
+            headers={"Authorization": f"Bearer {token}", "Last-Event-ID": start},
+            buffered=False,
+        )
+    finally:
+        app.config["CHANGE_STREAM_HEARTBEAT"] = 15.0
+    assert response.mimetype == "text/event-stream"
+    chunks = (chunk.decode() for chunk in response.response)
+    assert next(chunks) == "retry: 3000\n\n"
+    lines = next(chunks).splitlines()
+    assert lines[0].startswith("id: ") and lines[1] == "event: change"
+    assert json.loads(lines[2][len("data: "):]) == {"table": "individuals", "op": "update", "id": 4, "fields": NEWBORN}
+    # The donation delete is filtered out; the stream idles with heartbeats
+    assert next(chunks) == ": keep-alive\n\n"
+    response.close()
+
+
+def test_change_stream_reset_and_validation(client):
+    token = get_token("test_user", "user")
+    response = client.get(
+        "/api/changes/stream",
+        headers={"Authorization": f"Bearer {token}", "Last-Event-ID": "stale-12"},
+        buffered=False,
+    )
+    chunks = (chunk.decode() for chunk in response.response)
+    next(chunks)
+    assert "event: reset" in next(chunks)
+    response.close()
+    response = client.get("/api/changes/stream?tables=users", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+    assert client.get("/api/changes/stream").status_code == 401
+
+#DELTA SYNC
+
+HORIZON = [{"horizon": "2024-03-01 09:30:14.000000"}]
+
+
+@patch("app.fetch_data")
+def test_delta_sync(mock_fetch_data, client):
+    entries = [
+        {"idchange_log": 11, "row_id": 1, "op": "insert", "settled": 1},
+        {"idchange_log": 12, "row_id": 2, "op": "update", "settled": 1},
+        {"idchange_log": 13, "row_id": 1, "op": "update", "settled": 1},
+        {"idchange_log": 14, "row_id": 3, "op": "delete", "settled": 1},
+        {"idchange_log": 15, "row_id": 4, "op": "insert", "settled": 1},
+    ]
+    rows = [{"idrelationships": 1, "type_id": 1}, {"idrelationships": 4, "type_id": 2}]
+    mock_fetch_data.side_effect = [HORIZON, entries, rows]
+    token = get_token("test_user", "user")
+    response = client.get("/api/relationships?since=10&limit=5", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    # Row 2 was deleted after its update was logged
+    assert response.json == {"upserts": rows, "deleted": [2, 3], "token": "15", "more": False}
+    assert "ETag" not in response.headers
+    assert "information_schema.innodb_trx" in mock_fetch_data.call_args_list[0][0][0]
+    query, args = mock_fetch_data.call_args_list[1][0]
+    assert "FROM change_log WHERE table_name = %s AND idchange_log > %s ORDER BY idchange_log" in query
+    assert args == ("2024-03-01 09:30:14.000000", "relationships", 10, 6)
+    query, args = mock_fetch_data.call_args_list[2][0]
+    assert query == "SELECT * FROM relationships WHERE idrelationships IN (%s, %s, %s)"
+    assert args == (1, 2, 4)
+
+
+@patch("app.fetch_data")
+def test_delta_sync_stops_at_unsettled_entries(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    mock_fetch_data.side_effect = [
+        HORIZON,
+        [
+            {"idchange_log": 21, "row_id": 5, "op": "delete", "settled": 1},
+            {"idchange_log": 22, "row_id": 6, "op": "insert", "settled": 0},
+            {"idchange_log": 23, "row_id": 7, "op": "insert", "settled": 1},
+        ],
+    ]
+    response = client.get("/api/donations?since=20&limit=2", headers=headers)
+    assert response.json == {"upserts": [], "deleted": [5], "token": "21", "more": False}
+    assert mock_fetch_data.call_count == 2
+
+    mock_fetch_data.side_effect = [
+        HORIZON,
+        [{"idchange_log": n, "row_id": n, "op": "delete", "settled": 1} for n in (21, 22, 23)],
+    ]
+    response = client.get("/api/donations?since=20&limit=2", headers=headers)
+    assert response.json == {"upserts": [], "deleted": [21, 22], "token": "22", "more": True}
+
+
+@patch("app.fetch_data")
+def test_delta_sync_waits_for_open_transactions(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    # Entry 31 belongs to a bulk upload that is still open, so it is not
+    # visible yet; 32 committed, but was written after that upload started
+    mock_fetch_data.side_effect = [HORIZON, [{"idchange_log": 32, "row_id": 9, "op": "delete", "settled": 0}]]
+    response = client.get("/api/donations?since=30", headers=headers)
+    assert response.json == {"upserts": [], "deleted": [], "token": "30", "more": False}
+
+    # Once the upload commits, the next sync from the same token gets both
+    mock_fetch_data.side_effect = [
+        HORIZON,
+        [
+            {"idchange_log": 31, "row_id": 8, "op": "insert", "settled": 1},
+            {"idchange_log": 32, "row_id": 9, "op": "delete", "settled": 1},
+        ],
+        [{"iddonations": 8, "individual_id": 1}],
+    ]
+    response = client.get("/api/donations?since=30", headers=headers)
+    assert response.json == {"upserts": [{"iddonations": 8, "individual_id": 1}], "deleted": [9], "token": "32", "more": False}
+
+
+def test_delta_sync_validation(client):
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/individuals?since=abc", headers=headers).status_code == 400
+    assert client.get("/api/donations?since=-1", headers=headers).status_code == 400
+    assert client.get("/api/relationships?since=0").status_code == 401
+    for url in ["/api/role_types?since=0", "/api/relationship_types?since=5&stream=1"]:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 400, url
+        assert "not supported" in response.json["message"]
+
+
+#EXPAND
+
+def expand_fetch(query, args=()):
+    if query.startswith("SELECT * FROM role_types"):
+        return [{"idrole_types": 1, "description": "Donor"}]
+    if "FROM individuals" in query:
+        return [{"idindividuals": 1, "type_id": 1, "fname": "John"}, {"idindividuals": 2, "type_id": 2, "fname": "Ana"}]
+    if "FROM donations" in query:
+        return [{"iddonations": 5, "individual_id": 1}, {"iddonations": 6, "individual_id": 1}]
+    if "FROM relationships" in query:
+        return [{"idrelationships": 9, "individual_1_id": 1, "individual_2_id": 2}]
+    return []
+
+
+@patch("app.fetch_data", side_effect=expand_fetch)
+def test_expand_individuals(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?expand=donations,relationships,type", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    john, ana = response.json
+    assert [donation["iddonations"] for donation in john["donations"]] == [5, 6]
+    assert ana["donations"] == []
+    assert john["relationships"] == ana["relationships"] == [{"idrelationships": 9, "individual_1_id": 1, "individual_2_id": 2}]
+    assert john["type"] == {"idrole_types": 1, "description": "Donor"}
+    assert ana["type"] is None
+    queries = [call[0][0] for call in mock_fetch_data.call_args_list]
+    assert sum("FROM donations" in query for query in queries) == 1
+    assert sum("FROM relationships" in query for query in queries) == 1
+    donation_query = next(call for call in mock_fetch_data.call_args_list if "FROM donations" in call[0][0])
+    assert "WHERE individual_id IN (%s, %s)" in donation_query[0][0]
+    assert donation_query[0][1] == (1, 2)
+
+
+@patch("app.fetch_data", side_effect=expand_fetch)
+def test_expand_single_individual_and_fields(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/1?expand=type&fields=fname", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert mock_fetch_data.call_args_list[0][0][0].startswith("SELECT idindividuals, type_id, fname FROM individuals")
+    assert response.json[0]["type"]["description"] == "Donor"
+
+
+@patch("app.fetch_data", side_effect=expand_fetch)
+def test_expand_etag_follows_related_tables(mock_fetch_data, client):
+    headers = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    plain = client.get("/api/individuals/1", headers=headers).headers["ETag"]
+    expanded = client.get("/api/individuals/1?expand=donations", headers=headers).headers["ETag"]
+    bump_version("donations")
+    assert client.get("/api/individuals/1", headers={**headers, "If-None-Match": plain}).status_code == 304
+    assert client.get("/api/individuals/1?expand=donations", headers={**headers, "If-None-Match": expanded}).status_code == 200
+
+
+def test_expand_invalid(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals?expand=users", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+    response = client.get("/api/individuals?expand=type&stream=1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+#STREAMING
+
+@patch("app.mysql")
+def test_get_donations_stream(mock_mysql, client):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchmany.side_effect = [
+        [{"iddonations": 1, "ampoule_count": 5}, {"iddonations": 2, "ampoule_count": 3}],
+        [{"iddonations": 3, "ampoule_count": 1}],
+        [],
+    ]
+    mock_mysql.connection.cursor.return_value = mock_cursor
+    token = get_token("test_user", "user")
+    response = client.get("/api/donations?stream=1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[2])["iddonations"] == 3
+    assert "LIMIT" not in mock_cursor.execute.call_args[0][0]
+    mock_cursor.close.assert_called_once()
+
+
+@patch("app.mysql")
+def test_get_individuals_stream_accept_header(mock_mysql, client):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchmany.side_effect = [[{"idindividuals": 1}], []]
+    mock_mysql.connection.cursor.return_value = mock_cursor
+    token = get_token("test_user", "user")
+    response = client.get(
+        "/api/individuals",
+        headers={"Authorization": f"Bearer {token}", "Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert len(response.get_data(as_text=True).splitlines()) == 1
+
+
+#JSON
+
+@patch("app.fetch_data")
+def test_dates_serialised_as_iso(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 1, "birthdate": datetime.date(1990, 5, 1)}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json() == [{"idindividuals": 1, "birthdate": "1990-05-01"}]
+
+
+@patch("app.mysql")
+def test_stream_dates_serialised_as_iso(mock_mysql, client):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchmany.side_effect = [[{"iddonations": 1, "date": datetime.date(2024, 3, 1)}], []]
+    mock_mysql.connection.cursor.return_value = mock_cursor
+    token = get_token("test_user", "user")
+    response = client.get("/api/donations?stream=1", headers={"Authorization": f"Bearer {token}"})
+    assert json.loads(response.get_data(as_text=True)) == {"iddonations": 1, "date": "2024-03-01"}
+
+
+#COMPRESSION
+
+@patch("app.fetch_data")
+def test_large_response_gzipped(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": i, "fname": "John", "lname": "Doe"} for i in range(1, 51)]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals", headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert len(json.loads(gzip.decompress(response.data))) == 50
+
+    response = client.get("/api/individuals", headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in response.headers
+    assert len(response.get_json()) == 50
+
+
+@patch("app.fetch_data")
+def test_small_response_not_compressed(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 1}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals", headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+@patch("app.mysql")
+def test_stream_gzipped_per_chunk(mock_mysql, client):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchmany.side_effect = [[{"iddonations": 1}], [{"iddonations": 2}], []]
+    mock_mysql.connection.cursor.return_value = mock_cursor
+    token = get_token("test_user", "user")
+    response = client.get(
+        "/api/donations?stream=1",
+        headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"},
+        buffered=False,
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    chunks = list(response.response)
+    # One compressed piece per database chunk, plus the gzip trailer
+    assert len(chunks) == 3
+    lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+    assert [json.loads(line)["iddonations"] for line in lines] == [1, 2]
+    response.close()
+    mock_cursor.close.assert_called_once()
+
+
+#METRICS
+
+@patch("app.fetch_data")
+def test_metrics_endpoint(mock_fetch_data, client):
+    mock_fetch_data.return_value = []
+    token = get_token("test_user", "user")
+    client.get("/api/individuals/7", headers={"Authorization": f"Bearer {token}"})
+    client.get("/api/individuals/7")
+    client.get("/api/donations?limit=x", headers={"Authorization": f"Bearer {token}"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/individuals/<int:individual_id>"}' in text
+    assert 'http_request_errors_total{method="GET",route="/api/individuals/<int:individual_id>",status="401"}' in text
+    assert 'http_request_errors_total{method="GET",route="/api/donations",status="400"}' in text
+
+
+@patch("app.mysql")
+def test_metrics_record_queries(mock_mysql, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.fetchall.return_value = [{"idindividuals": 1}, {"idindividuals": 2}]
+    fetch_data("SELECT * FROM individuals WHERE idindividuals IN (%s, %s)", (1, 2))
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'db_query_duration_seconds_count{statement="SELECT * FROM individuals WHERE idindividuals IN (%s, ...)"}' in text
+    assert 'db_query_rows_total{statement="SELECT * FROM individuals WHERE idindividuals IN (%s, ...)"}' in text
+
+
+@patch("app.slow_queries")
+@patch("app.mysql")
+def test_slow_query_reported_with_route(mock_mysql, mock_slow_queries, client):
+    mock_slow_queries.threshold = 1e-9
+    mock_mysql.connection.cursor.return_value.fetchall.return_value = []
+    token = get_token("test_user", "user")
+    client.get("/api/donations?individual_id=3", headers={"Authorization": f"Bearer {token}"})
+    query, args, duration, rows, route = mock_slow_queries.report.call_args[0]
+    assert "WHERE individual_id = %s" in query
+    assert args[0] == 3
+    assert rows == 0
+    assert route == "/api/donations"
+
+#CONNECTION POOL
+
+@patch("app.mysql")
+def test_fetch_data_reconnects_when_server_gone(mock_mysql, client):
+    dead_cursor = MagicMock()
+    dead_cursor.execute.side_effect = MySQLdb.OperationalError(2006, "MySQL server has gone away")
+    mock_mysql.connection.cursor.return_value = dead_cursor
+    fresh_cursor = MagicMock()
+    fresh_cursor.fetchall.return_value = [{"idindividuals": 1}]
+    mock_mysql.reconnect.return_value.cursor.return_value = fresh_cursor
+    assert fetch_data("SELECT 1") == [{"idindividuals": 1}]
+    mock_mysql.reconnect.assert_called_once()
+
+
+@patch("app.mysql")
+def test_pool_stats(mock_mysql, client):
+    mock_mysql.pool.stats.return_value = {"size": 2, "idle": 2, "in_use": 0}
+    token = get_token("admin_user", "admin")
+    response = client.get("/api/pool/stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json["size"] == 2
+
+
+def test_pool_stats_forbidden(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/pool/stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+
+@patch("app.fetch_data")
+def test_pool_timeout_returns_503(mock_fetch_data, client):
+    mock_fetch_data.side_effect = PoolTimeout("No database connection available within 5.0s.")
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 503
+
+
+#LOOKUP CACHE
+
+@patch("app.fetch_data")
+def test_role_types_served_from_cache(mock_fetch_data, client):
+    mock_fetch_data.return_value = [
+        {"idrole_types": 2, "description": "Patient"},
+        {"idrole_types": 1, "description": "Donor"}
+    ]
+    token = get_token("test_user", "user")
+    response = client.get("/api/role_types", headers={"Authorization": f"Bearer {token}"})
+    assert [row["idrole_types"] for row in response.json] == [1, 2]
+    response = client.get("/api/role_types/2", headers={"Authorization": f"Bearer {token}"})
+    assert response.json[0]["description"] == "Patient"
+    response = client.get("/api/role_types?after=1", headers={"Authorization": f"Bearer {token}"})
+    assert [row["idrole_types"] for row in response.json] == [2]
+    assert mock_fetch_data.call_count == 1
+    assert lookup_cache.get("role_types", 1)["description"] == "Donor"
+
+
+@patch("app.execute_query")
+@patch("app.fetch_data")
+def test_relationship_types_cache_refreshed_on_write(mock_fetch_data, mock_execute_query, client):
+    mock_fetch_data.return_value = [{"idrelationship_types": 1, "description": "Family"}]
+    token = get_token("admin_user", "admin")
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/relationship_types", headers=headers)
+
+    mock_fetch_data.return_value = [{"idrelationship_types": 1, "description": "Next of kin"}]
+    response = client.put("/api/relationship_types/1", json={"description": "Next of kin"}, headers=headers)
+    assert response.status_code == 200
+    response = client.get("/api/relationship_types/1", headers=headers)
+    assert response.json[0]["description"] == "Next of kin"
+    assert mock_fetch_data.call_count == 2
+
+
+#ETAGS
+
+@patch("app.fetch_data")
+def test_get_individuals_not_modified(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 1, "fname": "John"}]
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = client.get(
+        "/api/individuals", headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert mock_fetch_data.call_count == 1
+
+
+@patch("app.stream_data")
+@patch("app.fetch_data")
+def test_etag_depends_on_representation(mock_fetch_data, mock_stream_data, client):
+    mock_fetch_data.return_value = [{"idindividuals": 1, "fname": "John"}]
+    mock_stream_data.return_value = app.response_class('{"idindividuals": 1}\n', mimetype="application/x-ndjson")
+    headers = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    response = client.get("/api/individuals", headers=headers)
+    assert "Accept" in response.headers["Vary"]
+    etag = response.headers["ETag"]
+    # A cached JSON body must not be reused for an NDJSON request
+    response = client.get("/api/individuals", headers={**headers, "Accept": "application/x-ndjson", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["ETag"] != etag
+    assert "Accept" in response.headers["Vary"]
+
+
+@patch("app.fetch_data")
+def test_etag_changes_after_write(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"iddonations": 1}]
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/api/donations/1", headers=headers).headers["ETag"]
+
+    execute_query("UPDATE donations SET ampoule_count = %s WHERE iddonations = %s", (3, 1))
+    response = client.get("/api/donations/1", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@patch("app.fetch_data")
+def test_etag_differs_per_query_string(mock_fetch_data, client):
+    mock_fetch_data.return_value = []
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get("/api/relationships?limit=10", headers=headers).headers["ETag"]
+    second = client.get("/api/relationships?limit=20", headers=headers).headers["ETag"]
+    assert first != second
+
+
+def test_written_table():
+    assert written_table("\n        INSERT INTO individuals (fname) VALUES (%s)") == "individuals"
+    assert written_table("UPDATE donations SET date = %s") == "donations"
+    assert written_table("DELETE FROM relationships WHERE idrelationships = %s") == "relationships"
+    assert written_table("SELECT * FROM individuals") is None
+
+
+#BULK DONATIONS
+
+@patch("app.execute_many")
+def test_add_donations_bulk(mock_execute_many, client):
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    app.config["BULK_BATCH_SIZE"] = 2
+    token = get_token("admin_user", "admin")
+    donation = {"individual_id": 2, "date": "2023-12-01", "ampoule_count": 5, "motilitiy_rating": 4.5}
+    response = client.post(
+        "/api/donations/bulk",
+        json=[donation, donation, {"individual_id": 2}, donation, {**donation, "date": "yesterday"}],
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    app.config["BULK_BATCH_SIZE"] = 1000
+    assert response.status_code == 201
+    assert response.json["inserted"] == 3
+    assert response.json["error_count"] == 2
+    assert [error["index"] for error in response.json["errors"]] == [2, 4]
+    assert "Missing fields" in response.json["errors"][0]["message"]
+    assert [len(call[0][1]) for call in mock_execute_many.call_args_list] == [2, 1]
+
+
+@patch("app.execute_many")
+def test_add_donations_bulk_ndjson(mock_execute_many, client):
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    token = get_token("admin_user", "admin")
+    body = (
+        '{"individual_id": 1, "date": "2024-01-02", "ampoule_count": 3, "motilitiy_rating": 3.5}\n'
+        "not json\n"
+        '{"individual_id": 2, "date": "2024-01-02", "ampoule_count": 1, "motilitiy_rating": 4}\n'
+    )
+    response = client.post(
+        "/api/donations/bulk",
+        data=body,
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 201
+    assert response.json["inserted"] == 2
+    assert response.json["errors"][0]["index"] == 1
+
+
+@patch("app.execute_many")
+def test_add_donations_bulk_caps_reported_errors(mock_execute_many, client):
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    token = get_token("admin_user", "admin")
+    response = client.post(
+        "/api/donations/bulk",
+        data="not json\n" * 250,
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
+    assert response.json["error_count"] == 250
+    assert len(response.json["errors"]) == 100
+    assert response.json["errors"][-1]["index"] == 99
+
+
+@patch("app.execute_many")
+def test_add_donations_bulk_rolls_back_on_error(mock_execute_many, client):
+    mock_execute_many.side_effect = MySQLdb.IntegrityError(1452, "Cannot add or update a child row")
+    token = get_token("admin_user", "admin")
+    with patch("app.mysql") as mock_mysql:
+        response = client.post(
+            "/api/donations/bulk",
+            json=[{"individual_id": 99, "date": "2023-12-01", "ampoule_count": 5, "motilitiy_rating": 4.5}],
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        mock_mysql.connection.rollback.assert_called_once()
+        mock_mysql.connection.commit.assert_not_called()
+    assert response.status_code == 500
+    assert response.json["inserted"] == 0
+
+
+def test_add_donations_bulk_requires_array(client):
+    token = get_token("admin_user", "admin")
+    response = client.post(
+        "/api/donations/bulk", json={"individual_id": 1}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
+
+
+def test_add_donations_bulk_forbidden(client):
+    token = get_token("test_user", "user")
+    response = client.post("/api/donations/bulk", json=[], headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+
+@patch("app.execute_query")
+@patch("app.donation_writer")
+def test_add_donation_group_commit(mock_writer, mock_execute_query, client):
+    mock_writer.submit.return_value = 77
+    app.config["DONATION_GROUP_COMMIT"] = True
+    try:
+        token = get_token("admin_user", "admin")
+        response = client.post(
+            "/api/donations",
+            json={"individual_id": 2, "date": "2023-12-01", "ampoule_count": 5, "motilitiy_rating": 4.5},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    finally:
+        app.config["DONATION_GROUP_COMMIT"] = False
+    assert response.status_code == 201
+    assert response.json["id"] == 77
+    mock_writer.submit.assert_called_once_with((2, "2023-12-01", 5, 4.5))
+    mock_execute_query.assert_not_called()
+
+
+#CSV IMPORT
+
+CSV_BODY = (
+    "type_id,birthdate,is_male,fname,mname,lname,address,contact\n"
+    "1,1990-01-01,1,John,,Doe,Manila,0917\n"
+    "7,1990-01-01,0,Jane,,Doe,Manila,0918\n"
+)
+
+
+@patch("app.execute_many")
+@patch("app.fetch_data")
+def test_import_individuals_raw_csv(mock_fetch_data, mock_execute_many, client):
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}]
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    token = get_token("admin_user", "admin")
+    response = client.post(
+        "/api/individuals/import",
+        data=CSV_BODY,
+        content_type="text/csv",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.json["inserted"] == 1
+    assert response.json["errors"][0]["message"] == "Unknown type_id: 7"
+    assert response.json["checkpoint"] == 2
+
+
+@patch("app.execute_many")
+@patch("app.fetch_data")
+def test_import_individuals_invalid_encoding(mock_fetch_data, mock_execute_many, client):
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}]
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    token = get_token("admin_user", "admin")
+    # Well past one decoder chunk of good rows, then a Latin-1 byte
+    body = CSV_BODY.split("\n")[0] + "\n" + "1,1990-01-01,1,John,,Doe,Manila,0917\n" * 500
+    response = client.post(
+        "/api/individuals/import",
+        data=body.encode() + b"1,1990-01-01,1,Jos\xe9,,Doe,Manila,0917\n",
+        content_type="text/csv",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
+    assert response.json["invalid_encoding"]
+    assert 0 < response.json["checkpoint"] == response.json["inserted"]
+
+
+@patch("app.execute_many")
+@patch("app.fetch_data")
+def test_import_individuals_multipart_resume(mock_fetch_data, mock_execute_many, client):
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}]
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    token = get_token("admin_user", "admin")
+    response = client.post(
+        "/api/individuals/import?resume_from=1",
+        data={"file": (io.BytesIO(CSV_BODY.encode()), "individuals.csv")},
+        content_type="multipart/form-data",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.json["skipped"] == 1
+    assert response.json["inserted"] == 0
+
+
+def test_import_individuals_missing_columns(client):
+    token = get_token("admin_user", "admin")
+    response = client.post(
+        "/api/individuals/import",
+        data="fname,lname\nJohn,Doe\n",
+        content_type="text/csv",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
+
+
+@patch("app.execute_many")
+@patch("app.fetch_data")
+def test_import_individuals_command(mock_fetch_data, mock_execute_many, client, tmp_path):
+    mock_fetch_data.return_value = [{"idrole_types": 1, "description": "Donor"}, {"idrole_types": 7, "description": "Patient"}]
+    mock_execute_many.side_effect = lambda query, rows: len(rows)
+    path = tmp_path / "individuals.csv"
+    path.write_text(CSV_BODY)
+    result = app.test_cli_runner().invoke(args=["import-individuals", str(path)])
+    assert result.exit_code == 0
+    assert '"inserted": 2' in result.output
+    assert not (tmp_path / "individuals.csv.checkpoint").exists()
+
+
+#LINEAGE
+
+def lineage_fetch(query, args=()):
+    if "relationship_types" in query:
+        return [{"idrelationship_types": 1, "description": "Donor"}, {"idrelationship_types": 2, "description": "Partner"}]
+    return [
+        {"idrelationships": 1, "type_id": 1, "individual_1_id": 10, "individual_2_id": 20},
+        {"idrelationships": 2, "type_id": 1, "individual_1_id": 10, "individual_2_id": 30},
+        {"idrelationships": 3, "type_id": 2, "individual_1_id": 10, "individual_2_id": 40},
+    ]
+
+
+@patch("app.fetch_data", side_effect=lineage_fetch)
+def test_get_descendants(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/10/descendants", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json["count"] == 2
+    assert response.json["descendants"] == [{"id": 20, "generation": 1}, {"id": 30, "generation": 1}]
+
+
+@patch("app.fetch_data", side_effect=lineage_fetch)
+def test_get_ancestors_siblings_kinship(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/individuals/20/ancestors", headers=headers)
+    assert response.json["ancestors"] == [{"id": 10, "generation": 1}]
+    response = client.get("/api/individuals/20/siblings", headers=headers)
+    assert response.json["half"] == [30]
+    response = client.get("/api/individuals/20/kinship/30", headers=headers)
+    assert response.json["degree"] == 2
+    response = client.get("/api/individuals/20/kinship/40", headers=headers)
+    assert response.json["degree"] is None
+    assert mock_fetch_data.call_count == 2
+
+
+@patch("app.execute_query")
+@patch("app.fetch_data", side_effect=lineage_fetch)
+def test_lineage_follows_relationship_writes(mock_fetch_data, mock_execute_query, client):
+    user = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    admin = {"Authorization": f"Bearer {get_token('admin_user', 'admin')}"}
+    client.get("/api/individuals/10/descendants", headers=user)
+    client.put(
+        "/api/relationships/3",
+        json={"type_id": 1, "individual_1_id": 10, "individual_2_id": 40, "date_start": "2023-01-01", "date_end": None},
+        headers=admin,
+    )
+    client.delete("/api/relationships/2", headers=admin)
+    response = client.get("/api/individuals/10/descendants", headers=user)
+    assert [row["id"] for row in response.json["descendants"]] == [20, 40]
+
+
+def test_get_descendants_invalid_depth(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/10/descendants?max_depth=x", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+#DONATION STATS
+
+def stats_fetch(query, args=()):
+    if "WHERE individual_id" in query:
+        return [{
+            "individual_id": args[0], "donation_count": 1, "total_ampoules": 4, "rating_sum": 3.0,
+            "motility_min": 3.0, "motility_max": 3.0, "last_donation_date": datetime.date(2024, 3, 1),
+        }]
+    if "GROUP BY" in query:
+        return [{
+            "individual_id": 2, "donation_count": 2, "total_ampoules": 8, "rating_sum": 9.0,
+            "motility_min": 4.0, "motility_max": 5.0, "last_donation_date": datetime.date(2024, 1, 1),
+        }]
+    return [{"individual_id": 2}]
+
+
+@patch("app.execute_query")
+@patch("app.fetch_data", side_effect=stats_fetch)
+def test_donation_stats_follow_writes(mock_fetch_data, mock_execute_query, client):
+    user = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    admin = {"Authorization": f"Bearer {get_token('admin_user', 'admin')}"}
+    response = client.get("/api/individuals/2/donation_stats", headers=user)
+    assert response.status_code == 200
+    assert response.json["motility_mean"] == 4.5
+
+    client.post(
+        "/api/donations",
+        json={"individual_id": 2, "date": "2024-02-01", "ampoule_count": 2, "motilitiy_rating": 3.0},
+        headers=admin,
+    )
+    response = client.get("/api/individuals/2/donation_stats", headers=user)
+    assert response.json["donation_count"] == 3
+    assert response.json["total_ampoules"] == 10
+    assert response.json["last_donation_date"] == "2024-02-01"
+    assert response.json["motility_min"] == 3.0
+
+    client.delete("/api/donations/7", headers=admin)
+    response = client.get("/api/individuals/2/donation_stats", headers=user)
+    assert response.json["donation_count"] == 1
+    assert not any("GROUP BY individual_id" in call[0][0] and "WHERE" not in call[0][0] for call in mock_fetch_data.call_args_list[1:])
+
+
+@patch("app.fetch_data", side_effect=stats_fetch)
+def test_bulk_donation_stats(mock_fetch_data, client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/donation_stats?ids=2,5", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json["2"]["donation_count"] == 2
+    assert response.json["5"]["donation_count"] == 0
+    response = client.get("/api/donation_stats", headers={"Authorization": f"Bearer {token}"})
+    assert [row["individual_id"] for row in response.json] == [2]
+    response = client.get("/api/donation_stats?after=2", headers={"Authorization": f"Bearer {token}"})
+    assert response.json == []
+
+
+@patch("app.execute_query")
+@patch("app.fetch_data", side_effect=stats_fetch)
+def test_donation_stats_etag_follows_individual_delete(mock_fetch_data, mock_execute_query, client):
+    mock_execute_query.return_value = 1
+    user = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    admin = {"Authorization": f"Bearer {get_token('admin_user', 'admin')}"}
+    etag = client.get("/api/donation_stats", headers=user).headers["ETag"]
+    client.delete("/api/individuals/2", headers=admin)
+    response = client.get("/api/donation_stats", headers={**user, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json == []
+
+
+@patch("app.fetch_data")
+def test_donation_stats_load_keeps_concurrent_writes(mock_fetch_data, client):
+    def fetch(query, args=()):
+        if "GROUP BY" in query and "WHERE" not in query:
+            # Another request commits a donation while the table is being read
+            record_change("donations", "insert", 8, {"individual_id": 2, "date": "2024-03-01", "ampoule_count": 4, "motilitiy_rating": 3.0})
+        return stats_fetch(query, args)
+
+    mock_fetch_data.side_effect = fetch
+    token = get_token("test_user", "user")
+    for _ in range(5):
+        response = client.get("/api/individuals/2/donation_stats", headers={"Authorization": f"Bearer {token}"})
+    # The queued insert is replayed by rereading the donor, not added on top of the load
+    assert response.json["donation_count"] == 1
+    assert response.json["total_ampoules"] == 4
+    full_scans = [call for call in mock_fetch_data.call_args_list if "GROUP BY" in call[0][0] and "WHERE" not in call[0][0]]
+    assert len(full_scans) == 1
+    assert donation_stats_loader.loaded
+
+
+def test_bulk_donation_stats_invalid_ids(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/donation_stats?ids=1,x", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+NAMES = [(1, "John", "Reyes", "Santos"), (2, "Maria", "", "Cruz"), (3, "Mariano", "Jose", "Cruz")]
+
+
+@patch("app.execute_query")
+@patch("app.iter_rows")
+def test_search_individuals(mock_iter_rows, mock_execute_query, client):
+    mock_iter_rows.side_effect = lambda query, args=(): iter(NAMES if not args else [(9, "Andres", "", "Bonifacio")])
+    user = {"Authorization": f"Bearer {get_token('test_user', 'user')}"}
+    admin = {"Authorization": f"Bearer {get_token('admin_user', 'admin')}"}
+    response = client.get("/api/individuals/search?q=jhon%20santos", headers=user)
+    assert response.status_code == 200
+    assert response.json[0]["id"] == 1
+    response = client.get("/api/individuals/search?q=cruz&limit=1", headers=user)
+    assert len(response.json) == 1
+
+    client.put(
+        "/api/individuals/2",
+        json={"type_id": 1, "birthdate": "1990-01-01", "is_male": 0, "fname": "Maria", "mname": "", "lname": "Clara", "address": "", "contact": ""},
+        headers=admin,
+    )
+    response = client.get("/api/individuals/search?q=maria%20clara", headers=user)
+    assert response.json[0] == {"id": 2, "name": "Maria Clara", "score": 1.0}
+    client.delete("/api/individuals/1", headers=admin)
+    response = client.get("/api/individuals/search?q=santos", headers=user)
+    assert response.json == []
+    assert mock_iter_rows.call_count == 1
+
+
+@patch("app.iter_rows")
+def test_search_index_load_keeps_concurrent_writes(mock_iter_rows, client):
+    def rows(query, args=()):
+        yield from NAMES[:2]
+        record_change("individuals", "update", 2, {"fname": "Maria", "mname": "", "lname": "Clara"})
+        yield NAMES[2]
+
+    mock_iter_rows.side_effect = rows
+    token = get_token("test_user", "user")
+    for _ in range(3):
+        response = client.get("/api/individuals/search?q=maria%20clara", headers={"Authorization": f"Bearer {token}"})
+    assert response.json[0] == {"id": 2, "name": "Maria Clara", "score": 1.0}
+    assert mock_iter_rows.call_count == 1
+
+
+@patch("app.fetch_data")
+@patch("app.iter_rows")
+def test_warm_up_loads_indexes_once(mock_iter_rows, mock_fetch_data, client):
+    mock_iter_rows.side_effect = lambda query, args=(): iter(NAMES)
+    mock_fetch_data.return_value = []
+    warm_up()
+    warm_up()
+    assert lineage_loader.loaded and donation_stats_loader.loaded and name_index_loader.loaded
+    assert mock_iter_rows.call_count == 1
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/search?q=john", headers={"Authorization": f"Bearer {token}"})
+    assert response.json[0]["id"] == 1
+    assert mock_iter_rows.call_count == 1
+
+
+def test_search_individuals_requires_query(client):
+    token = get_token("test_user", "user")
+    response = client.get("/api/individuals/search?q=", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+    response = client.get("/api/individuals/search?q=maria&limit=x", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
+
+
+#SCHEMA
+
+@patch("app.mysql")
+def test_explain_queries_command(mock_mysql, client):
+    cursor = mock_mysql.connection.cursor.return_value
+    cursor.description = [("table",), ("type",), ("key",), ("Extra",)]
+    cursor.fetchall.return_value = [("users", "const", "uq_users_username", None)]
+    result = app.test_cli_runner().invoke(args=["explain-queries"])
+    assert result.exit_code == 0, result.output
+    assert "SELECT * FROM users WHERE username" in result.output
+    # Runtime-built queries are EXPLAINed through their representative cases
+    assert "page_query_cases" in result.output
+    assert "SELECT * FROM individuals WHERE idindividuals > %s ORDER BY" in result.output
+
+    cursor.fetchall.return_value = [("users", "ALL", None, None)]
+    result = app.test_cli_runner().invoke(args=["explain-queries"])
+    assert result.exit_code == 1
+    assert "allowed" in result.output
+
+
+@patch("app.apply_migrations")
+def test_migrate_command(mock_apply_migrations, client):
+    mock_apply_migrations.return_value = [(2, "user_indexes")]
+    result = app.test_cli_runner().invoke(args=["migrate", "--target", "2"])
+    assert result.exit_code == 0
+    assert "Applied 002_user_indexes" in result.output
+    assert mock_apply_migrations.call_args[1]["target"] == 2
+
+
+@patch("app.execute_query")
+@patch("app.fetch_data")
+def test_compact_change_log_command(mock_fetch_data, mock_execute_query, client):
+    mock_fetch_data.return_value = [{"last": 25000}]
+    mock_execute_query.return_value = 3
+    result = app.test_cli_runner().invoke(args=["compact-change-log"])
+    assert result.exit_code == 0, result.output
+    assert "Removed 9 superseded" in result.output
+    assert [call[0][1] for call in mock_execute_query.call_args_list] == [(0, 10000), (10000, 20000), (20000, 30000)]
@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import datetime
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+pytest.importorskip("starlette")
+pytest.importorskip("aiomysql")
+pytest.importorskip("httpx")
+
+from starlette.testclient import TestClient
+import asgi
+from app import app as flask_app
+from test_app import get_token
+
+
+@pytest.fixture
+def client():
+    flask_app.config["JWT_SECRET_KEY"] = "test_secret_key"
+    flask_app.config["WARM_UP_INDEXES"] = False
+    asgi.table_versions.clear()
+    return TestClient(asgi.app)
+
+
+def auth(role="user"):
+    return {"Authorization": f"Bearer {get_token(f'{role}_user', role)}"}
+
+
+def test_flask_tokens_accepted(client):
+    response = client.get("/api/test", headers=auth())
+    assert response.status_code == 200
+    assert response.json()["user"] == {"username": "user_user", "role": "user"}
+
+
+def test_auth_errors_match_flask_jwt_extended(client):
+    assert client.get("/api/test").status_code == 401
+    assert client.get("/api/test").json() == {"msg": "Missing Authorization Header"}
+    assert client.get("/api/test", headers={"Authorization": "Bearer not.a.token"}).status_code == 422
+    with flask_app.test_request_context():
+        from flask_jwt_extended import create_access_token
+        expired = create_access_token(identity={"username": "u", "role": "user"}, expires_delta=datetime.timedelta(seconds=-1))
+    response = client.get("/api/test", headers={"Authorization": f"Bearer {expired}"})
+    assert response.status_code == 401
+    assert response.json() == {"msg": "Token has expired"}
+    # Empty segments between commas are skipped, not a 500
+    response = client.get("/api/test", headers={"Authorization": f"Basic x, , {auth()['Authorization']}"})
+    assert response.status_code == 200
+    assert client.get("/api/test", headers={"Authorization": "Basic x,,"}).status_code == 401
+
+
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_login_token_works_on_flask_app(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"username": "admin_user", "role": "admin"}]
+    response = client.post("/api/auth/login", json={"username": "admin_user", "password": "x"})
+    assert response.status_code == 200
+    token = response.json()["token"]
+    with patch("app.mysql"):
+        response = flask_app.test_client().get("/api/test", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json["user"]["role"] == "admin"
+
+
+@patch("asgi.execute", new_callable=AsyncMock)
+def test_role_required(mock_execute, client):
+    response = client.post("/api/role_types", json={"description": "Donor"}, headers=auth())
+    assert response.status_code == 403
+    assert response.json() == {"message": "Access forbidden."}
+    response = client.post("/api/role_types", json={"description": "Donor"}, headers=auth("admin"))
+    assert response.status_code == 201
+    assert response.json() == {"message": "Role_type added successfully."}
+    assert mock_execute.call_args[0] == ("INSERT INTO role_types (description) VALUES (%s)", ["Donor"])
+
+
+INDIVIDUAL = {
+    "type_id": 1, "birthdate": "1990-01-01", "is_male": True, "fname": "John",
+    "mname": "", "lname": "Smith", "address": "", "contact": "",
+}
+
+
+@patch("asgi.execute", new_callable=AsyncMock)
+def test_add_returns_id_like_flask(mock_execute, client):
+    mock_execute.return_value = MagicMock(lastrowid=42)
+    response = client.post("/api/individuals", json=INDIVIDUAL, headers=auth("admin"))
+    assert response.status_code == 201
+    assert response.json() == {"message": "Individual added successfully.", "id": 42}
+    response = client.post("/api/relationship_types", json={"description": "Donor"}, headers=auth("admin"))
+    assert response.json() == {"message": "Relationship_type added successfully."}
+
+
+@patch("asgi.execute_query", new_callable=AsyncMock)
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_update_missing_row_is_404_like_flask(mock_fetch_data, mock_execute_query, client):
+    mock_fetch_data.return_value = []
+    response = client.put("/api/individuals/99", json=INDIVIDUAL, headers=auth("admin"))
+    assert response.status_code == 404
+    assert response.json() == {"message": "Individual not found."}
+    assert not mock_execute_query.called
+
+    mock_fetch_data.return_value = [{"idindividuals": 1}]
+    response = client.put("/api/individuals/1", json=INDIVIDUAL, headers=auth("admin"))
+    assert response.status_code == 200
+    assert response.json() == {"message": "Individual updated successfully."}
+    # app.py doesn't check the lookup tables either
+    mock_fetch_data.reset_mock()
+    response = client.put("/api/role_types/7", json={"description": "Donor"}, headers=auth("admin"))
+    assert response.status_code == 200
+    assert not mock_fetch_data.called
+
+
+@patch("asgi.execute_query", new_callable=AsyncMock)
+def test_validation_and_not_found(mock_execute_query, client):
+    response = client.post("/api/donations", json={"individual_id": 1}, headers=auth("admin"))
+    assert response.status_code == 400
+    assert response.json()["message"] == "Missing fields: date, ampoule_count, motilitiy_rating"
+    mock_execute_query.return_value = 0
+    response = client.delete("/api/individuals/99", headers=auth("admin"))
+    assert response.status_code == 404
+    assert response.json() == {"message": "Individual not found."}
+
+
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_pagination_filters_and_etag(mock_fetch_data, client):
+    mock_fetch_data.return_value = [
+        {"iddonations": 9, "date": datetime.date(2024, 2, 1)},
+        {"iddonations": 4, "date": datetime.date(2024, 1, 15)},
+    ]
+    response = client.get("/api/donations?individual_id=2&sort=-date&limit=1", headers=auth())
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.headers["X-Next-Cursor"] == "2024-02-01,9"
+    query, args = mock_fetch_data.call_args[0]
+    assert "WHERE individual_id = %s ORDER BY date DESC, iddonations DESC LIMIT %s" in query
+    assert args == (2, 2)
+
+    etag = response.headers["ETag"]
+    response = client.get("/api/donations?individual_id=2&sort=-date&limit=1", headers={**auth(), "If-None-Match": etag})
+    assert response.status_code == 304
+    assert client.get("/api/donations?sort=size", headers=auth()).status_code == 400
+
+
+@patch("asgi.connection")
+def test_pool_timeout(mock_connection, client):
+    mock_connection.side_effect = asgi.PoolTimeout("No database connection available within 5.0s.")
+    response = client.get("/api/individuals/1", headers=auth())
+    assert response.status_code == 503
+
+
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_fields(mock_fetch_data, client):
+    mock_fetch_data.return_value = []
+    response = client.get("/api/relationships/3?fields=individual_1_id,individual_2_id", headers=auth())
+    assert response.status_code == 200
+    assert mock_fetch_data.call_args[0][0].startswith("SELECT idrelationships, individual_1_id, individual_2_id FROM relationships")
+    assert client.get("/api/relationships?fields=secret", headers=auth()).status_code == 400
+
+
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_by_ids(mock_fetch_data, client):
+    mock_fetch_data.return_value = [{"idrelationships": 2}]
+    response = client.get("/api/relationships?ids=2,4", headers=auth())
+    assert response.json() == {"2": {"idrelationships": 2}, "4": None}
+    response = client.post("/api/relationships/by_ids", json={"ids": [2]}, headers=auth())
+    assert response.json() == {"2": {"idrelationships": 2}}
+    assert mock_fetch_data.call_args[0] == ("SELECT * FROM relationships WHERE idrelationships IN (%s)", (2,))
+
+
+@patch("asgi.fetch_data", new_callable=AsyncMock)
+def test_flask_only_params_rejected(mock_fetch_data, client):
+    for url in ["/api/individuals?since=0", "/api/donations?since=5&limit=10", "/api/individuals?expand=donations", "/api/individuals/1?expand=type"]:
+        response = client.get(url, headers=auth())
+        assert response.status_code == 400, url
+        assert "Not supported by the async server" in response.json()["message"]
+    assert not mock_fetch_data.called
+
+
+def test_reads_skip_rollback(client):
+    cursor = AsyncMock()
+    cursor.fetchall.return_value = [{"idindividuals": 1}]
+    conn = AsyncMock()
+
+    @contextlib.asynccontextmanager
+    async def open_cursor(*args):
+        yield cursor
+
+    @contextlib.asynccontextmanager
+    async def connection():
+        yield conn
+
+    conn.cursor = open_cursor
+
+    with patch("asgi.connection", connection):
+        assert asyncio.run(asgi.fetch_data("SELECT * FROM individuals WHERE idindividuals = %s", (1,))) == [{"idindividuals": 1}]
+    assert not conn.rollback.called
+    assert not conn.commit.called
+
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from change_feed import ChangeFeed
+
+
+def test_since_resumes_after_id():
+    feed = ChangeFeed(size=10)
+    start = feed.last_id
+    first = feed.publish({"n": 1})
+    feed.publish({"n": 2})
+    assert [event["n"] for _, event in feed.since(start)] == [1, 2]
+    assert [event["n"] for _, event in feed.since(first)] == [2]
+    assert feed.since(feed.last_id) == []
+
+
+def test_since_reports_gaps():
+    feed = ChangeFeed(size=3)
+    start = feed.last_id
+    for n in range(5):
+        feed.publish({"n": n})
+    # Events 1 and 2 fell out of the buffer
+    assert feed.since(start) is None
+    assert feed.since("other-1") is None
+    assert feed.since(f"{feed.epoch}-99") is None
+    assert feed.since(f"{feed.epoch}-2") == [(f"{feed.epoch}-3", {"n": 2}), (f"{feed.epoch}-4", {"n": 3}), (f"{feed.epoch}-5", {"n": 4})]
+
+
+def test_wait_wakes_on_publish():
+    feed = ChangeFeed()
+    start = feed.last_id
+    assert feed.wait(start, 0.01) == []
+    timer = threading.Timer(0.05, feed.publish, args=({"n": 1},))
+    timer.start()
+    started = time.monotonic()
+    events = feed.wait(start, 5)
+    assert [event for _, event in events] == [{"n": 1}]
+    assert time.monotonic() - started < 5
@@ -0,0 +1,61 @@
+import gzip
+import zlib
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wrappers import Response
+
+from compress import GzipStream, compress_chunks, compress_response, is_compressible
+
+
+LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+
+
+def accept(value):
+    return parse_accept_header(value)
+
+
+def test_gzip_stream_flushes_every_chunk():
+    decompressor = zlib.decompressobj(31)
+    seen = b""
+    for piece in compress_chunks(iter([b'{"a": 1}\n', '{"a": 2}\n']), GzipStream(6)):
+        seen += decompressor.decompress(piece)
+        if seen.endswith(b'{"a": 1}\n'):
+            break
+    # The first line is readable before the stream has finished
+    assert seen == b'{"a": 1}\n'
+
+
+def test_compress_chunks_closes_source():
+    closed = []
+
+    def source():
+        try:
+            yield b"x" * 100
+            yield b"y" * 100
+        finally:
+            closed.append(True)
+
+    chunks = compress_chunks(source(), GzipStream(6))
+    next(chunks)
+    chunks.close()
+    assert closed == [True]
+
+
+def test_compress_response_negotiation():
+    body = b"[" + b",".join(b'{"id": %d}' % i for i in range(200)) + b"]"
+    response = compress_response(Response(body, mimetype="application/json"), accept("identity"), LEVELS, 500)
+    assert "Content-Encoding" not in response.headers
+
+    response = compress_response(Response(body, mimetype="application/json"), accept("br;q=1, gzip;q=0.5"), LEVELS, 500)
+    assert response.headers["Content-Encoding"] in ("br", "gzip")
+    if response.headers["Content-Encoding"] == "gzip":
+        assert gzip.decompress(response.get_data()) == body
+
+    response = compress_response(Response(body, mimetype="image/png"), accept("gzip"), LEVELS, 500)
+    assert "Content-Encoding" not in response.headers
+
+
+def test_is_compressible():
+    assert is_compressible("application/json")
+    assert is_compressible("text/html")
+    assert not is_compressible("application/octet-stream")
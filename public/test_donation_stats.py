@@ -0,0 +1,66 @@
+import datetime
+from donation_stats import DonationStats
+
+
+def aggregate(individual_id, count, ampoules, rating_sum, low, high, last):
+    return {
+        "individual_id": individual_id,
+        "donation_count": count,
+        "total_ampoules": ampoules,
+        "rating_sum": rating_sum,
+        "motility_min": low,
+        "motility_max": high,
+        "last_donation_date": last,
+    }
+
+
+def test_load_and_get():
+    stats = DonationStats()
+    stats.load([aggregate(1, 2, 8, 7.0, 3.0, 4.0, datetime.date(2024, 1, 5))])
+    assert stats.get(1) == {
+        "individual_id": 1,
+        "donation_count": 2,
+        "total_ampoules": 8,
+        "last_donation_date": "2024-01-05",
+        "motility_mean": 3.5,
+        "motility_min": 3.0,
+        "motility_max": 4.0,
+    }
+    assert stats.get(2)["donation_count"] == 0
+
+
+def test_add_folds_in_new_donation():
+    stats = DonationStats()
+    stats.load([aggregate(1, 2, 8, 7.0, 3.0, 4.0, datetime.date(2024, 1, 5))])
+    stats.add(1, datetime.date(2024, 2, 1), 2, 5.0)
+    stats.add(3, datetime.date(2024, 2, 1), 1, 2.5)
+    assert stats.get(1)["donation_count"] == 3
+    assert stats.get(1)["total_ampoules"] == 10
+    assert stats.get(1)["motility_mean"] == 4.0
+    assert stats.get(1)["motility_max"] == 5.0
+    assert stats.get(1)["last_donation_date"] == "2024-02-01"
+    assert stats.get(3)["motility_min"] == 2.5
+    assert stats.donors() == [1, 3]
+
+
+def test_replace_and_drop():
+    stats = DonationStats()
+    stats.load([aggregate(1, 2, 8, 7.0, 3.0, 4.0, datetime.date(2024, 1, 5))])
+    stats.replace(1, aggregate(1, 1, 5, 4.0, 4.0, 4.0, datetime.datetime(2023, 12, 1, 9, 30)))
+    assert stats.get(1)["last_donation_date"] == "2023-12-01"
+    stats.replace(1, None)
+    assert stats.donors() == []
+
+
+def test_donors_pages_in_order():
+    stats = DonationStats()
+    stats.load([aggregate(5, 1, 1, 1.0, 1.0, 1.0, datetime.date(2024, 1, 1))])
+    stats.add(2, datetime.date(2024, 1, 1), 1, 1.0)
+    stats.replace(9, aggregate(9, 1, 1, 1.0, 1.0, 1.0, datetime.date(2024, 1, 1)))
+    stats.add(7, datetime.date(2024, 1, 1), 1, 1.0)
+    assert stats.donors() == [2, 5, 7, 9]
+    assert stats.donors(after=2, limit=2) == [5, 7]
+    assert stats.donors(after=9) == []
+    stats.replace(5, None)
+    stats.replace(4, None)
+    assert stats.donors(limit=2) == [2, 7]
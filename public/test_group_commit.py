@@ -0,0 +1,102 @@
+import threading
+from unittest.mock import MagicMock
+
+import MySQLdb
+import pytest
+
+from group_commit import GroupCommitWriter
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+
+    def execute(self, query, args=()):
+        if query == "SELECT @@auto_increment_increment":
+            return
+        rows = [tuple(args[i : i + 2]) for i in range(0, len(args), 2)]
+        if any("bad" in row for row in rows):
+            raise MySQLdb.IntegrityError(1452, "Cannot add or update a child row")
+        self.lastrowid = self.conn.next_id
+        self.conn.next_id += len(rows) * self.conn.increment
+        self.conn.statements.append(rows)
+
+    def fetchone(self):
+        return (self.conn.increment,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, increment=1):
+        self.increment = increment
+        self.next_id = 1
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def writer_for(conn, **kwargs):
+    pool = MagicMock()
+    pool.acquire.return_value = conn
+    return GroupCommitWriter(lambda: pool, "INSERT INTO donations (individual_id, date)", **kwargs), pool
+
+
+def submit_all(writer, rows):
+    results = [None] * len(rows)
+
+    def submit(index):
+        try:
+            results[index] = writer.submit(rows[index])
+        except MySQLdb.Error as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_inserts_share_commits():
+    conn = FakeConnection(increment=2)
+    writer, pool = writer_for(conn, max_delay=0.05, max_rows=8)
+    rows = [(index, "2024-01-01") for index in range(20)]
+    ids = submit_all(writer, rows)
+    assert len(set(ids)) == 20
+    assert all(row_id % 2 == 1 for row_id in ids)
+    # Every row got the id MySQL assigned to its position in its statement
+    written = {row: 1 + 2 * position for position, row in enumerate(row for statement in conn.statements for row in statement)}
+    assert ids == [written[row] for row in rows]
+    assert conn.commits < 20 and all(len(statement) <= 8 for statement in conn.statements)
+    assert writer.stats()["rows"] == 20
+    assert pool.release.call_count == pool.acquire.call_count
+
+
+def test_bad_row_fails_alone():
+    conn = FakeConnection()
+    writer, _ = writer_for(conn, max_delay=0.05, max_rows=10)
+    results = submit_all(writer, [(1, "2024-01-01"), (2, "bad"), (3, "2024-01-02")])
+    assert isinstance(results[1], MySQLdb.IntegrityError)
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    assert writer.stats()["fallbacks"] == 1
+
+
+def test_lost_connection_fails_group():
+    pool = MagicMock()
+    pool.acquire.return_value.cursor.return_value.execute.side_effect = MySQLdb.OperationalError(2013, "Lost connection")
+    writer = GroupCommitWriter(lambda: pool, "INSERT INTO donations (individual_id, date)", max_delay=0)
+    with pytest.raises(MySQLdb.OperationalError):
+        writer.submit((1, "2024-01-01"))
+    pool.release.assert_called_once_with(pool.acquire.return_value, broken=True)
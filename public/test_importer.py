@@ -0,0 +1,112 @@
+import datetime
+import io
+import pytest
+from unittest.mock import MagicMock
+from importer import coerce_individual, import_csv
+
+
+HEADER = "type_id,birthdate,is_male,fname,mname,lname,address,contact\n"
+
+
+def csv_lines(*rows):
+    return io.StringIO(HEADER + "".join(row + "\n" for row in rows))
+
+
+def run(lines, **kwargs):
+    inserted = []
+    insert_batch = MagicMock(side_effect=lambda rows: inserted.append(list(rows)) or len(rows))
+    commit, rollback = MagicMock(), MagicMock()
+    result = import_csv(lines, insert_batch, commit, rollback, **kwargs)
+    return result, inserted, commit, rollback
+
+
+def test_coerce_individual():
+    values = coerce_individual({
+        "type_id": "2", "birthdate": "1990-05-01", "is_male": "F", "fname": " Ana ",
+        "mname": "", "lname": "Cruz", "address": "Cebu", "contact": "0917",
+    })
+    assert values == (2, datetime.date(1990, 5, 1), 0, "Ana", "", "Cruz", "Cebu", "0917")
+
+
+def test_import_in_batches():
+    lines = csv_lines(*[f"1,1990-01-0{i},1,John{i},,Doe,Addr,123" for i in range(1, 6)])
+    result, inserted, commit, _ = run(lines, batch_size=2)
+    assert [len(batch) for batch in inserted] == [2, 2, 1]
+    assert commit.call_count == 3
+    assert result["inserted"] == 5
+    assert result["checkpoint"] == 5
+
+
+def test_invalid_rows_are_reported():
+    lines = csv_lines(
+        "1,1990-01-01,1,John,,Doe,Addr,123",
+        "x,1990-01-01,1,John,,Doe,Addr,123",
+        "1,not-a-date,1,John,,Doe,Addr,123",
+        "1,1990-01-01,maybe,John,,Doe,Addr,123",
+        "1,1990-01-01,1,John",
+    )
+    result, inserted, _, _ = run(lines)
+    assert result["inserted"] == 1
+    assert result["error_count"] == 4
+    assert [error["row"] for error in result["errors"]] == [2, 3, 4, 5]
+
+
+def test_validate_callback_rejects_row():
+    def validate(values):
+        if values[0] == 9:
+            raise ValueError("Unknown type_id: 9")
+
+    lines = csv_lines("9,1990-01-01,1,John,,Doe,Addr,123", "1,1990-01-01,1,Jane,,Doe,Addr,123")
+    result, _, _, _ = run(lines, validate=validate)
+    assert result["inserted"] == 1
+    assert result["errors"][0]["message"] == "Unknown type_id: 9"
+
+
+def test_failure_stops_and_resume_skips_committed_rows():
+    rows = [f"1,1990-01-01,1,John{i},,Doe,Addr,123" for i in range(1, 6)]
+    insert_batch = MagicMock(side_effect=[2, RuntimeError("deadlock")])
+    commit, rollback = MagicMock(), MagicMock()
+    checkpoints = []
+    result = import_csv(csv_lines(*rows), insert_batch, commit, rollback, batch_size=2, on_checkpoint=checkpoints.append)
+    assert result["failed"] == "deadlock"
+    assert result["checkpoint"] == 2
+    assert checkpoints == [2]
+    rollback.assert_called_once()
+
+    result, inserted, _, _ = run(csv_lines(*rows), batch_size=2, resume_from=result["checkpoint"])
+    assert result["skipped"] == 2
+    assert result["inserted"] == 3
+    assert inserted[0][0][3] == "John3"
+
+
+def test_failed_commit_is_not_counted():
+    rows = [f"1,1990-01-01,1,John{i},,Doe,Addr,123" for i in range(1, 5)]
+    insert_batch = MagicMock(side_effect=[2, 2])
+    commit, rollback = MagicMock(side_effect=[None, RuntimeError("lost connection")]), MagicMock()
+    result = import_csv(csv_lines(*rows), insert_batch, commit, rollback, batch_size=2)
+    assert result["failed"] == "lost connection"
+    assert result["inserted"] == 2
+    assert result["checkpoint"] == 2
+
+
+def test_invalid_encoding_keeps_checkpoint():
+    rows = "".join(f"1,1990-01-01,1,John{i},,Doe,Addr,123\n" for i in range(1, 21))
+    lines = io.TextIOWrapper(io.BytesIO((HEADER + rows).encode() + b"1,1990-01-01,1,Jos\xe9,,Doe,Addr,123\n"), encoding="utf-8", newline="")
+    lines._CHUNK_SIZE = 64
+    checkpoints = []
+    result, inserted, commit, _ = run(lines, batch_size=8, on_checkpoint=checkpoints.append)
+    assert result["invalid_encoding"]
+    assert "utf-8" in result["failed"]
+    assert 16 <= result["checkpoint"] <= 20
+    assert result["inserted"] == result["checkpoint"] == sum(len(batch) for batch in inserted)
+    assert checkpoints[-1] == result["checkpoint"]
+
+    # Fixed file: resuming skips what was committed
+    fixed = csv_lines(*(rows + "1,1990-01-01,1,Jose,,Doe,Addr,123\n").splitlines())
+    result, _, _, _ = run(fixed, batch_size=8, resume_from=result["checkpoint"])
+    assert result["inserted"] + result["skipped"] == 21
+
+
+def test_missing_columns():
+    with pytest.raises(ValueError):
+        run(io.StringIO("fname,lname\nJohn,Doe\n"))
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from index_loader import IndexLoader
+
+
+class Recorder:
+    # A dict index whose load blocks until released, so tests can act mid-load
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+        self.index = {}
+        self.loads = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def load(self):
+        self.loads += 1
+        self.started.set()
+        self.release.wait(5)
+        self.index = dict(self.rows)
+
+    def apply(self, op, row_id, value=None):
+        if op == "reload":
+            return False
+        if op == "delete":
+            self.index.pop(row_id, None)
+        else:
+            self.index[row_id] = value
+        return True
+
+
+def test_loads_once_and_applies_changes():
+    recorder = Recorder({1: "a"})
+    loader = IndexLoader(recorder.load, recorder.apply)
+    loader.notify("upsert", 2, "b")  # before the load: the load reads it
+    loader.ensure_loaded()
+    loader.ensure_loaded()
+    loader.notify("upsert", 3, "c")
+    loader.notify("delete", 1)
+    assert recorder.loads == 1
+    assert recorder.index == {3: "c"}
+
+
+def test_concurrent_callers_share_one_load():
+    recorder = Recorder({1: "a"})
+    recorder.release.clear()
+    loader = IndexLoader(recorder.load, recorder.apply)
+    threads = [threading.Thread(target=loader.ensure_loaded) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    recorder.started.wait(5)
+    recorder.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert recorder.loads == 1
+    assert loader.loaded
+
+
+def test_changes_during_load_are_replayed():
+    recorder = Recorder({1: "a", 2: "b"})
+    recorder.release.clear()
+    replayed = []
+    loader = IndexLoader(recorder.load, recorder.apply, replay=lambda *change: replayed.append(change) or recorder.apply(*change))
+    thread = threading.Thread(target=loader.ensure_loaded)
+    thread.start()
+    recorder.started.wait(5)
+    loader.notify("upsert", 2, "B")
+    loader.notify("delete", 1)
+    assert recorder.index == {}
+    recorder.release.set()
+    thread.join(5)
+    assert loader.loaded
+    assert recorder.loads == 1
+    assert replayed == [("upsert", 2, "B"), ("delete", 1)]
+    assert recorder.index == {2: "B"}
+
+
+def test_change_that_needs_a_reload():
+    recorder = Recorder({1: "a"})
+    loader = IndexLoader(recorder.load, recorder.apply)
+    loader.ensure_loaded()
+    loader.notify("reload", None)
+    assert not loader.loaded
+    loader.notify("upsert", 2, "b")  # not loaded: left to the next load
+    recorder.rows[2] = "b"
+    loader.ensure_loaded()
+    assert recorder.loads == 2
+    assert recorder.index == {1: "a", 2: "b"}
+
+
+def test_reload_requested_during_load_runs_again():
+    recorder = Recorder({1: "a"})
+    recorder.release.clear()
+    loader = IndexLoader(recorder.load, recorder.apply)
+    thread = threading.Thread(target=loader.ensure_loaded)
+    thread.start()
+    recorder.started.wait(5)
+    loader.invalidate()
+    recorder.release.set()
+    thread.join(5)
+    assert loader.loaded
+    assert recorder.loads == 2
+
+
+def test_failed_load_is_retried():
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("gone")
+
+    loader = IndexLoader(load, lambda *change: True)
+    with pytest.raises(ConnectionError):
+        loader.ensure_loaded()
+    assert not loader.loaded
+    loader.notify("upsert", 1)  # not loading any more, so not queued
+    loader.ensure_loaded()
+    assert loader.loaded
+    assert len(calls) == 2
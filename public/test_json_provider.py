@@ -0,0 +1,48 @@
+import datetime
+import decimal
+import json
+
+import pytest
+from flask import Flask
+
+import json_provider
+from json_provider import FastJSONProvider
+
+
+ROW = {
+    "iddonations": 7,
+    "date": datetime.date(2024, 3, 1),
+    "checked_at": datetime.datetime(2024, 3, 1, 9, 30, 15),
+    "motilitiy_rating": decimal.Decimal("3.50"),
+    "note": "Señora",
+}
+EXPECTED = '{"iddonations":7,"date":"2024-03-01","checked_at":"2024-03-01T09:30:15","motilitiy_rating":"3.50","note":"Señora"}'
+
+
+def backends():
+    yield False
+    if json_provider.orjson is not None:
+        yield True
+
+
+@pytest.mark.parametrize("use_orjson", list(backends()))
+def test_rows_serialise_as_iso(use_orjson):
+    provider = FastJSONProvider(Flask(__name__), use_orjson=use_orjson)
+    assert provider.dumps(ROW) == EXPECTED
+    assert provider.dumps({1: None}) == '{"1":null}'
+    assert provider.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize("use_orjson", list(backends()))
+def test_response(use_orjson):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app, use_orjson=use_orjson)
+    with app.app_context():
+        response = app.json.response([ROW])
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data()) == [json.loads(EXPECTED)]
+
+
+def test_unknown_type_raises():
+    with pytest.raises(TypeError):
+        FastJSONProvider(Flask(__name__), use_orjson=False).dumps({"a": object()})
@@ -0,0 +1,67 @@
+from lineage import LineageGraph
+
+DONOR = 1
+PARTNER = 2
+
+
+def relationship(relationship_id, individual_1_id, individual_2_id, type_id=DONOR):
+    return {
+        "idrelationships": relationship_id,
+        "type_id": type_id,
+        "individual_1_id": individual_1_id,
+        "individual_2_id": individual_2_id,
+    }
+
+
+def make_graph():
+    # 10 -> 20, 21, 30 (donor); 11 -> 20, 21 ; 20 -> 40 ; 50 and 10 are partners
+    graph = LineageGraph()
+    graph.load(
+        [
+            relationship(1, 10, 20),
+            relationship(2, 10, 21),
+            relationship(3, 10, 30),
+            relationship(4, 11, 20),
+            relationship(5, 11, 21),
+            relationship(6, 20, 40),
+            relationship(7, 50, 10, type_id=PARTNER),
+        ],
+        [DONOR],
+    )
+    return graph
+
+
+def test_descendants_and_ancestors():
+    graph = make_graph()
+    assert graph.descendants(10) == {20: 1, 21: 1, 30: 1, 40: 2}
+    assert graph.descendants(10, max_depth=1) == {20: 1, 21: 1, 30: 1}
+    assert graph.ancestors(40) == {20: 1, 10: 2, 11: 2}
+    assert graph.ancestors(10) == {}
+
+
+def test_siblings():
+    graph = make_graph()
+    assert graph.siblings(20) == {"full": [21], "half": [30]}
+    assert graph.siblings(30) == {"full": [], "half": [20, 21]}
+
+
+def test_kinship():
+    graph = make_graph()
+    assert graph.kinship(20, 30) == {"degree": 2, "common_ancestors": [10]}
+    assert graph.kinship(10, 40) == {"degree": 2, "common_ancestors": [10]}
+    assert graph.kinship(40, 21)["degree"] == 3
+    assert graph.kinship(10, 50) is None
+
+
+def test_upsert_and_remove():
+    graph = make_graph()
+    graph.upsert(3, DONOR, 11, 30)
+    assert graph.parents(30) == [11]
+    assert graph.children(10) == [20, 21]
+    graph.upsert(8, DONOR, 11, 30)
+    graph.remove(3)
+    assert graph.parents(30) == [11]
+    graph.remove(8)
+    assert graph.parents(30) == []
+    graph.upsert(7, DONOR, 50, 10)
+    assert graph.ancestors(40) == {20: 1, 10: 2, 11: 2, 50: 3}
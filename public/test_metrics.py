@@ -0,0 +1,36 @@
+from metrics import Registry, statement_label
+
+
+def test_histogram_text_format():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Request latency.", ["route"], buckets=(0.1, 1.0))
+    latency.observe(0.05, "/a")
+    latency.observe(0.1, "/a")
+    latency.observe(3.0, "/a")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Request latency.", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 3.15' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+
+
+def test_counter_escapes_and_folds_series():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors.", ["statement"], max_series=2)
+    errors.inc('SELECT "x"\n')
+    errors.inc("b", amount=2)
+    errors.inc("c")
+    errors.inc("d")
+    text = registry.render()
+    assert 'errors_total{statement="SELECT \\"x\\"\\n"} 1' in text
+    assert 'errors_total{statement="b"} 2' in text
+    assert 'errors_total{statement="other"} 2' in text
+
+
+def test_statement_label_folds_lists():
+    assert statement_label("SELECT *\n  FROM t WHERE id IN (%s, %s,%s)") == "SELECT * FROM t WHERE id IN (%s, ...)"
+    assert statement_label("INSERT INTO t (a, b) VALUES (%s), (%s)") == "INSERT INTO t (a, b) VALUES (%s), ..."
+    assert statement_label("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == "INSERT INTO t (a, b) VALUES (%s, ...), ..."
+    assert statement_label("SELECT * FROM t WHERE id = %s") == "SELECT * FROM t WHERE id = %s"
@@ -0,0 +1,129 @@
+from unittest.mock import MagicMock
+from migrate import discover, statements, apply_migrations, sql_strings, check_query_plans, full_scans
+
+
+def test_discover_orders_versions():
+    migrations = discover()
+    assert [version for version, _, _ in migrations][:3] == [0, 1, 2]
+    assert migrations[0][1] == "schema"
+
+
+def test_discover_rejects_duplicates(tmp_path):
+    (tmp_path / "001_a.sql").write_text("SELECT 1;")
+    (tmp_path / "1_b.sql").write_text("SELECT 1;")
+    (tmp_path / "notes.txt").write_text("")
+    try:
+        discover(str(tmp_path))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_statements_skip_comments():
+    sql = "-- comment; with a semicolon\nCREATE TABLE a (id INT);\n\nCREATE INDEX i ON a (id);\n"
+    assert statements(sql) == ["CREATE TABLE a (id INT)", "CREATE INDEX i ON a (id)"]
+
+
+def test_schema_defines_erd_tables():
+    sql = open(discover()[0][2]).read()
+    for table in ["role_types", "relationship_types", "individuals", "donations", "relationships", "users"]:
+        assert f"CREATE TABLE IF NOT EXISTS {table} (" in sql
+
+
+def test_change_log_triggers():
+    sql = open(dict((name, path) for _, name, path in discover())["change_log"]).read()
+    triggers = [statement for statement in statements(sql) if statement.startswith("CREATE TRIGGER")]
+    for table in ["individuals", "donations", "relationships"]:
+        for op in ["INSERT", "UPDATE", "DELETE"]:
+            assert sum(f"AFTER {op} ON {table} FOR EACH ROW" in trigger for trigger in triggers) == 1
+
+
+def test_apply_pending_migrations(tmp_path):
+    (tmp_path / "000_base.sql").write_text("CREATE TABLE a (id INT);")
+    (tmp_path / "001_index.sql").write_text("CREATE INDEX i ON a (id);")
+    (tmp_path / "002_more.sql").write_text("CREATE INDEX j ON a (id);")
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.return_value = [(0,)]
+    assert apply_migrations(conn, str(tmp_path), target=1) == [(1, "index")]
+    executed = [call[0][0] for call in cursor.execute.call_args_list]
+    assert "CREATE INDEX i ON a (id)" in executed
+    assert "CREATE TABLE a (id INT)" not in executed
+    assert "CREATE INDEX j ON a (id)" not in executed
+    assert cursor.execute.call_args_list[-1][0][1] == (1, "index")
+    conn.commit.assert_called_once()
+
+
+SOURCE = '''
+TABLE_COLUMNS = "SELECT id, name FROM people"
+
+def one(person_id):
+    return fetch_data(f"{TABLE_COLUMNS} WHERE id = %s", (person_id,))
+
+def projected(person_id):
+    return fetch_data(f"SELECT {fields_arg('people')} FROM people WHERE id = %s", (person_id,))
+
+def page(table):
+    rows = fetch_data(f"SELECT * FROM {table}")
+    query = "SELECT * FROM people"
+    query += " WHERE age > %s"
+    record_change("people", "update")
+    return rows
+
+def write():
+    execute_query("""
+        UPDATE people SET name = %s
+        WHERE id = %s
+    """, ("x", 1))
+'''
+
+
+def test_sql_strings():
+    queries = sql_strings(SOURCE, {"TABLE_COLUMNS": "SELECT id, name FROM people"})
+    assert queries == [
+        (2, "SELECT id, name FROM people"),
+        (5, "SELECT id, name FROM people WHERE id = %s"),
+        (8, "SELECT * FROM people WHERE id = %s"),
+        (11, None),
+        (12, None),
+        (18, "UPDATE people SET name = %s WHERE id = %s"),
+    ]
+
+
+def fake_connection(plans):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.description = [("table",), ("type",), ("key",), ("Extra",)]
+    cursor.fetchall.side_effect = plans
+    return conn
+
+
+def test_check_query_plans():
+    conn = fake_connection([
+        [("users", "const", "uq_users_username", None)],
+        [("people", "ALL", None, None)],
+        [("people", "ALL", None, None)],
+    ])
+    results = check_query_plans(conn, [
+        (1, "SELECT * FROM users WHERE username = %s AND password = SHA2(%s, 256)"),
+        (2, "SELECT * FROM people WHERE name = %s"),
+        (3, "SELECT id FROM people /* full scan */"),
+        (4, None),
+        (5, "INSERT INTO people (name) VALUES (%s)"),
+    ])
+    assert [status for _, _, status, _ in results] == ["ok", "full scan", "allowed", "dynamic", "write"]
+    assert conn.cursor.return_value.execute.call_args_list[0][0][1] == ("1", "1")
+
+
+def test_full_scans_include_index_scans():
+    def plan(*rows):
+        return [dict(zip(("table", "type", "key", "Extra"), row)) for row in rows]
+
+    assert full_scans("SELECT id FROM people", plan(("people", "index", "PRIMARY", "Using index"))) == ["people"]
+    # An ordered walk that LIMIT cuts short reads only what it returns
+    assert full_scans("SELECT * FROM people ORDER BY id LIMIT %s", plan(("people", "index", "PRIMARY", None))) == []
+    sorted_first = plan(("people", "index", "idx_name", "Using index; Using filesort"))
+    assert full_scans("SELECT * FROM people ORDER BY age LIMIT 10", sorted_first) == ["people"]
+    union = plan(("people", "range", "idx_a", None), ("people", "range", "idx_b", None), ("<union1,2>", "ALL", None, None))
+    assert full_scans("SELECT * FROM people WHERE a = 1 UNION SELECT * FROM people WHERE b = 1", union) == []
+
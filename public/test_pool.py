@@ -0,0 +1,91 @@
+import threading
+import pytest
+import MySQLdb
+from unittest.mock import MagicMock
+from pool import ConnectionPool, PoolTimeout
+
+
+def make_pool(**kwargs):
+    connect = MagicMock(side_effect=lambda: MagicMock())
+    return ConnectionPool(connect, **kwargs), connect
+
+
+def test_fill_creates_min_size():
+    pool, connect = make_pool(min_size=3, max_size=5)
+    pool.fill()
+    assert connect.call_count == 3
+    assert pool.stats()["idle"] == 3
+
+
+def test_connection_is_reused():
+    pool, connect = make_pool(min_size=0, max_size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert connect.call_count == 1
+
+
+def test_release_rolls_back():
+    pool, _ = make_pool(min_size=0, max_size=1)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.rollback.assert_called_once()
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, _ = make_pool(min_size=0, max_size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, _ = make_pool(min_size=0, max_size=1, timeout=2)
+    conn = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, args=(conn,))
+    timer.start()
+    assert pool.acquire() is conn
+    assert pool.stats()["waits"] == 1
+
+
+def test_broken_connection_is_discarded():
+    pool, connect = make_pool(min_size=0, max_size=1)
+    conn = pool.acquire()
+    pool.release(conn, broken=True)
+    conn.close.assert_called_once()
+    assert pool.stats()["size"] == 0
+    assert pool.acquire() is not conn
+
+
+def test_failed_ping_replaces_connection():
+    pool, connect = make_pool(min_size=0, max_size=1, ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.ping.side_effect = MySQLdb.OperationalError(2006, "MySQL server has gone away")
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert pool.stats()["size"] == 1
+
+
+def test_expired_connection_is_recycled():
+    pool, _ = make_pool(min_size=0, max_size=1, max_lifetime=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is not conn
+    assert pool.stats()["recycled"] == 1
+
+
+def test_connect_failure_frees_slot():
+    connect = MagicMock(side_effect=MySQLdb.OperationalError(2003, "Can't connect"))
+    pool = ConnectionPool(connect, min_size=0, max_size=1)
+    with pytest.raises(MySQLdb.OperationalError):
+        pool.acquire()
+    assert pool.stats()["size"] == 0
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool(MagicMock(), min_size=5, max_size=2)
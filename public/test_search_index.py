@@ -0,0 +1,72 @@
+from search_index import NameIndex, normalise
+
+
+ROWS = [
+    (1, "John", "Reyes", "Santos"),
+    (2, "Maria", "", "Cruz"),
+    (3, "Mariano", "Jose", "Cruz"),
+    (4, "Jonathan", None, "Villanueva"),
+    (5, "José", "", "Rizal"),
+]
+
+
+def index():
+    names = NameIndex()
+    names.load(ROWS)
+    return names
+
+
+def test_normalise_strips_accents_and_case():
+    assert normalise("José  DE la-Cruz") == ["jose", "de", "la", "cruz"]
+
+
+def test_exact_match_ranks_first():
+    results = index().search("maria cruz")
+    assert results[0] == {"id": 2, "name": "Maria Cruz", "score": 1.0}
+    assert 3 in [result["id"] for result in results]
+
+
+def test_misspellings_and_accents():
+    assert index().search("jhon santos")[0]["id"] == 1
+    assert index().search("vilanueva")[0]["id"] == 4
+    assert index().search("jose rizal")[0]["id"] == 5
+
+
+def test_prefix_and_limit():
+    results = index().search("jo", limit=2)
+    assert len(results) == 2
+    assert all(result["id"] in (1, 3, 4, 5) for result in results)
+
+
+def test_partial_matches_rank_below_full_matches():
+    results = index().search("maria santos")
+    assert {results[0]["id"], results[1]["id"]} == {1, 2}
+    assert results[0]["score"] < 1.0
+
+
+def test_no_match():
+    assert index().search("xyzzy") == []
+    assert index().search("   ") == []
+
+
+def test_add_update_remove():
+    names = index()
+    names.add(6, "Andres", "", "Bonifacio")
+    assert names.search("bonifacio")[0]["id"] == 6
+    names.add(2, "Maria", "", "Clara")
+    assert 2 not in [result["id"] for result in names.search("cruz")]
+    assert names.search("maria clara")[0]["id"] == 2
+    names.remove(1)
+    assert names.search("santos") == []
+    assert len(names) == 5
+    assert names.max_id == 6
+
+
+def test_compaction_keeps_results():
+    names = NameIndex()
+    names.load([(1, "Ana", "", "Lopez")])
+    for _ in range(6000):
+        names.add(1, "Ana", "", "Lopez")
+        names.add(1, "Ana", "", "Garcia")
+    assert names.search("ana garcia") == [{"id": 1, "name": "Ana Garcia", "score": 1.0}]
+    assert names._posted < 10010
@@ -0,0 +1,71 @@
+import datetime
+import json
+import logging
+from unittest.mock import MagicMock
+
+import MySQLdb
+
+from slow_queries import SlowQueryLog, params_shape
+
+
+def fake_pool(plan=(("donations", "ALL", None),)):
+    pool = MagicMock()
+    cursor = pool.acquire.return_value.cursor.return_value
+    cursor.description = [("table",), ("type",), ("key",)]
+    cursor.fetchall.return_value = list(plan)
+    return pool
+
+
+def records(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records if record.name == "spermbank.slow_queries"]
+
+
+def test_params_shape_hides_values():
+    assert params_shape((1, 2, 3, "Ana", datetime.date(2024, 1, 1), None)) == ["int*3", "str", "date", "NoneType"]
+    assert params_shape({"name": "Ana"}) == {"name": "str"}
+    assert params_shape(()) == []
+
+
+def test_slow_query_logged_with_plan(caplog):
+    caplog.set_level(logging.WARNING, logger="spermbank.slow_queries")
+    pool = fake_pool()
+    log = SlowQueryLog(lambda: pool, threshold=0.1)
+    assert not log.report("SELECT * FROM donations WHERE individual_id = %s", (7,), 0.05, 3)
+    assert log.report("SELECT * FROM donations WHERE individual_id = %s", (7,), 0.25, 3, "/api/donations")
+    log.flush()
+    [record] = records(caplog)
+    assert record["sql"] == "SELECT * FROM donations WHERE individual_id = %s"
+    assert record["params"] == ["int"]
+    assert record["duration_ms"] == 250.0
+    assert record["rows"] == 3
+    assert record["route"] == "/api/donations"
+    assert record["explain"] == [{"table": "donations", "type": "ALL", "key": None}]
+    cursor = pool.acquire.return_value.cursor.return_value
+    assert cursor.execute.call_args[0] == ("EXPLAIN SELECT * FROM donations WHERE individual_id = %s", (7,))
+    pool.release.assert_called_once_with(pool.acquire.return_value, broken=False)
+
+
+def test_inserts_not_explained_and_errors_reported(caplog):
+    caplog.set_level(logging.WARNING, logger="spermbank.slow_queries")
+    pool = fake_pool()
+    log = SlowQueryLog(lambda: pool, threshold=0.1)
+    log.report("INSERT INTO donations (individual_id) VALUES (%s)", (7,), 1.0, 1)
+    pool.acquire.return_value.cursor.return_value.execute.side_effect = MySQLdb.OperationalError(2013, "Lost connection")
+    log.report("SELECT * FROM individuals", (), 1.0, 0)
+    log.flush()
+    insert, select = records(caplog)
+    assert insert["explain"] is None and "explain_error" not in insert
+    assert select["explain"] is None and "Lost connection" in select["explain_error"]
+    pool.release.assert_called_once_with(pool.acquire.return_value, broken=True)
+
+
+def test_rate_limit_counts_suppressed(caplog):
+    caplog.set_level(logging.WARNING, logger="spermbank.slow_queries")
+    log = SlowQueryLog(fake_pool, threshold=0.1, rate=2, per=3600)
+    sent = [log.report("SELECT * FROM individuals", (), 1.0, 0) for _ in range(5)]
+    assert sent == [True, True, False, False, False]
+    assert log.suppressed == 3
+    log._allowance = 1
+    assert log.report("SELECT * FROM individuals", (), 1.0, 0)
+    log.flush()
+    assert [record["suppressed"] for record in records(caplog)] == [0, 0, 3]